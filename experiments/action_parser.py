@@ -3,12 +3,111 @@
 import re
 import ast
 import math
+import keyword
+from collections import Counter
+from dataclasses import dataclass, field, replace
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from ui_tars import metrics
 
 IMAGE_FACTOR = 28
 MIN_PIXELS = 100 * 28 * 28
 MAX_PIXELS = 16384 * 28 * 28
 MAX_RATIO = 200
 
+# 解析耗时与失败次数，由代理的 /metrics 导出；默认关闭（HIMS_METRICS=1 才开启），关闭时解析函数不被包装，没有额外开销
+PARSE_SECONDS = metrics.histogram("hims_action_parse_seconds",
+                                  "Time to parse one model response into actions", ("parser",))
+PARSE_FAILURES = metrics.counter("hims_action_parse_failures_total",
+                                 "Model responses that failed to parse", ("parser", "error"))
+
+
+# ---------- 动作 IR ----------
+# 坐标以数值元组保存（归一化到 [0, 1] 的 (x1, y1, x2, y2)），不再经过 str(list) -> eval 往返。
+# 旧的 dict 形状（框为字符串）通过 to_dict()/from_dict() 以及只读的映射接口保持兼容。
+
+Box = Tuple[float, ...]
+BOX_PARAMS = ("start_box", "end_box")
+LEGACY_KEYS = ("reflection", "thought", "action_type", "action_inputs", "text")
+
+
+def _is_box_param(name):
+    return "start_box" in name or "end_box" in name
+
+
+def _box_from_legacy(value):
+    # "[0.1, 0.2, 0.1, 0.2]" / "(0.1,0.2)" / 序列 -> 数值元组
+    if isinstance(value, (tuple, list)):
+        return tuple(float(v) for v in value)
+    return tuple(float(v) for v in str(value).strip("[]() ").split(","))
+
+
+@dataclass(slots=True)
+class Action:
+    action_type: str
+    action_inputs: Dict[str, Any] = field(default_factory=dict)  # *_box 参数为 Box 元组
+    thought: Optional[str] = None
+    reflection: Optional[str] = None
+    text: Optional[str] = None
+
+    @property
+    def start_box(self) -> Optional[Box]:
+        return self.action_inputs.get("start_box")
+
+    @property
+    def end_box(self) -> Optional[Box]:
+        return self.action_inputs.get("end_box")
+
+    def center(self, name="start_box", width=1.0, height=1.0) -> Optional[Tuple[float, float]]:
+        """Box 中心点（乘以屏幕宽高，保留 3 位小数）；两数的点视为退化框。"""
+        box = self.action_inputs.get(name)
+        if not box:
+            return None
+        if len(box) == 2:
+            x1, y1 = box
+            x2, y2 = x1, y1
+        else:
+            x1, y1, x2, y2 = box[:4]
+        return (round(float((x1 + x2) / 2) * width, 3),
+                round(float((y1 + y2) / 2) * height, 3))
+
+    # --- 兼容旧 dict 形状 ---
+    def legacy_inputs(self) -> Dict[str, Any]:
+        return {k: (str(list(v)) if _is_box_param(k) and isinstance(v, tuple) else v)
+                for k, v in self.action_inputs.items()}
+
+    def to_dict(self) -> dict:
+        return {
+            "reflection": self.reflection,
+            "thought": self.thought,
+            "action_type": self.action_type,
+            "action_inputs": self.legacy_inputs(),
+            "text": self.text
+        }
+
+    @classmethod
+    def from_dict(cls, d) -> "Action":
+        if isinstance(d, cls):
+            return d
+        inputs = {}
+        for k, v in (d.get("action_inputs") or {}).items():
+            inputs[k] = _box_from_legacy(v) if _is_box_param(k) and v not in (None, "") else v
+        return cls(d.get("action_type"), inputs, d.get("thought"), d.get("reflection"), d.get("text"))
+
+    def __getitem__(self, key):
+        if key == "action_inputs":
+            return self.legacy_inputs()
+        if key in LEGACY_KEYS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in LEGACY_KEYS
+
+    def get(self, key, default=None):
+        return self[key] if key in LEGACY_KEYS else default
+
 
 def convert_point_to_coordinates(text, is_answer=False):
     # 匹配 <bbox> 后面的四个数字
@@ -143,13 +242,86 @@ def smart_resize(height: int,
     return h_bar, w_bar
 
 
-def parse_action_to_structure_output(text,
-                                     factor,
-                                     origin_resized_height,
-                                     origin_resized_width,
-                                     model_type="qwen25vl",
-                                     max_pixels=16384 * 28 * 28,
-                                     min_pixels=100 * 28 * 28):
+# ---------- 坐标空间注册表 ----------
+# 模型坐标 -> 归一化坐标的约定按 model_type 注册，不再在解析函数里写分支。
+# 约定函数返回 (x 除数, y 除数)；同一组 (model_type, 屏幕尺寸, factor, min/max_pixels)
+# 的换算结果由 coord_space() 以 LRU 缓存，smart_resize 不再每次解析都重算。
+
+Matrix2 = Tuple[Tuple[float, float], Tuple[float, float]]
+
+
+@dataclass(frozen=True)
+class CoordSpace:
+    model_type: str
+    height: int
+    width: int
+    divisors: Tuple[float, float]   # 模型坐标 / divisors = 归一化坐标
+    model_to_screen: Matrix2        # 模型坐标 -> 屏幕像素（对角矩阵）
+    screen_to_model: Matrix2        # 屏幕像素 -> 模型坐标
+
+    def normalize(self, numbers) -> Box:
+        """模型输出的 [x, y] 或 [x1, y1, x2, y2] -> 归一化元组；两数的点展开为退化框。"""
+        dx, dy = self.divisors
+        out = [float(num / dy) if i % 2 else float(num / dx) for i, num in enumerate(numbers)]
+        if len(out) == 2:
+            out = [out[0], out[1], out[0], out[1]]
+        return tuple(out)
+
+    def to_screen(self, x: float, y: float) -> Tuple[float, float]:
+        (sx, _), (_, sy) = self.model_to_screen
+        return x * sx, y * sy
+
+    def to_model(self, x: float, y: float) -> Tuple[float, float]:
+        (sx, _), (_, sy) = self.screen_to_model
+        return x * sx, y * sy
+
+
+def _absolute_smart_resize(height, width, factor, min_pixels, max_pixels):
+    # Qwen2.5-VL 输出 smart_resize 后图像上的绝对坐标（resize 固定用 IMAGE_FACTOR）
+    smart_resize_height, smart_resize_width = smart_resize(
+        height, width, factor=IMAGE_FACTOR, min_pixels=min_pixels, max_pixels=max_pixels)
+    return smart_resize_width, smart_resize_height
+
+
+def _relative_factor(height, width, factor, min_pixels, max_pixels):
+    # Qwen2-VL 等输出 0..factor 的相对坐标
+    return factor, factor
+
+
+COORD_CONVENTIONS: Dict[str, Callable[..., Tuple[float, float]]] = {
+    "qwen25vl": _absolute_smart_resize,
+}
+DEFAULT_COORD_CONVENTION = _relative_factor
+
+
+def register_coord_convention(model_type: str, divisors: Callable[..., Tuple[float, float]]) -> None:
+    """新增模型坐标约定：divisors(height, width, factor, min_pixels, max_pixels) -> (x 除数, y 除数)。"""
+    COORD_CONVENTIONS[model_type] = divisors
+    coord_space.cache_clear()
+
+
+@lru_cache(maxsize=256)
+def coord_space(model_type: str,
+                height: int,
+                width: int,
+                factor: int = IMAGE_FACTOR,
+                min_pixels: int = MIN_PIXELS,
+                max_pixels: int = MAX_PIXELS) -> CoordSpace:
+    dx, dy = COORD_CONVENTIONS.get(model_type, DEFAULT_COORD_CONVENTION)(
+        height, width, factor, min_pixels, max_pixels)
+    return CoordSpace(model_type, height, width, (dx, dy),
+                      ((width / dx, 0.0), (0.0, height / dy)),
+                      ((dx / width, 0.0), (0.0, dy / height)))
+
+
+def parse_action_to_structure_output_reference(text,
+                                               factor,
+                                               origin_resized_height,
+                                               origin_resized_width,
+                                               model_type="qwen25vl",
+                                               max_pixels=16384 * 28 * 28,
+                                               min_pixels=100 * 28 * 28):
+    # 原始实现（正则 + ast.parse），保留作为快速路径的对照基准
     text = text.strip()
 
     if "<point>" in text:
@@ -276,14 +448,554 @@ def parse_action_to_structure_output(text,
     return actions
 
 
+# ---------- 单遍快速解析（fast path）----------
+# parse_action_to_structure_output 的默认实现。对已知动作语法
+# （click / drag / type / scroll / hotkey / finished / health.* 等，即 name(kw='...', ...) 形式）
+# 用手写扫描器一次完成分词，不再经过正则替换和 ast.parse；
+# 扫描器不认识的输入一律回退到上面的 ast 参考实现，因此两者输出完全一致。
+
+_IDENT_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_NUM_RE = re.compile(r"(?:0|[1-9][0-9]*)(?:\.[0-9]+)?")
+_STR_ESCAPES = {"\\": "\\", "'": "'", '"': '"', "n": "\n", "t": "\t", "r": "\r",
+                "\n": "\\n"}  # 反斜杠+真实换行：参考实现先把换行替换成 "\\n"，结果是字面量 \n
+_CONST_NAMES = {"True": True, "False": False, "None": None}
+_TYPE_PREFIX = "type(content='"
+
+
+def _decode_str_body(body, quote):
+    """按 Python 字符串字面量规则解码引号内的内容；遇到不支持的写法返回 None（交给 ast 处理）。"""
+    if "\\" not in body and quote not in body and "\r" not in body:
+        return body
+    out = []
+    i, n = 0, len(body)
+    while i < n:
+        ch = body[i]
+        if ch == "\\":
+            if i + 1 >= n or body[i + 1] not in _STR_ESCAPES:
+                return None
+            out.append(_STR_ESCAPES[body[i + 1]])
+            i += 2
+            continue
+        if ch == quote or ch == "\r":
+            return None
+        out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def _skip_ws(s, i):
+    n = len(s)
+    while i < n and (s[i] == " " or s[i] == "\t"):
+        i += 1
+    return i
+
+
+def _scan_string(s, p):
+    """s[p] 是引号；返回 (value, 结束位置) 或 None。"""
+    q = s[p]
+    if s.startswith(q * 3, p):
+        return None
+    k = p + 1
+    while True:
+        e = s.find(q, k)
+        if e < 0:
+            return None
+        b = e - 1
+        while b > p and s[b] == "\\":
+            b -= 1
+        if (e - 1 - b) % 2 == 0:
+            break
+        k = e + 1
+    value = _decode_str_body(s[p + 1:e], q)
+    if value is None:
+        return None
+    return value, e + 1
+
+
+def _scan_value(s, i, literals=False):
+    """s[i] 起的一个参数值 -> (value, 结束位置) 或 None；literals=True 时另支持负数与 list/tuple/dict 字面量。"""
+    n = len(s)
+    ch = s[i]
+    if ch == "'" or ch == '"':
+        scanned = _scan_string(s, i)
+        if scanned is None:
+            return None
+        value, i = scanned
+        j = _skip_ws(s, i)
+        if j < n and (s[j] == "'" or s[j] == '"'):
+            return None  # 相邻字符串拼接
+        return value, i
+    if ch.isdigit() or (literals and ch == "-" and i + 1 < n and s[i + 1].isdigit()):
+        m = _NUM_RE.match(s, i + (ch == "-"))
+        if not m or (m.end() < n and s[m.end()] not in (" \t\n,)]}:" if literals else " \t,)")):
+            return None
+        text = s[i:m.end()]
+        return (float(text) if "." in text else int(text)), m.end()
+    if literals and ch in "[({":
+        return _scan_container(s, i)
+    m = _IDENT_RE.match(s, i)
+    if not m or m.group() not in _CONST_NAMES:
+        return None
+    return _CONST_NAMES[m.group()], m.end()
+
+
+def _skip_ws_nl(s, i):
+    n = len(s)
+    while i < n and s[i] in " \t\n":
+        i += 1
+    return i
+
+
+def _scan_container_item(s, i):
+    # 容器跨行时，字符串里的真实换行在 ast 两种读法下都不成立，交给回退路径
+    scanned = _scan_value(s, i, True)
+    if scanned is not None and s[i] in "'\"" and "\n" in s[i:scanned[1]]:
+        return None
+    return scanned
+
+
+def _scan_container(s, i):
+    """[...] / (...) / {"k": v, ...}，元素可以嵌套；返回 (value, 结束位置) 或 None。"""
+    opener = s[i]
+    closer = {"[": "]", "(": ")", "{": "}"}[opener]
+    items, n, trailing_comma = [], len(s), False
+    i = _skip_ws_nl(s, i + 1)
+    while True:
+        if i < n and s[i] == closer:
+            i += 1
+            break
+        if i >= n:
+            return None
+        scanned = _scan_container_item(s, i)
+        if scanned is None:
+            return None
+        item, i = scanned
+        i = _skip_ws_nl(s, i)
+        if opener == "{":
+            if i >= n or s[i] != ":" or not isinstance(item, (str, int, float, bool, tuple)):
+                return None
+            i = _skip_ws_nl(s, i + 1)
+            if i >= n:
+                return None
+            scanned = _scan_container_item(s, i)
+            if scanned is None:
+                return None
+            value, i = scanned
+            items.append((item, value))
+            i = _skip_ws_nl(s, i)
+        else:
+            items.append(item)
+        trailing_comma = False
+        if i < n and s[i] == ",":
+            trailing_comma = True
+            i = _skip_ws_nl(s, i + 1)
+            continue
+        if i < n and s[i] == closer:
+            i += 1
+            break
+        return None
+    if opener == "[":
+        return items, i
+    if opener == "{":
+        try:
+            return dict(items), i
+        except TypeError:
+            return None  # 不可哈希的键（如含 list 的元组）
+    if len(items) == 1 and not trailing_comma:
+        return items[0], i  # (x) 只是括号，不是元组
+    return tuple(items), i
+
+
+def _scan_call(s, literals=False, dotted=False):
+    """
+    等价于 parse_action(s.replace("\\n", "\\\\n").lstrip())，但只处理
+    name(kw=<字符串|整数|小数|True|False|None>, ...) 这一种形状；其余返回 None。
+    literals=True 时参数值还可以是负数和 list/tuple/dict 字面量；dotted=True 时保留完整的
+    点分函数名（health.upsert_patient），而不是像 ast 参考实现那样只取最后一段。
+    这两个选项供 action_schema 使用，默认行为与参考实现保持一致。
+    """
+    if "\x00" in s:
+        return None
+    i, n = 0, len(s)
+    while i < n and s[i] != "\n" and s[i].isspace():
+        i += 1
+    # 函数名（可带点，如 health.upsert_patient；默认与 ast 一致只取最后一段）
+    func_name, parts = None, []
+    while True:
+        m = _IDENT_RE.match(s, i)
+        if not m or keyword.iskeyword(m.group()):
+            return None
+        func_name, i = m.group(), m.end()
+        parts.append(func_name)
+        if i < n and s[i] == ".":
+            i += 1
+            continue
+        break
+    if dotted:
+        func_name = ".".join(parts)
+    if i >= n or s[i] != "(":
+        return None
+    i += 1
+    kwargs = {}
+    while True:
+        i = _skip_ws(s, i)
+        if i < n and s[i] == ")":
+            i += 1
+            break
+        m = _IDENT_RE.match(s, i)
+        if not m or keyword.iskeyword(m.group()) or m.group() in kwargs:
+            return None
+        key = m.group()
+        i = _skip_ws(s, m.end())
+        if i >= n or s[i] != "=" or s.startswith("==", i):
+            return None
+        i = _skip_ws(s, i + 1)
+        if i >= n:
+            return None
+        scanned = _scan_value(s, i, literals)
+        if scanned is None:
+            return None
+        value, i = scanned
+        kwargs[key] = value
+        i = _skip_ws(s, i)
+        if i < n and s[i] == ",":
+            i += 1
+            continue
+        if i < n and s[i] == ")":
+            i += 1
+            break
+        return None
+    if _skip_ws(s, i) != n:
+        return None
+    return {'function': func_name, 'args': kwargs}
+
+
+def _fast_parse_type(piece):
+    # 只处理最常见的 type(content='...') 单行形式，等价于参考实现里的正则 + escape_single_quotes 流程
+    if not piece.startswith(_TYPE_PREFIX) or "\n" in piece:
+        return None
+    s = piece if piece.strip().endswith(")") else piece.strip() + ")"
+    if s != s.rstrip() or not s.endswith("')") or s.find("')", len(_TYPE_PREFIX)) != len(s) - 2:
+        return None
+    content = s[len(_TYPE_PREFIX):-2]
+    if "'" in content:
+        content = escape_single_quotes(content)
+    value = _decode_str_body(content, "'")
+    if value is None:
+        return None
+    return {'function': 'type', 'args': {'content': value}}
+
+
+def _scan_simple_call(s):
+    """
+    最常见形状的快速通道：name(k='v', k2="v2", ...)，值都是不含反斜杠的单行字符串。
+    全部用 str 的内建方法（partition / find / isidentifier）完成，不逐字符循环；
+    其余写法（数字、点分名、转义、换行等）返回 None，交给 _scan_call。
+    """
+    if "\\" in s or "\n" in s or "\r" in s or "\x00" in s:
+        return None
+    name, paren, body = s.strip(" \t").partition("(")
+    if (not paren or not body.endswith(")") or not name.isidentifier() or not name.isascii()
+            or keyword.iskeyword(name)):
+        return None
+    body = body[:-1]
+    kwargs, i, n = {}, 0, len(body)
+    while True:
+        while i < n and body[i] in " \t":
+            i += 1
+        if i == n:
+            return {'function': name, 'args': kwargs}
+        eq = body.find("=", i)
+        if eq < 0:
+            return None
+        key = body[i:eq].rstrip(" \t")
+        if not key.isidentifier() or not key.isascii() or keyword.iskeyword(key) or key in kwargs:
+            return None
+        i = eq + 1
+        while i < n and body[i] in " \t":
+            i += 1
+        if i == n or body[i] not in "'\"" or body.startswith("==", eq):
+            return None
+        q = body[i]
+        end = body.find(q, i + 1)
+        if end < 0 or (end == i + 1 and body.startswith(q, end + 1)):
+            return None  # 未闭合，或三引号
+        kwargs[key] = body[i + 1:end]
+        i = end + 1
+        while i < n and body[i] in " \t":
+            i += 1
+        if i == n:
+            return {'function': name, 'args': kwargs}
+        if body[i] != ",":
+            return None  # 包括相邻字符串拼接、多余的右括号
+        i += 1
+
+
+def fast_parse_action(piece):
+    """解析按 ")\\n\\n" 切开后的单个动作片段；无法识别时返回 None。"""
+    if "type(content" in piece:
+        return _fast_parse_type(piece)
+    s = piece if piece.strip().endswith(")") else piece.strip() + ")"
+    return _scan_simple_call(s) or _scan_call(s)
+
+
+def _prepare_action_str(action_str):
+    # 参考实现中的逐动作预处理（补右括号、type(content=...) 的引号转义），供回退路径使用
+    if "type(content" in action_str:
+        if not action_str.strip().endswith(")"):
+            action_str = action_str.strip() + ")"
+        pattern = r"type\(content='(.*?)'\)"
+        if re.search(pattern, action_str):
+            content = re.sub(pattern, lambda match: match.group(1), action_str)
+        else:
+            raise ValueError("Pattern not found in the input string.")
+        action_str = "type(content='" + escape_single_quotes(content) + "')"
+    if not action_str.strip().endswith(")"):
+        action_str = action_str.strip() + ")"
+    return action_str
+
+
+def _until_action(text, start):
+    """(.+?)(?=\\s*Action: |$) 从 start 起的匹配（至少一个字符），已 strip。"""
+    k = text.find("Action: ", start + 1)
+    if k < 0:
+        return text[start:].strip()
+    j = k
+    while j > start + 1 and text[j - 1].isspace():
+        j -= 1
+    return text[start:j].strip()
+
+
+def _split_thought(text):
+    """返回 (reflection, thought)，与参考实现中的正则结果一致（用 find 实现，不走正则）。"""
+    if text.startswith("Reflection:"):
+        # r"Reflection: (.+?)Action_Summary: (.+?)(?=\s*Action: |$)"
+        start = text.find("Reflection: ")
+        if start < 0:
+            return None, None
+        start += 12
+        k = text.find("Action_Summary: ", start + 1)
+        if k < 0 or k + 16 >= len(text):
+            return None, None
+        return text[start:k].strip(), _until_action(text, k + 16)
+    if text.startswith("Action_Summary:"):
+        marker = "Action_Summary: "
+    else:
+        marker = "Thought: "
+    start = text.find(marker)
+    if start < 0 or start + len(marker) >= len(text):
+        return None, None
+    return None, _until_action(text, start + len(marker))
+
+
+def _convert_points(text):
+    """convert_point_to_coordinates 的 find 实现：去掉 [EOS]，<point>x y</point> -> (x,y)。"""
+    text = text.replace("[EOS]", "")
+    out, pos = [], 0
+    i = text.find("<point>")
+    while i >= 0:
+        j = k = i + 7
+        while k < len(text) and text[k].isdecimal():
+            k += 1
+        m = k
+        while m < len(text) and text[m].isspace():
+            m += 1
+        e = m
+        while e < len(text) and text[e].isdecimal():
+            e += 1
+        if k > j and m > k and e > m and text.startswith("</point>", e):
+            out.append(text[pos:i])
+            out.append(f"({int(text[j:k])},{int(text[m:e])})")
+            pos = e + 8
+            i = text.find("<point>", pos)
+        else:
+            i = text.find("<point>", i + 1)
+    out.append(text[pos:])
+    return "".join(out).strip()
+
+
+@metrics.timed(PARSE_SECONDS, PARSE_FAILURES, parser="legacy")
+def parse_action_to_structure_output(text,
+                                     factor,
+                                     origin_resized_height,
+                                     origin_resized_width,
+                                     model_type="qwen25vl",
+                                     max_pixels=16384 * 28 * 28,
+                                     min_pixels=100 * 28 * 28):
+    """旧接口：返回 dict 列表（框为 str(list)）。与 parse_action_to_ir 共用分词，但直接拼 dict，不经过 Action。"""
+    space = coord_space(model_type, origin_resized_height, origin_resized_width,
+                        factor, min_pixels, max_pixels)
+    text, reflection, thought, parsed_actions, all_action = tokenize_response(text)
+    actions = []
+    for action_type, action_inputs, box_names in raw_actions(parsed_actions, all_action):
+        for name in box_names:
+            action_inputs[name] = str(list(space.normalize(action_inputs[name])))
+        actions.append({"reflection": reflection, "thought": thought, "action_type": action_type,
+                        "action_inputs": action_inputs, "text": text})
+    return actions
+
+
+def preprocess_response(text):
+    """point 写法统一为 *_box、切出 Thought/Reflection，并把 Action 部分按 ")\\n\\n" 切成片段。"""
+    text = text.strip()
+
+    if "point" in text:  # 绝大多数响应不含 point：一次扫描跳过下面四次
+        if "<point>" in text:
+            text = _convert_points(text)
+        if "start_point=" in text:
+            text = text.replace("start_point=", "start_box=")
+        if "end_point=" in text:
+            text = text.replace("end_point=", "end_box=")
+        if "point=" in text:
+            text = text.replace("point=", "start_box=")
+
+    reflection, thought = _split_thought(text)
+    assert "Action:" in text
+    pieces = text.rpartition("Action: ")[2].split(")\n\n")
+    return text, reflection, thought, pieces
+
+
+def tokenize_response(text):
+    """
+    阶段一（与屏幕尺寸无关）：预处理 + 切分 Thought/Action + 逐动作分词。
+    返回 (text, reflection, thought, parsed_actions, raw_strs)；无法解析的动作在 parsed_actions 中为 None，
+    由 raw_actions() 按顺序报错，与参考实现的报错顺序一致。
+    """
+    text, reflection, thought, pieces = preprocess_response(text)
+
+    # 与参考实现相同的顺序：先全部预处理，再解析，最后逐个转换坐标
+    parsed_actions, all_action = [], []
+    for piece in pieces:
+        parsed = fast_parse_action(piece)
+        parsed_actions.append(parsed)
+        all_action.append(piece if parsed is not None else _prepare_action_str(piece))
+    for idx, parsed in enumerate(parsed_actions):
+        if parsed is None:
+            parsed_actions[idx] = parse_action(all_action[idx].replace("\n", "\\n").lstrip())
+    return text, reflection, thought, parsed_actions, all_action
+
+
+def raw_actions(parsed_actions, all_action):
+    """
+    阶段二：逐动作整理参数。*_box 参数先转成未归一化的浮点列表，
+    返回 [(action_type, action_inputs, box_param_names)]。
+    """
+    out = []
+    for action_instance, raw_str in zip(parsed_actions, all_action):
+        if action_instance == None:
+            print(f"Action can't parse: {raw_str}")
+            raise ValueError(f"Action can't parse: {raw_str}")
+        action_inputs, box_names = {}, []
+        for param_name, param in action_instance["args"].items():
+            if param == "": continue
+            param = param.lstrip()
+            action_inputs[param_name.strip()] = param
+            if "start_box" in param_name or "end_box" in param_name:
+                numbers = param.replace("(", "").replace(")", "").split(",")
+                action_inputs[param_name.strip()] = [float(num) for num in numbers]
+                box_names.append(param_name.strip())
+        out.append((action_instance["function"], action_inputs, box_names))
+    return out
+
+
+@metrics.timed(PARSE_SECONDS, PARSE_FAILURES, parser="ir")
+def parse_action_to_ir(text,
+                       factor,
+                       origin_resized_height,
+                       origin_resized_width,
+                       model_type="qwen25vl",
+                       max_pixels=16384 * 28 * 28,
+                       min_pixels=100 * 28 * 28):
+    """解析模型输出为 Action 列表，坐标为数值元组。"""
+    space = coord_space(model_type, origin_resized_height, origin_resized_width,
+                        factor, min_pixels, max_pixels)
+    text, reflection, thought, parsed_actions, all_action = tokenize_response(text)
+    actions = []
+    for action_type, action_inputs, box_names in raw_actions(parsed_actions, all_action):
+        for name in box_names:
+            action_inputs[name] = space.normalize(action_inputs[name])
+        actions.append(Action(action_type, action_inputs, thought, reflection, text))
+    return actions
+
+
+# ---------- 动作序列优化 ----------
+# 解析之后、生成代码/执行之前的一遍合并，减少每轮的输入事件和等待次数。规则（按顺序检查）：
+#   1. drop_noop_type    content 为空的 type：执行器本来就什么都不做，直接丢弃
+#   2. drop_noop_scroll  direction 不含 up/down 的 scroll：同上
+#   3. drop_hover        hover 后紧跟同一点（SAME_POINT_EPS 内）的指针动作：后者本身会移动鼠标，hover 多余；
+#                        不同点的 hover 保留（可能是在展开悬停菜单）
+#   4. merge_type        连续 type 且前一个不以换行（提交）结尾：拼成一次输入，焦点仍在同一输入框
+#   5. merge_scroll      连续同方向、同一点（或都无点）的 scroll：合并为一个，repeat 为次数之和
+#   6. drop_after_finished  finished 之后的动作：执行器遇到 finished 即结束，后面的永远不会执行
+# 只合并相邻动作，不跨越其它动作重排；输入不会被修改（合并时生成新的 Action）。
+
+POINTER_ACTIONS = ("click", "left_single", "left_double", "right_single", "hover", "drag", "select", "scroll")
+SAME_POINT_EPS = 0.002  # 归一化坐标，约 2~4 像素
+
+
+def _submits(content):
+    return content.endswith("\n") or content.endswith("\\n")
+
+
+def _same_point(a, b):
+    pa, pb = a.center(), b.center()
+    if pa is None or pb is None:
+        return pa is None and pb is None
+    return abs(pa[0] - pb[0]) <= SAME_POINT_EPS and abs(pa[1] - pb[1]) <= SAME_POINT_EPS
+
+
+def _scroll_direction(action):
+    direction = (action.action_inputs.get("direction") or "").lower()
+    return "up" if "up" in direction else "down" if "down" in direction else None
+
+
+def optimize_actions(actions: Iterable, counts: Optional[Counter] = None) -> List[Action]:
+    """按上面的规则合并/丢弃冗余动作；counts（可选）累计每条规则触发的次数。"""
+    counts = Counter() if counts is None else counts
+    actions = [Action.from_dict(a) for a in actions]
+    out: List[Action] = []
+    for idx, a in enumerate(actions):
+        t = a.action_type
+        if t == "type" and not (a.action_inputs.get("content") or ""):
+            counts["drop_noop_type"] += 1
+            continue
+        if t == "scroll" and _scroll_direction(a) is None:
+            counts["drop_noop_scroll"] += 1
+            continue
+        if out and out[-1].action_type == "hover" and t in POINTER_ACTIONS and a.start_box \
+                and _same_point(out[-1], a):
+            out.pop()
+            counts["drop_hover"] += 1
+        prev = out[-1] if out else None
+        if prev is not None and prev.action_type == "type" and t == "type" \
+                and not _submits(prev.action_inputs.get("content") or ""):
+            merged = prev.action_inputs["content"] + a.action_inputs["content"]
+            out[-1] = replace(prev, action_inputs={**prev.action_inputs, "content": merged})
+            counts["merge_type"] += 1
+            continue
+        if prev is not None and prev.action_type == "scroll" and t == "scroll" \
+                and _scroll_direction(prev) == _scroll_direction(a) and _same_point(prev, a):
+            repeat = int(prev.action_inputs.get("repeat") or 1) + int(a.action_inputs.get("repeat") or 1)
+            out[-1] = replace(prev, action_inputs={**prev.action_inputs, "repeat": repeat})
+            counts["merge_scroll"] += 1
+            continue
+        out.append(a)
+        if t == "finished":
+            if idx + 1 < len(actions):
+                counts["drop_after_finished"] += len(actions) - idx - 1
+            break
+    return out
+
+
 def parsing_response_to_pyautogui_code(responses,
                                        image_height: int,
                                        image_width: int,
-                                       input_swap: bool = True) -> str:
+                                       input_swap: bool = True,
+                                       optimize: bool = False) -> str:
     '''
     将M模型的输出解析为OSWorld中的action，生成pyautogui代码字符串
     参数:
-        response: 包含模型输出的字典，结构类似于：
+        response: Action（parse_action_to_ir 的输出），或旧的 dict 形状，结构类似于：
         {
             "action_type": "hotkey",
             "action_inputs": {
@@ -292,13 +1004,16 @@ def parsing_response_to_pyautogui_code(responses,
                 "end_box": None
             }
         }
+        optimize: 为 True 时先经过 optimize_actions() 合并冗余动作
     返回:
         生成的pyautogui代码字符串
     '''
 
     pyautogui_code = f"import pyautogui\nimport time\n"
-    if isinstance(responses, dict):
+    if isinstance(responses, (dict, Action)):
         responses = [responses]
+    if optimize:
+        responses = optimize_actions(responses)
     for response_id, response in enumerate(responses):
         if "observation" in response:
             observation = response["observation"]
@@ -315,9 +1030,10 @@ def parsing_response_to_pyautogui_code(responses,
         else:
             pyautogui_code += f"\ntime.sleep(1)\n"
 
-        action_dict = response
-        action_type = action_dict.get("action_type")
-        action_inputs = action_dict.get("action_inputs", {})
+        # 旧 dict 形状在这里一次性转为 IR，后面直接使用数值坐标
+        action = Action.from_dict(response)
+        action_type = action.action_type
+        action_inputs = action.action_inputs
 
         if action_type == "hotkey":
             # Parsing hotkey action
@@ -423,29 +1139,17 @@ def parsing_response_to_pyautogui_code(responses,
 
         elif action_type in ["drag", "select"]:
             # Parsing drag or select action based on start and end_boxes
-            start_box = action_inputs.get("start_box")
-            end_box = action_inputs.get("end_box")
-            if start_box and end_box:
-                x1, y1, x2, y2 = eval(
-                    start_box)  # Assuming box is in [x1, y1, x2, y2]
-                sx = round(float((x1 + x2) / 2) * image_width, 3)
-                sy = round(float((y1 + y2) / 2) * image_height, 3)
-                x1, y1, x2, y2 = eval(
-                    end_box)  # Assuming box is in [x1, y1, x2, y2]
-                ex = round(float((x1 + x2) / 2) * image_width, 3)
-                ey = round(float((y1 + y2) / 2) * image_height, 3)
+            if action.start_box and action.end_box:
+                sx, sy = action.center("start_box", image_width, image_height)
+                ex, ey = action.center("end_box", image_width, image_height)
                 pyautogui_code += (
                     f"\npyautogui.moveTo({sx}, {sy})\n"
                     f"\npyautogui.dragTo({ex}, {ey}, duration=1.0)\n")
 
         elif action_type == "scroll":
             # Parsing scroll action
-            start_box = action_inputs.get("start_box")
-            if start_box:
-                x1, y1, x2, y2 = eval(
-                    start_box)  # Assuming box is in [x1, y1, x2, y2]
-                x = round(float((x1 + x2) / 2) * image_width, 3)
-                y = round(float((y1 + y2) / 2) * image_height, 3)
+            if action.start_box:
+                x, y = action.center("start_box", image_width, image_height)
 
                 # # 先点对应区域，再滚动
                 # pyautogui_code += f"\npyautogui.click({x}, {y}, button='left')"
@@ -453,34 +1157,25 @@ def parsing_response_to_pyautogui_code(responses,
                 x = None
                 y = None
             direction = action_inputs.get("direction", "")
+            clicks = 5 * int(action_inputs.get("repeat") or 1)  # repeat 来自 optimize_actions 合并的连续滚动
 
             if x == None:
                 if "up" in direction.lower():
-                    pyautogui_code += f"\npyautogui.scroll(5)"
+                    pyautogui_code += f"\npyautogui.scroll({clicks})"
                 elif "down" in direction.lower():
-                    pyautogui_code += f"\npyautogui.scroll(-5)"
+                    pyautogui_code += f"\npyautogui.scroll({-clicks})"
             else:
                 if "up" in direction.lower():
-                    pyautogui_code += f"\npyautogui.scroll(5, x={x}, y={y})"
+                    pyautogui_code += f"\npyautogui.scroll({clicks}, x={x}, y={y})"
                 elif "down" in direction.lower():
-                    pyautogui_code += f"\npyautogui.scroll(-5, x={x}, y={y})"
+                    pyautogui_code += f"\npyautogui.scroll({-clicks}, x={x}, y={y})"
 
         elif action_type in [
                 "click", "left_single", "left_double", "right_single", "hover"
         ]:
             # Parsing mouse click actions
-            start_box = action_inputs.get("start_box")
-            start_box = str(start_box)
-            if start_box:
-                start_box = eval(start_box)
-                if len(start_box) == 4:
-                    x1, y1, x2, y2 = start_box  # Assuming box is in [x1, y1, x2, y2]
-                elif len(start_box) == 2:
-                    x1, y1 = start_box
-                    x2 = x1
-                    y2 = y1
-                x = round(float((x1 + x2) / 2) * image_width, 3)
-                y = round(float((y1 + y2) / 2) * image_height, 3)
+            if action.start_box:
+                x, y = action.center("start_box", image_width, image_height)
                 if action_type == "left_single" or action_type == "click":
                     pyautogui_code += f"\npyautogui.click({x}, {y}, button='left')"
                 elif action_type == "left_double":
@@ -0,0 +1,254 @@
+# SPDX-License-Identifier: Apache-2.0
+"""
+Local repair of malformed model actions.
+
+When parse_action_to_ir rejects a response (unbalanced quotes, a missing closing
+paren, stray [EOS] / chat-template tokens, odd box spellings), re-querying the model
+costs seconds. ActionRepairer instead tries a short list of rewrites, cumulatively and
+in order, and accepts the first text that parses into valid actions. Which repairs
+fired is counted so the rewrites can be pruned or extended from real traffic.
+
+    repairer = ActionRepairer()
+    actions = repairer.parse(raw, 28, 800, 600)   # raises ActionRepairError if unfixable
+    repairer.counts  # Counter({'clean': 120, 'repaired': 7, 'close_parens': 5, ...})
+"""
+from __future__ import annotations
+import re
+import math
+from collections import Counter
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from ui_tars.action_parser import Action, escape_single_quotes, parse_action_to_ir
+
+ACTION_MARK = "Action: "
+PARSE_ERRORS = (ValueError, AssertionError, AttributeError, SyntaxError, IndexError, TypeError, KeyError)
+_IDENT = re.compile(r"[A-Za-z_][\w.]*\Z")
+
+class ActionRepairError(ValueError):
+    """No repair produced a parseable response; `.original` holds the first parse error."""
+
+    def __init__(self, message: str, original: Exception):
+        super().__init__(message)
+        self.original = original
+
+# ---------- 1) Rewrites ----------
+# Each takes the full response and returns the rewritten text (or the same text if it
+# does not apply). They only touch the part after the last "Action: ".
+
+def _split_action(text: str) -> Tuple[str, str]:
+    head, mark, tail = text.rpartition(ACTION_MARK)
+    return (head + mark, tail) if mark else ("", text)
+
+_TEMPLATE_TOKENS = re.compile(r"\[EOS\]|<\|im_end\|>|<\|endoftext\|>|</s>|<\|eot_id\|>")
+
+def strip_eos(text: str) -> str:
+    return _TEMPLATE_TOKENS.sub("", text).rstrip()
+
+_MARK_VARIANTS = re.compile(r"(?im)^\s*(?:\*\*)?action(?:\*\*)?\s*[:：]\s*(?:\*\*)?\s*")
+
+def normalize_action_mark(text: str) -> str:
+    # "action:", "Action：", "**Action:**", "Action:click(" -> "Action: "
+    return _MARK_VARIANTS.sub(ACTION_MARK, text)
+
+_BOX_TOKENS = re.compile(r"<\|box_start\|>|<\|box_end\|>|<bbox>|</bbox>")
+_BOX_ALIASES = re.compile(r"(?<![\w])(?:box|bbox|coordinate|coordinates|position|point_box)=")
+_UNQUOTED_BOX = re.compile(r"((?:start|end)_box=)\s*[\[(]\s*([-\d.\s,]+?)\s*[\])]")
+_SPACED_BOX = re.compile(r"((?:start|end)_box=')\s*[\[(]?\s*(-?[\d.]+)[\s,]+(-?[\d.]+)(?:[\s,]+(-?[\d.]+)[\s,]+(-?[\d.]+))?\s*[\])]?\s*'")
+
+def normalize_box_spelling(text: str) -> str:
+    # box=/coordinate=/position= -> start_box=; [x, y] / (x y) / bare (x,y) -> '(x,y)'
+    head, tail = _split_action(text)
+    tail = _BOX_TOKENS.sub("", tail)
+    tail = _BOX_ALIASES.sub("start_box=", tail)
+    tail = _UNQUOTED_BOX.sub(lambda m: f"{m.group(1)}'({m.group(2)})'", tail)
+
+    def spaced(m):
+        nums = [n for n in m.groups()[1:] if n is not None]
+        return m.group(1) + "(" + ",".join(nums) + ")'"
+    return head + _SPACED_BOX.sub(spaced, tail)
+
+def strip_trailing_junk(text: str) -> str:
+    # drop anything after the final action's closing paren (prose, code fences, stray tokens)
+    head, tail = _split_action(text)
+    if tail.lstrip().startswith("type("):
+        end = tail.rfind("')")
+        end = end + 2 if end >= 0 else -1
+    else:
+        end = _balanced_end(tail)
+    if end < 0 or not tail[end:].strip():
+        return text
+    return head + tail[:end]
+
+def _balanced_end(s: str) -> int:
+    """Index just past the last top-level ')' outside quotes, or -1."""
+    depth, quote, escape, last = 0, None, False, -1
+    for i, ch in enumerate(s):
+        if quote:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == quote:
+                quote = None
+        elif ch in "'\"":
+            quote = ch
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+            if depth == 0:
+                last = i + 1
+    return last
+
+_CONTENT_CALL = re.compile(r"(type|finished)\(\s*content\s*=\s*(['\"]?)")
+
+def _escape_content(action: str) -> str:
+    stripped = action.strip()
+    m = _CONTENT_CALL.match(stripped)
+    if not m:
+        return action
+    name, quote, body = m.group(1), m.group(2), stripped[m.end():]
+    if body.endswith(")"):
+        body = body[:-1].rstrip()
+    if quote and body.endswith(quote) and not body.endswith("\\" + quote):
+        body = body[:-1]
+    if quote == '"':
+        body = body.replace('\\"', '"')
+    return name + "(content='" + escape_single_quotes(body) + "')"
+
+def escape_type_quotes(text: str) -> str:
+    # type(content="say "hi"") / finished(content='it's done') / type(content='abc) -> name(content='...'),
+    # per action, so a broken type() ahead of other actions does not swallow them
+    head, tail = _split_action(text)
+    *rest, last = tail.split(")\n\n")
+    pieces = [_escape_content(p + ")") for p in rest] + [_escape_content(last)]
+    return head + "\n\n".join(pieces)
+
+def close_parens(text: str) -> str:
+    # terminate an open string, then close every open paren of the last action
+    # (earlier actions are cut at ")\n\n", so only the last one can be truncated)
+    head, tail = _split_action(text)
+    prefix, sep, last = tail.rpartition(")\n\n")
+    depth, quote, escape = 0, None, False
+    for ch in last:
+        if quote:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == quote:
+                quote = None
+        elif ch in "'\"":
+            quote = ch
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+    last = last.rstrip()
+    if quote:
+        last += quote
+    return head + prefix + sep + last + ")" * max(depth, 0)
+
+def action_count(text: str) -> int:
+    """Number of actions after the last "Action: " (pieces between ')\\n\\n' separators)."""
+    _, tail = _split_action(normalize_action_mark(text))
+    return sum(1 for piece in tail.split(")\n\n") if piece.strip())
+
+# (name, rewrite), tried cumulatively in this order
+REPAIRS: List[Tuple[str, Callable[[str], str]]] = [
+    ("strip_eos", strip_eos),
+    ("normalize_action_mark", normalize_action_mark),
+    ("normalize_box_spelling", normalize_box_spelling),
+    ("escape_type_quotes", escape_type_quotes),
+    ("close_parens", close_parens),
+    ("strip_trailing_junk", strip_trailing_junk),  # last: on a truncated action it would cut, not fix
+]
+
+# ---------- 2) Repairer ----------
+
+def valid_actions(actions: Sequence[Action]) -> bool:
+    """A repair is accepted only if every action has a plain name and finite 4-number boxes."""
+    if not actions:
+        return False
+    for a in actions:
+        if not isinstance(a.action_type, str) or not _IDENT.match(a.action_type):
+            return False
+        for name in ("start_box", "end_box"):
+            box = a.action_inputs.get(name)
+            if box is not None and (len(box) != 4 or not all(math.isfinite(v) for v in box)):
+                return False
+    return True
+
+class ActionRepairer:
+    """
+    parse() = parse_fn (parse_action_to_ir by default), plus local repairs when it fails.
+    counts: 'clean' / 'repaired' / 'unrepairable' per response, and one entry per repair
+    that was part of a successful fix.
+    """
+
+    def __init__(self, repairs: Sequence[Tuple[str, Callable[[str], str]]] = REPAIRS,
+                 parse_fn: Callable[..., List[Action]] = parse_action_to_ir):
+        self.repairs = list(repairs)
+        self.parse_fn = parse_fn  # e.g. action_schema.parse_typed_actions
+        self.counts: Counter = Counter()
+
+    def parse(self, text: str, factor, origin_resized_height, origin_resized_width,
+              model_type="qwen25vl", max_pixels=16384 * 28 * 28, min_pixels=100 * 28 * 28) -> List[Action]:
+        args = (factor, origin_resized_height, origin_resized_width, model_type, max_pixels, min_pixels)
+        try:
+            actions = self.parse_fn(text, *args)
+        except PARSE_ERRORS as e:
+            original = e
+        else:
+            self.counts["clean"] += 1
+            return actions
+
+        fixed = self.repair(text, args)
+        if fixed is None:
+            self.counts["unrepairable"] += 1
+            raise ActionRepairError(f"Action can't parse (no repair applied): {original}", original)
+        actions, fired = fixed
+        self.counts["repaired"] += 1
+        self.counts.update(fired)
+        return actions
+
+    def repair(self, text: str, args: tuple) -> Optional[Tuple[List[Action], List[str]]]:
+        """
+        Apply the rewrites cumulatively; return (actions, names that changed the text) on success.
+        A rewrite that leaves fewer actions than the response contains is dropped, never accepted.
+        """
+        fired: List[str] = []
+        expected = action_count(text)
+        for name, rewrite in self.repairs:
+            try:
+                new = rewrite(text)
+            except PARSE_ERRORS:
+                continue
+            if new == text or action_count(new) < expected:
+                continue
+            text = new
+            fired.append(name)
+            try:
+                actions = self.parse_fn(text, *args)
+            except PARSE_ERRORS:
+                continue
+            if len(actions) >= expected and valid_actions(actions):
+                return actions, fired
+        return None
+
+    def summary(self) -> dict:
+        total = self.counts["clean"] + self.counts["repaired"] + self.counts["unrepairable"]
+        failed = self.counts["repaired"] + self.counts["unrepairable"]
+        return {"responses": total,
+                "parse_failures": failed,
+                "repaired_ratio": round(self.counts["repaired"] / failed, 4) if failed else None,
+                "repairs": {name: self.counts[name] for name, _ in self.repairs if self.counts[name]}}
+
+_default = ActionRepairer()
+
+def parse_action_to_ir_repaired(text: str, *args, **kwargs) -> List[Action]:
+    """parse_action_to_ir with the module-wide repairer (see repair_stats())."""
+    return _default.parse(text, *args, **kwargs)
+
+def repair_stats() -> dict:
+    return _default.summary()
@@ -0,0 +1,329 @@
+# SPDX-License-Identifier: Apache-2.0
+"""
+Typed action schemas.
+
+Every action the agent may emit is declared once with its parameters and their types
+(str / int / float / bool, Optional[...], List[...], Dict[...], BoxParam). Each
+declaration is compiled into a validator at registration time, and parse_typed_actions()
+returns Actions whose inputs are already coerced and checked, with full literal support
+(`health.upsert_patient(symptoms=["cough", "fever"])` keeps its list) and the full dotted
+action name. route_actions() groups a parse by the executor that owns each action, so
+callers no longer dispatch on string prefixes.
+
+    actions = parse_typed_actions(raw, 28, 800, 600)
+    routed = route_actions(actions)      # {"health": [...], "gui": [...]}
+    rest, health = split_response(raw)   # health actions out, raw text of the GUI ones kept
+"""
+from __future__ import annotations
+import ast
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union, get_args, get_origin
+
+from ui_tars import metrics
+from ui_tars.action_parser import (
+    Action, IMAGE_FACTOR, MAX_PIXELS, MIN_PIXELS, PARSE_FAILURES, PARSE_SECONDS,
+    _prepare_action_str, _scan_call, _split_thought, coord_space, fast_parse_action, preprocess_response,
+)
+
+class ActionSchemaError(ValueError):
+    """Unknown action, unknown/missing parameter, or a value of the wrong type."""
+
+class BoxParam:
+    """Type marker for start_box/end_box: "(x,y)" / "(x1,y1,x2,y2)" / numeric sequence, normalized on parse."""
+
+# ---------- 1) Compiling type specs ----------
+
+def _type_name(spec) -> str:
+    if get_origin(spec) is None and hasattr(spec, "__name__"):
+        return spec.__name__
+    return str(spec).replace("typing.", "")
+
+def _fail(spec, value):
+    raise TypeError(f"expected {_type_name(spec)}, got {value!r}")
+
+def compile_validator(spec) -> Callable[[Any], Any]:
+    """Turn a type spec into a function that returns the coerced value or raises TypeError."""
+    if spec is Any:
+        return lambda v: v
+    if spec is BoxParam:
+        def box(v):
+            if isinstance(v, str):
+                try:
+                    nums = [float(x) for x in v.replace("(", "").replace(")", "").split(",")]
+                except ValueError:
+                    _fail(spec, v)
+            elif isinstance(v, (list, tuple)) and all(isinstance(x, (int, float)) and not isinstance(x, bool) for x in v):
+                nums = [float(x) for x in v]
+            else:
+                _fail(spec, v)
+            if len(nums) not in (2, 4):
+                _fail(spec, v)
+            return nums
+        return box
+    if spec is str:
+        def to_str(v):
+            if isinstance(v, str):
+                return v
+            if isinstance(v, (int, float)) and not isinstance(v, bool):
+                return str(v)
+            _fail(spec, v)
+        return to_str
+    if spec is int:
+        def to_int(v):
+            if isinstance(v, bool):
+                _fail(spec, v)
+            if isinstance(v, int):
+                return v
+            if isinstance(v, float) and v.is_integer():
+                return int(v)
+            if isinstance(v, str) and v.strip().lstrip("-").isdigit():
+                return int(v)
+            _fail(spec, v)
+        return to_int
+    if spec is float:
+        def to_float(v):
+            if isinstance(v, (int, float)) and not isinstance(v, bool):
+                return float(v)
+            if isinstance(v, str):
+                try:
+                    return float(v)
+                except ValueError:
+                    pass
+            _fail(spec, v)
+        return to_float
+    if spec is bool:
+        def to_bool(v):
+            if isinstance(v, bool):
+                return v
+            if isinstance(v, str) and v.lower() in ("true", "false"):
+                return v.lower() == "true"
+            _fail(spec, v)
+        return to_bool
+
+    origin, args = get_origin(spec), get_args(spec)
+    if origin is Union:
+        optional = type(None) in args
+        inners = [compile_validator(a) for a in args if a is not type(None)]
+        def union(v):
+            if v is None:
+                if optional:
+                    return None
+                _fail(spec, v)
+            for inner in inners:
+                try:
+                    return inner(v)
+                except TypeError:
+                    continue
+            _fail(spec, v)
+        return union
+    if origin is list:
+        item = compile_validator(args[0] if args else Any)
+        def to_list(v):
+            if isinstance(v, str):
+                v = [v]  # a single item written without brackets
+            if not isinstance(v, (list, tuple)):
+                _fail(spec, v)
+            return [item(x) for x in v]
+        return to_list
+    if origin is dict:
+        key = compile_validator(args[0] if args else Any)
+        val = compile_validator(args[1] if args else Any)
+        def to_dict(v):
+            if not isinstance(v, dict):
+                _fail(spec, v)
+            return {key(k): val(x) for k, x in v.items()}
+        return to_dict
+    raise TypeError(f"unsupported type spec {spec!r}")
+
+# ---------- 2) Registry ----------
+
+@dataclass
+class ActionSchema:
+    name: str
+    params: Dict[str, Any]                  # parameter -> type spec
+    required: Tuple[str, ...] = ()
+    target: str = "gui"                     # which executor owns the action: "gui" | "health"
+    validators: Dict[str, Callable[[Any], Any]] = field(default_factory=dict, repr=False)
+    box_params: Tuple[str, ...] = field(default=(), repr=False)
+
+    def __post_init__(self):
+        self.validators = {p: compile_validator(t) for p, t in self.params.items()}
+        self.box_params = tuple(p for p, t in self.params.items() if t is BoxParam)
+
+    def validate(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        out = {}
+        for param, value in args.items():
+            check = self.validators.get(param)
+            if check is None:
+                raise ActionSchemaError(f"{self.name}() got an unexpected parameter {param!r}")
+            if value == "" and param in self.box_params:
+                continue  # same as parse_action_to_ir: an empty box means "no box"
+            try:
+                out[param] = check(value)
+            except TypeError as e:
+                raise ActionSchemaError(f"{self.name}({param}=...): {e}") from None
+        missing = [p for p in self.required if p not in out]
+        if missing:
+            raise ActionSchemaError(f"{self.name}() missing required parameter(s): {', '.join(missing)}")
+        return out
+
+ACTION_SCHEMAS: Dict[str, ActionSchema] = {}
+
+def register_action(name: str, params: Optional[Dict[str, Any]] = None, required: Tuple[str, ...] = (),
+                    target: str = "gui") -> ActionSchema:
+    schema = ActionSchema(name, dict(params or {}), tuple(required), target)
+    ACTION_SCHEMAS[name] = schema
+    return schema
+
+def schema_for(name: str) -> ActionSchema:
+    try:
+        return ACTION_SCHEMAS[name]
+    except KeyError:
+        raise ActionSchemaError(f"unknown action {name!r}") from None
+
+# GUI action space (prompt.py + the actions ActionExecutor handles)
+_POINT = {"start_box": BoxParam}
+for _name in ("click", "left_single", "left_double", "right_single", "hover", "long_press"):
+    register_action(_name, _POINT, required=("start_box",))
+for _name in ("drag", "select"):
+    register_action(_name, {"start_box": BoxParam, "end_box": BoxParam}, required=("start_box", "end_box"))
+register_action("hotkey", {"key": str, "hotkey": str})
+for _name in ("press", "keydown", "release", "keyup"):
+    register_action(_name, {"key": str, "press": str})
+register_action("type", {"content": str}, required=("content",))
+register_action("scroll", {"start_box": BoxParam, "direction": str, "repeat": int}, required=("direction",))
+register_action("screenshot", {"save_dir": str, "filename": str, "start_box": BoxParam, "end_box": BoxParam})
+register_action("open_app", {"app_name": str}, required=("app_name",))
+for _name in ("system_screenshot", "wait", "call_user", "press_home", "press_back"):
+    register_action(_name)
+register_action("finished", {"content": str})
+
+# HIMS actions (see health.execute_health_actions)
+register_action("health.ensure_hims", target="health")
+register_action("health.extract_and_update", {"dialogue": str}, required=("dialogue",), target="health")
+register_action("health.upsert_patient", {
+    "patient_name": str,
+    "symptoms": List[str],
+    "treatment_plan": Optional[str],
+    "next_steps": Optional[str],
+    "appointment_date": Optional[str],
+    "doctor": Optional[str],
+    "imaging": Optional[str],
+    "patient_id": Optional[str],
+}, required=("patient_name",), target="health")
+register_action("health.search", {"query": str, "top_k": int}, required=("query",), target="health")
+
+# ---------- 3) Parsing ----------
+
+def _dotted_name(node) -> Optional[str]:
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        base = _dotted_name(node.value)
+        return f"{base}.{node.attr}" if base else None
+    return None
+
+def _parse_call_literal(piece: str) -> dict:
+    """ast fallback with full literal support: {'function': dotted name, 'args': {...}}."""
+    s = _prepare_action_str(piece)
+    try:
+        call = ast.parse(s.replace("\n", "\\n").lstrip(), mode="eval").body  # like parse_action
+    except SyntaxError:
+        try:
+            call = ast.parse(s.lstrip(), mode="eval").body  # multi-line lists/dicts
+        except SyntaxError as e:
+            raise ActionSchemaError(f"Action can't parse: {piece!r} ({e.msg})") from None
+    name = _dotted_name(call.func) if isinstance(call, ast.Call) else None
+    if name is None:
+        raise ActionSchemaError(f"Action can't parse: {piece!r} (not a call)")
+    if call.args:
+        raise ActionSchemaError(f"{name}() takes keyword arguments only")
+    args = {}
+    for kw in call.keywords:
+        try:
+            args[kw.arg] = ast.literal_eval(kw.value)
+        except ValueError:
+            raise ActionSchemaError(f"{name}({kw.arg}=...) is not a literal") from None
+    return {"function": name, "args": args}
+
+def parse_call(piece: str) -> dict:
+    """One action piece -> {'function', 'args'}; fast scanner first, ast + literal_eval otherwise."""
+    if "type(content" in piece:
+        parsed = fast_parse_action(piece)
+    else:
+        s = piece if piece.strip().endswith(")") else piece.strip() + ")"
+        parsed = _scan_call(s, literals=True, dotted=True)
+    return parsed if parsed is not None else _parse_call_literal(piece)
+
+@metrics.timed(PARSE_SECONDS, PARSE_FAILURES, parser="typed")
+def parse_typed_actions(text: str,
+                        factor: int = IMAGE_FACTOR,
+                        origin_resized_height: int = 1080,
+                        origin_resized_width: int = 1920,
+                        model_type: str = "qwen25vl",
+                        max_pixels: int = MAX_PIXELS,
+                        min_pixels: int = MIN_PIXELS,
+                        schemas: Optional[Dict[str, ActionSchema]] = None) -> List[Action]:
+    """Like parse_action_to_ir, but arguments are validated against the schema registry."""
+    schemas = ACTION_SCHEMAS if schemas is None else schemas
+    space = coord_space(model_type, origin_resized_height, origin_resized_width, factor, min_pixels, max_pixels)
+    text, reflection, thought, pieces = preprocess_response(text)
+    actions = []
+    for piece in pieces:
+        call = parse_call(piece)
+        schema = schemas.get(call["function"])
+        if schema is None:
+            raise ActionSchemaError(f"unknown action {call['function']!r}")
+        inputs = schema.validate(call["args"])
+        for name in schema.box_params:
+            if name in inputs:
+                inputs[name] = space.normalize(inputs[name])
+        actions.append(Action(schema.name, inputs, thought, reflection, text))
+    return actions
+
+def route_actions(actions, schemas: Optional[Dict[str, ActionSchema]] = None) -> Dict[str, List[Action]]:
+    """Group actions by the target declared in their schema, keeping order within each group."""
+    schemas = ACTION_SCHEMAS if schemas is None else schemas
+    routed: Dict[str, List[Action]] = {}
+    for a in actions:
+        a = Action.from_dict(a)
+        schema = schemas.get(a.action_type)
+        if schema is None:
+            raise ActionSchemaError(f"unknown action {a.action_type!r}")
+        routed.setdefault(schema.target, []).append(a)
+    return routed
+
+_PIECE_NAME = re.compile(r"\s*([A-Za-z_][\w.]*)\s*\(")
+
+@metrics.timed(PARSE_SECONDS, PARSE_FAILURES, parser="split")
+def split_response(text: str, target: str = "health",
+                   schemas: Optional[Dict[str, ActionSchema]] = None) -> Tuple[str, List[Action]]:
+    """
+    Take the actions owned by `target` out of a raw response: returns the response with
+    only the other actions left (verbatim, for the client's own parser; without an
+    "Action:" line if none are left) and the taken actions, parsed and validated.
+    """
+    schemas = ACTION_SCHEMAS if schemas is None else schemas
+    head, mark, tail = text.rpartition("Action: ")
+    if not mark:
+        return text, []
+    reflection, thought = _split_thought(text)
+    pieces = tail.split(")\n\n")
+    kept, taken = [], []
+    for i, piece in enumerate(pieces):
+        m = _PIECE_NAME.match(piece)
+        schema = schemas.get(m.group(1)) if m else None
+        if schema is None or schema.target != target:
+            kept.append(i)
+            continue
+        call = parse_call(piece)
+        taken.append(Action(schema.name, schema.validate(call["args"]), thought, reflection, text))
+    if not taken:
+        return text, []
+    if not kept:
+        return head.rstrip(), taken
+    rest = ")\n\n".join(pieces[i] for i in kept)
+    if kept[-1] != len(pieces) - 1:
+        rest += ")"  # the split ate this piece's closing paren
+    return head + mark + rest, taken
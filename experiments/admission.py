@@ -0,0 +1,119 @@
+# SPDX-License-Identifier: Apache-2.0
+"""
+Admission control for upstream calls: a concurrency limit shared by priority classes.
+
+At most `limit` calls run at once. A call that cannot start waits in its class's FIFO
+queue; when a slot frees up it goes to the waiting call of the highest-priority class
+(lowest number), so interactive traffic overtakes a backlog of batch calls. Each class
+also has
+
+  queue_limit   calls allowed to wait; one more is rejected at once (QueueFull)
+  max_active    slots the class may hold; keeping batch below `limit` leaves headroom
+                for interactive calls that arrive while batch load is saturating the limit
+
+    admission = AdmissionController(32, {"interactive": PriorityClass(0, 64),
+                                         "batch": PriorityClass(1, 256, max_active=24)})
+    async with admission.slot("batch") as waited_s:
+        ...   # the upstream call
+    admission.stats()   # per class: active, queued, admitted, rejected, queue-time p50/p95/p99/max
+"""
+from __future__ import annotations
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Optional, Tuple
+
+class QueueFull(Exception):
+    """The caller's priority class already has `queue_limit` calls waiting."""
+
+@dataclass
+class PriorityClass:
+    priority: int                       # lower runs first
+    queue_limit: int = 256
+    max_active: Optional[int] = None    # None: up to the controller's limit
+    active: int = 0
+    admitted: int = 0
+    rejected: int = 0
+    waiters: Deque[Tuple[float, asyncio.Future]] = field(default_factory=deque, repr=False)  # (queued at, future)
+    waits: Deque[float] = field(default_factory=lambda: deque(maxlen=4096), repr=False)
+
+    def stats(self) -> dict:
+        xs = sorted(self.waits)
+        pick = lambda q: round(xs[min(len(xs) - 1, int(q * len(xs)))], 4) if xs else None
+        return {"active": self.active, "queued": len(self.waiters), "admitted": self.admitted,
+                "rejected": self.rejected, "queue_p50_s": pick(0.50), "queue_p95_s": pick(0.95),
+                "queue_p99_s": pick(0.99), "queue_max_s": round(xs[-1], 4) if xs else None}
+
+class AdmissionController:
+
+    def __init__(self, limit: int, classes: Dict[str, PriorityClass]):
+        if limit < 1:
+            raise ValueError("the concurrency limit must be at least 1")
+        self.limit = limit
+        self.classes = classes
+        self.active = 0
+        self._by_priority = sorted(classes.values(), key=lambda c: c.priority)
+
+    def _may_start(self, c: PriorityClass) -> bool:
+        return self.active < self.limit and (c.max_active is None or c.active < c.max_active)
+
+    def _start(self, c: PriorityClass, waited: float) -> None:
+        self.active += 1
+        c.active += 1
+        c.admitted += 1
+        c.waits.append(waited)
+
+    async def acquire(self, name: str) -> float:
+        """Wait for a slot; returns the seconds spent queued. Raises QueueFull if the queue is full."""
+        c = self.classes[name]
+        if not c.waiters and self._may_start(c):
+            self._start(c, 0.0)
+            return 0.0
+        if len(c.waiters) >= c.queue_limit:
+            c.rejected += 1
+            raise QueueFull(f"{name} queue is full ({c.queue_limit} waiting)")
+        fut = asyncio.get_running_loop().create_future()
+        entry = (time.perf_counter(), fut)
+        c.waiters.append(entry)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self.release(name)  # the slot was granted just as the caller gave up
+            elif entry in c.waiters:
+                c.waiters.remove(entry)
+            raise
+        return fut.result()
+
+    def release(self, name: str) -> None:
+        self.classes[name].active -= 1
+        self.active -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        while self.active < self.limit:
+            for c in self._by_priority:
+                while c.waiters and c.waiters[0][1].done():  # cancelled while queued
+                    c.waiters.popleft()
+                if c.waiters and self._may_start(c):
+                    t0, fut = c.waiters.popleft()
+                    waited = time.perf_counter() - t0
+                    self._start(c, waited)
+                    fut.set_result(waited)
+                    break
+            else:
+                return
+
+    @asynccontextmanager
+    async def slot(self, name: str):
+        waited = await self.acquire(name)
+        try:
+            yield waited
+        finally:
+            self.release(name)
+
+    def stats(self) -> dict:
+        return {"limit": self.limit, "active": self.active,
+                "classes": {name: c.stats() for name, c in self.classes.items()}}
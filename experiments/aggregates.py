@@ -0,0 +1,182 @@
+# SPDX-License-Identifier: Apache-2.0
+from __future__ import annotations
+import os, re, json
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Optional
+
+DATE_FMT = "%Y-%m-%d"
+SNAPSHOT_SUFFIX = ".aggregates.json"
+
+# Tables kept in memory as {table: {key: count}}; keys are "|"-joined so the
+# snapshot stays plain JSON.
+APPTS_PER_DOCTOR_DAY = "appointments_per_doctor_day"     # key: "YYYY-MM-DD|doctor"
+IMAGING_PER_MODALITY_WEEK = "imaging_per_modality_week"  # key: "YYYY-Www|modality"
+NEW_PATIENTS_PER_DAY = "new_patients_per_day"            # key: "YYYY-MM-DD"
+TABLES = (APPTS_PER_DOCTOR_DAY, IMAGING_PER_MODALITY_WEEK, NEW_PATIENTS_PER_DAY)
+
+# ---------- 1) Key helpers ----------
+
+_MODALITIES = [
+    ("X-ray", re.compile(r"\bx[- ]?ray|\bcxr\b|radiograph", re.I)),
+    ("CT", re.compile(r"\bct\b|\bcat scan", re.I)),
+    ("MRI", re.compile(r"\bmri\b|\bmr\b", re.I)),
+    ("Ultrasound", re.compile(r"ultrasound|\bus\b|sonograph|doppler", re.I)),
+    ("Mammogram", re.compile(r"mammo", re.I)),
+    ("PET", re.compile(r"\bpet\b", re.I)),
+]
+
+def modality_of(imaging: str) -> str:
+    for name, rx in _MODALITIES:
+        if rx.search(imaging):
+            return name
+    return "Other"
+
+def iso_week(date: str) -> str:
+    y, w, _ = datetime.strptime(date, DATE_FMT).isocalendar()
+    return f"{y}-W{w:02d}"
+
+def snapshot_path(root: str) -> str:
+    # lives next to the HIMS root, not inside it, so it never shows up as patient data
+    root = os.path.abspath(root).rstrip(os.sep)
+    return root + SNAPSHOT_SUFFIX
+
+def _snapshot_stamp(root: str) -> Optional[tuple]:
+    try:
+        st = os.stat(snapshot_path(root))
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+# ---------- 2) Materialized tables ----------
+
+class HimsAggregates:
+    """Counters updated in O(1) per HIMS write event; persisted as a JSON snapshot."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.tables: Dict[str, Dict[str, int]] = {t: defaultdict(int) for t in TABLES}
+        self.dirty = False
+        self.stamp: Optional[tuple] = None  # (mtime_ns, size) of the snapshot these tables match
+
+    # --- write path ---
+    def record_appointment(self, date: str, doctor: Optional[str]) -> None:
+        # appointments.txt is line-oriented, so key on the first line only (matches rebuild())
+        lines = (doctor or "").strip().splitlines()
+        doctor = lines[0].strip() if lines else "Unknown"
+        self.tables[APPTS_PER_DOCTOR_DAY][f"{date}|{doctor}"] += 1
+        self.dirty = True
+
+    def record_imaging(self, date: str, imaging: str) -> None:
+        # imaging_plan.txt is line-oriented too: classify the first line, as rebuild() can only see that
+        lines = imaging.strip().splitlines()
+        imaging = lines[0] if lines else ""
+        self.tables[IMAGING_PER_MODALITY_WEEK][f"{iso_week(date)}|{modality_of(imaging)}"] += 1
+        self.dirty = True
+
+    def record_new_patient(self, date: str) -> None:
+        self.tables[NEW_PATIENTS_PER_DAY][date] += 1
+        self.dirty = True
+
+    # --- query API ---
+    def appointments_per_doctor(self, day: Optional[str] = None) -> Dict[str, Dict[str, int]]:
+        """{day: {doctor: count}}, optionally restricted to one day."""
+        out: Dict[str, Dict[str, int]] = {}
+        for key, n in self.tables[APPTS_PER_DOCTOR_DAY].items():
+            d, doc = key.split("|", 1)
+            if day is None or d == day:
+                out.setdefault(d, {})[doc] = n
+        return out
+
+    def imaging_per_modality(self, week: Optional[str] = None) -> Dict[str, Dict[str, int]]:
+        """{iso_week: {modality: count}}; `week` accepts 'YYYY-Www' or any date in that week."""
+        if week and not re.match(r"^\d{4}-W\d{2}$", week):
+            week = iso_week(week)
+        out: Dict[str, Dict[str, int]] = {}
+        for key, n in self.tables[IMAGING_PER_MODALITY_WEEK].items():
+            w, mod = key.split("|", 1)
+            if week is None or w == week:
+                out.setdefault(w, {})[mod] = n
+        return out
+
+    def new_patients_per_day(self, day: Optional[str] = None) -> Dict[str, int]:
+        table = self.tables[NEW_PATIENTS_PER_DAY]
+        if day is not None:
+            return {day: table.get(day, 0)}
+        return dict(table)
+
+    # --- persistence ---
+    def save(self) -> None:
+        if not self.dirty:
+            return
+        path = snapshot_path(self.root)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({t: dict(v) for t, v in self.tables.items()}, f, sort_keys=True)
+        os.replace(tmp, path)
+        self.dirty = False
+        self.stamp = _snapshot_stamp(self.root)
+
+    @classmethod
+    def load(cls, root: str) -> "HimsAggregates":
+        agg = cls(root)
+        if not agg.reload() and os.path.isdir(root):
+            agg.rebuild()
+        return agg
+
+    def reload(self) -> bool:
+        """Replace the tables with the snapshot on disk; False if there is none."""
+        stamp = _snapshot_stamp(self.root)  # before reading: a newer write is picked up next time
+        try:
+            with open(snapshot_path(self.root), encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return False
+        self.tables = {t: defaultdict(int, data.get(t, {})) for t in TABLES}
+        self.dirty, self.stamp = False, stamp
+        return True
+
+    def refresh(self) -> None:
+        """Pick up a snapshot saved by another process; unsaved local events are kept as they are."""
+        if not self.dirty and _snapshot_stamp(self.root) != self.stamp:
+            self.reload()
+
+    def rebuild(self) -> None:
+        """One-off full scan of the HIMS text files (used when no snapshot exists yet)."""
+        self.tables = {t: defaultdict(int) for t in TABLES}
+        appts = os.path.join(self.root, "Appointments", "appointments.txt")
+        if os.path.exists(appts):
+            with open(appts, encoding="utf-8") as f:
+                for line in f:
+                    parts = [p.strip() for p in line.split(",", 2)]
+                    if len(parts) == 3 and parts[0]:
+                        self.record_appointment(parts[0], parts[2])
+        imaging = os.path.join(self.root, "Imaging", "imaging_plan.txt")
+        if os.path.exists(imaging):
+            with open(imaging, encoding="utf-8") as f:
+                for line in f:
+                    m = re.match(r"\[(\d{4}-\d{2}-\d{2})\]\s*[^:]+:\s*(.+)", line)
+                    if m:
+                        self.record_imaging(m.group(1), m.group(2))
+        patients = os.path.join(self.root, "Patients")
+        if os.path.isdir(patients):
+            for pid in os.listdir(patients):
+                demo = os.path.join(patients, pid, "demographics.txt")
+                if os.path.exists(demo):
+                    day = datetime.fromtimestamp(os.path.getmtime(demo)).strftime(DATE_FMT)
+                    self.record_new_patient(day)
+        self.dirty = True
+
+# ---------- 3) Per-root registry ----------
+
+_REGISTRY: Dict[str, HimsAggregates] = {}
+
+def aggregates_for(root: str) -> HimsAggregates:
+    """The process-wide aggregates of `root`, refreshed (one stat) if another process saved since."""
+    key = os.path.abspath(root)
+    agg = _REGISTRY.get(key)
+    if agg is None:
+        agg = _REGISTRY[key] = HimsAggregates.load(root)
+    else:
+        agg.refresh()
+    return agg
@@ -0,0 +1,133 @@
+# SPDX-License-Identifier: Apache-2.0
+"""
+Batched parsing for replaying large trajectory logs.
+
+Tokenization (screen-size independent) runs in a worker pool; coordinate
+normalization then happens in one NumPy pass per distinct screen size, and the
+result comes back as columnar arrays rather than one dict per action.
+"""
+from __future__ import annotations
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from ui_tars.action_parser import (
+    Action, IMAGE_FACTOR, MAX_PIXELS, MIN_PIXELS,
+    coord_space, raw_actions, tokenize_response,
+)
+
+ScreenSize = Tuple[int, int]  # (height, width), same order as parse_action_to_structure_output
+INLINE_BELOW = 64             # tiny batches are not worth a process pool
+
+@dataclass
+class BatchParseResult:
+    """One row per action; `response_index` maps rows back to the input texts."""
+    response_index: np.ndarray                       # int32 (N,)
+    action_type: np.ndarray                          # object (N,)
+    start_box: np.ndarray                            # float64 (N, 4), NaN when absent
+    end_box: np.ndarray                              # float64 (N, 4), NaN when absent
+    inputs: List[dict]                               # non-box params per row
+    thought: List[Optional[str]]                     # per response
+    reflection: List[Optional[str]]                  # per response
+    text: List[Optional[str]]                        # per response (after preprocessing)
+    errors: Dict[int, str] = field(default_factory=dict)  # response index -> "ExcType: message"
+
+    def __len__(self) -> int:
+        return len(self.response_index)
+
+    def actions(self, i: int) -> List[Action]:
+        """Materialize the Action IR for response i."""
+        rows = np.flatnonzero(self.response_index == i)
+        out = []
+        for r in rows:
+            inputs = dict(self.inputs[r])
+            for name, col in (("start_box", self.start_box), ("end_box", self.end_box)):
+                if not np.isnan(col[r, 0]):
+                    inputs[name] = tuple(float(v) for v in col[r])
+            out.append(Action(self.action_type[r], inputs, self.thought[i], self.reflection[i], self.text[i]))
+        return out
+
+def _tokenize_one(text: str):
+    try:
+        text, reflection, thought, parsed, raw = tokenize_response(text)
+        return ("ok", text, reflection, thought, raw_actions(parsed, raw))
+    except Exception as e:  # keep going: one bad response must not sink the replay
+        return ("err", f"{type(e).__name__}: {e}")
+
+def parse_actions_batch(texts: Sequence[str],
+                        screen_sizes: Union[ScreenSize, Sequence[ScreenSize]],
+                        factor: int = IMAGE_FACTOR,
+                        model_type: str = "qwen25vl",
+                        max_pixels: int = MAX_PIXELS,
+                        min_pixels: int = MIN_PIXELS,
+                        workers: Optional[int] = None,
+                        chunksize: int = 256) -> BatchParseResult:
+    """
+    Parse many responses at once. `screen_sizes` is one (height, width) for all texts
+    or one per text. workers=0 tokenizes inline; None uses os.cpu_count().
+    """
+    n = len(texts)
+    # lists, tuples and NumPy arrays alike: shape (2,) is one size for all, (n, 2) one per text
+    size_arr = np.asarray(screen_sizes, dtype=np.int64)
+    if size_arr.ndim == 1 and size_arr.size in (0, 2):
+        size_arr = np.broadcast_to(size_arr.reshape(-1, 2), (n, 2)) if size_arr.size else size_arr.reshape(0, 2)
+    if size_arr.ndim != 2 or size_arr.shape[1] != 2:
+        raise ValueError(f"screen_sizes must have shape (2,) or (n, 2), got {size_arr.shape}")
+    if len(size_arr) != n:
+        raise ValueError(f"got {len(size_arr)} screen sizes for {n} texts")
+    sizes = [tuple(s) for s in size_arr.tolist()]
+
+    if workers == 0 or n < INLINE_BELOW:
+        tokenized = [_tokenize_one(t) for t in texts]
+    else:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            tokenized = list(pool.map(_tokenize_one, texts, chunksize=chunksize))
+
+    resp_idx, types, inputs = [], [], []
+    boxes = {"start_box": [], "end_box": []}
+    thoughts, reflections, out_texts, errors = [None] * n, [None] * n, [None] * n, {}
+    for i, tok in enumerate(tokenized):
+        if tok[0] == "err":
+            errors[i] = tok[1]
+            continue
+        _, out_texts[i], reflections[i], thoughts[i], acts = tok
+        for action_type, action_inputs, box_names in acts:
+            row = {"start_box": None, "end_box": None}
+            rest = {}
+            for k, v in action_inputs.items():
+                if k in row and len(v) in (2, 4):
+                    row[k] = v * 2 if len(v) == 2 else v
+                elif k in box_names:
+                    errors.setdefault(i, f"ValueError: unsupported box arity {len(v)} in {k}")
+                else:
+                    rest[k] = v
+            resp_idx.append(i)
+            types.append(action_type)
+            inputs.append(rest)
+            for k in boxes:
+                boxes[k].append(row[k] if row[k] is not None else (np.nan,) * 4)
+
+    ridx = np.asarray(resp_idx, dtype=np.int32)
+    start = np.asarray(boxes["start_box"], dtype=np.float64).reshape(-1, 4)
+    end = np.asarray(boxes["end_box"], dtype=np.float64).reshape(-1, 4)
+
+    # one vectorized pass per distinct screen size: (x1, y1, x2, y2) / (dx, dy, dx, dy)
+    size_arr = size_arr[ridx] if len(ridx) else np.zeros((0, 2))
+    for h, w in {sizes[i] for i in set(resp_idx)}:
+        mask = (size_arr[:, 0] == h) & (size_arr[:, 1] == w)
+        try:
+            dx, dy = coord_space(model_type, h, w, factor, min_pixels, max_pixels).divisors
+        except ValueError as e:
+            for i in set(ridx[mask].tolist()):
+                errors.setdefault(i, f"ValueError: {e}")
+            start[mask] = end[mask] = np.nan
+            continue
+        scale = np.array([dx, dy, dx, dy], dtype=np.float64)
+        start[mask] /= scale
+        end[mask] /= scale
+
+    return BatchParseResult(ridx, np.asarray(types, dtype=object), start, end, inputs,
+                            thoughts, reflections, out_texts, errors)
@@ -0,0 +1,90 @@
+# SPDX-License-Identifier: Apache-2.0
+"""
+Benchmark the fast action parser against the ast-based reference.
+
+Runs over the corpus from parser_corpus.py (recorded trajectories plus synthetic
+multi-action / Reflection / <point> / escaped-quote variants) and reports, per kind,
+parses per second and memory allocated per call (tracemalloc peak and retained bytes,
+measured in a separate pass so tracing does not skew the timings).
+
+  python -m ui_tars.bench_action_parser [--repeat 5] [--synthetic 500] [--no-alloc]   # from the directory containing ui_tars/
+"""
+from __future__ import annotations
+import sys, io, time, argparse, contextlib, tracemalloc
+
+from ui_tars.action_parser import (
+    parse_action_to_structure_output,
+    parse_action_to_structure_output_reference,
+)
+from ui_tars.parser_corpus import build_corpus, by_kind
+
+PARSE_ERRORS = (ValueError, AssertionError, AttributeError)
+PARSERS = (("reference", parse_action_to_structure_output_reference), ("fast", parse_action_to_structure_output))
+
+def _call(fn, text):
+    try:
+        fn(text, 28, 1080, 1920)
+    except PARSE_ERRORS:
+        pass
+
+def bench(fn, corpus, repeat: int) -> float:
+    """Best wall time of `repeat` passes over the corpus."""
+    best = float("inf")
+    with contextlib.redirect_stdout(io.StringIO()):  # the parsers print on unparseable actions
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            for text in corpus:
+                _call(fn, text)
+            best = min(best, time.perf_counter() - t0)
+    return best
+
+def alloc_per_call(fn, corpus) -> tuple[float, float]:
+    """(mean peak bytes, mean retained bytes) per parse under tracemalloc."""
+    peak_total = retained_total = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        _call(fn, corpus[0])  # warm caches (coord_space, regexes) outside the measurement
+        tracemalloc.start()
+        try:
+            for text in corpus:
+                before, _ = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+                _call(fn, text)
+                after, peak = tracemalloc.get_traced_memory()
+                peak_total += peak - before
+                retained_total += max(0, after - before)
+        finally:
+            tracemalloc.stop()
+    return peak_total / len(corpus), retained_total / len(corpus)
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--synthetic", type=int, default=500, help="responses per synthetic kind")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--no-alloc", action="store_true", help="skip the tracemalloc pass")
+    args = ap.parse_args(argv)
+
+    corpus = build_corpus(args.synthetic, args.seed)
+    if not corpus:
+        print("empty corpus: no responses under results/ and --synthetic 0")
+        return 1
+    groups = by_kind(corpus)
+    groups["all"] = [text for _, text in corpus]
+
+    print(f"{'kind':<11}{'n':>6}  {'parser':<10}{'parses/s':>11}{'us/parse':>10}"
+          + ("" if args.no_alloc else f"{'peak B/call':>13}{'kept B/call':>13}") + f"{'speedup':>9}")
+    for kind, texts in groups.items():
+        times = {}
+        for name, fn in PARSERS:
+            times[name] = bench(fn, texts, args.repeat)
+            line = f"{kind:<11}{len(texts):>6}  {name:<10}{len(texts) / times[name]:>11.0f}{times[name] / len(texts) * 1e6:>10.1f}"
+            if not args.no_alloc:
+                peak, kept = alloc_per_call(fn, texts)
+                line += f"{peak:>13.0f}{kept:>13.0f}"
+            if name == "fast":
+                line += f"{times['reference'] / times['fast']:>8.1f}x"
+            print(line)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
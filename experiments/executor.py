@@ -0,0 +1,243 @@
+# SPDX-License-Identifier: Apache-2.0
+"""
+Direct execution of parsed GUI actions.
+
+Instead of generating a pyautogui source string and exec()-ing it every step
+(parsing_response_to_pyautogui_code, still available as an export), the executor
+looks each action up in a dispatch table and calls an input backend directly.
+With a settle.SettleWaiter the fixed pauses between actions and after pastes become
+adaptive waits that end as soon as the screen stops changing.
+"""
+from __future__ import annotations
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from ui_tars.action_parser import Action
+
+ARROW_KEYS = {"arrowleft": "left", "arrowright": "right", "arrowup": "up", "arrowdown": "down"}
+SCROLL_CLICKS = 5
+ACTION_GAP_S = 1.0     # pause between consecutive actions (matches the generated code)
+PASTE_SETTLE_S = 0.5
+DRAG_DURATION_S = 1.0  # mouse travel time during a drag; some apps need the intermediate move events
+
+# ---------- 1) Input backends ----------
+
+class InputBackend(ABC):
+    """
+    Minimal input surface the executor needs; mirrors the pyautogui calls the code generator emits.
+    Every method is abstract, so a backend that misses one fails when it is constructed, not mid-trajectory.
+    """
+
+    @abstractmethod
+    def click(self, x: float, y: float, button: str = "left") -> None: ...
+    @abstractmethod
+    def double_click(self, x: float, y: float, button: str = "left") -> None: ...
+    @abstractmethod
+    def move_to(self, x: float, y: float) -> None: ...
+    @abstractmethod
+    def drag_to(self, x: float, y: float, duration: float) -> None: ...
+    @abstractmethod
+    def scroll(self, clicks: int, x: Optional[float] = None, y: Optional[float] = None) -> None: ...
+    @abstractmethod
+    def hotkey(self, *keys: str) -> None: ...
+    @abstractmethod
+    def key_down(self, key: str) -> None: ...
+    @abstractmethod
+    def key_up(self, key: str) -> None: ...
+    @abstractmethod
+    def press(self, key: str) -> None: ...
+    @abstractmethod
+    def write(self, text: str, interval: float) -> None: ...
+    @abstractmethod
+    def paste(self, text: str) -> None: ...
+    @abstractmethod
+    def sleep(self, seconds: float) -> None: ...
+
+class PyAutoGUIBackend(InputBackend):
+    """Real mouse/keyboard; pyautogui and pyperclip are imported once, not per step."""
+
+    def __init__(self):
+        import pyautogui
+        self.gui = pyautogui
+        try:
+            import pyperclip
+        except ImportError:
+            pyperclip = None
+        self.clipboard = pyperclip
+
+    def click(self, x, y, button="left"): self.gui.click(x, y, button=button)
+    def double_click(self, x, y, button="left"): self.gui.doubleClick(x, y, button=button)
+    def move_to(self, x, y): self.gui.moveTo(x, y)
+    def drag_to(self, x, y, duration): self.gui.dragTo(x, y, duration=duration)
+    def hotkey(self, *keys): self.gui.hotkey(*keys)
+    def key_down(self, key): self.gui.keyDown(key)
+    def key_up(self, key): self.gui.keyUp(key)
+    def press(self, key): self.gui.press(key)
+    def write(self, text, interval): self.gui.write(text, interval=interval)
+    def sleep(self, seconds): time.sleep(seconds)
+
+    def scroll(self, clicks, x=None, y=None):
+        if x is None:
+            self.gui.scroll(clicks)
+        else:
+            self.gui.scroll(clicks, x=x, y=y)
+
+    def paste(self, text):
+        if self.clipboard is None:
+            raise RuntimeError("pyperclip is required for input_swap=True")
+        self.clipboard.copy(text)
+        self.gui.hotkey("ctrl", "v")
+
+class RecordingBackend(InputBackend):
+    """Records every call as (method, args) instead of touching the machine; sleeps are recorded, not slept."""
+
+    def __init__(self):
+        self.calls: List[Tuple[str, tuple]] = []
+
+    def _rec(self, name, *args):
+        self.calls.append((name, args))
+
+    def click(self, x, y, button="left"): self._rec("click", x, y, button)
+    def double_click(self, x, y, button="left"): self._rec("double_click", x, y, button)
+    def move_to(self, x, y): self._rec("move_to", x, y)
+    def drag_to(self, x, y, duration): self._rec("drag_to", x, y, duration)
+    def scroll(self, clicks, x=None, y=None): self._rec("scroll", clicks, x, y)
+    def hotkey(self, *keys): self._rec("hotkey", *keys)
+    def key_down(self, key): self._rec("key_down", key)
+    def key_up(self, key): self._rec("key_up", key)
+    def press(self, key): self._rec("press", key)
+    def write(self, text, interval): self._rec("write", text, interval)
+    def paste(self, text): self._rec("paste", text)
+    def sleep(self, seconds): self._rec("sleep", seconds)
+
+# ---------- 2) Executor ----------
+
+def _key(action: Action, *names: str) -> str:
+    for n in names:
+        if n in action.action_inputs:
+            return action.action_inputs.get(n) or ""
+    return ""
+
+def _single_key(key: str) -> str:
+    return " " if key == "space" else ARROW_KEYS.get(key, key)
+
+class ActionExecutor:
+    """
+    Execute Action IR (or legacy action dicts) against a backend.
+    Semantics follow parsing_response_to_pyautogui_code: 1 s between actions,
+    clipboard paste for `type` when input_swap, and `finished` ends the turn.
+    Pass `settle` (a SettleWaiter) to replace the fixed pauses with settle detection;
+    each wait is then bounded by the waiter's max_wait_s instead.
+    """
+
+    def __init__(self, backend: InputBackend, image_height: int, image_width: int, input_swap: bool = True,
+                 settle=None, drag_duration: float = DRAG_DURATION_S):
+        self.backend = backend
+        self.height, self.width = image_height, image_width
+        self.input_swap = input_swap
+        self.settle = settle
+        self.drag_duration = drag_duration
+        self.dispatch: Dict[str, Callable[[Action], None]] = {
+            "hotkey": self._hotkey,
+            "press": self._key_down, "keydown": self._key_down,
+            "release": self._key_up, "keyup": self._key_up,
+            "type": self._type,
+            "drag": self._drag, "select": self._drag,
+            "scroll": self._scroll,
+            "click": self._click, "left_single": self._click,
+            "left_double": self._double_click,
+            "right_single": self._right_click,
+            "hover": self._hover,
+        }
+
+    def execute(self, actions: Iterable) -> bool:
+        """Run the actions in order; returns True once a `finished` action is reached."""
+        if isinstance(actions, (dict, Action)):
+            actions = [actions]
+        for i, raw in enumerate(actions):
+            action = Action.from_dict(raw)
+            if action.action_type == "finished":
+                return True
+            if i:
+                self._pause("action", ACTION_GAP_S)
+            handler = self.dispatch.get(action.action_type)
+            if handler is not None:
+                handler(action)
+        return False
+
+    def _pause(self, kind: str, fixed_s: float) -> None:
+        if self.settle is None:
+            self.backend.sleep(fixed_s)
+        else:
+            self.settle.wait(kind)
+
+    def _center(self, action: Action, name: str = "start_box"):
+        return action.center(name, self.width, self.height)
+
+    def _hotkey(self, a: Action) -> None:
+        hotkey = _key(a, "key", "hotkey")
+        hotkey = ARROW_KEYS.get(hotkey, hotkey)
+        if hotkey:
+            self.backend.hotkey(*[" " if k == "space" else k for k in hotkey.split()])
+
+    def _key_down(self, a: Action) -> None:
+        key = _key(a, "key", "press")
+        if key:
+            self.backend.key_down(_single_key(key))
+
+    def _key_up(self, a: Action) -> None:
+        key = _key(a, "key", "press")
+        if key:
+            self.backend.key_up(_single_key(key))
+
+    def _type(self, a: Action) -> None:
+        content = a.action_inputs.get("content", "") or ""
+        if not content:
+            return
+        submit = content.endswith("\n") or content.endswith("\\n")
+        text = content
+        while text.endswith("\n") or text.endswith("\\n"):
+            text = text[:-1] if text.endswith("\n") else text[:-2]
+        if self.input_swap:
+            self.backend.paste(text)
+        else:
+            self.backend.write(text, 0.1)
+        self._pause("paste", PASTE_SETTLE_S)
+        if submit:
+            self.backend.press("enter")
+
+    def _drag(self, a: Action) -> None:
+        if a.start_box and a.end_box:
+            sx, sy = self._center(a, "start_box")
+            ex, ey = self._center(a, "end_box")
+            self.backend.move_to(sx, sy)
+            self.backend.drag_to(ex, ey, self.drag_duration)
+
+    def _scroll(self, a: Action) -> None:
+        direction = (a.action_inputs.get("direction") or "").lower()
+        step = SCROLL_CLICKS * int(a.action_inputs.get("repeat") or 1)  # merged scrolls, see optimize_actions
+        clicks = step if "up" in direction else -step if "down" in direction else 0
+        if not clicks:
+            return
+        point = self._center(a) if a.start_box else None
+        if point is None:
+            self.backend.scroll(clicks)
+        else:
+            self.backend.scroll(clicks, *point)
+
+    def _click(self, a: Action) -> None:
+        if a.start_box:
+            self.backend.click(*self._center(a), "left")
+
+    def _double_click(self, a: Action) -> None:
+        if a.start_box:
+            self.backend.double_click(*self._center(a), "left")
+
+    def _right_click(self, a: Action) -> None:
+        if a.start_box:
+            self.backend.click(*self._center(a), "right")
+
+    def _hover(self, a: Action) -> None:
+        if a.start_box:
+            self.backend.move_to(*self._center(a))
@@ -0,0 +1,165 @@
+# SPDX-License-Identifier: Apache-2.0
+"""
+Differential fuzzing of the fast action-parser paths against their references.
+
+  fast      parse_action_to_structure_output  vs  parse_action_to_structure_output_reference
+            (same return value, or same exception type and message, and the same printed output)
+  literals  _scan_call(literals=True, dotted=True)  vs  ast.parse + ast.literal_eval
+            (whenever the scanner accepts a call, it must agree with ast)
+
+Inputs are corpus responses from parser_corpus.py, random recombinations of action atoms
+and headers, and byte-level mutations (insert / delete / duplicate / swap) of both.
+
+  python -m ui_tars.fuzz_action_parser [--iterations 20000] [--seed 0] [--show 5]   # from the directory containing ui_tars/
+
+Exits 1 and prints the first --show mismatches if any path diverges.
+"""
+from __future__ import annotations
+import sys, io, ast, random, argparse, warnings, contextlib
+
+from ui_tars.action_parser import (
+    _scan_call,
+    parse_action_to_structure_output,
+    parse_action_to_structure_output_reference,
+)
+from ui_tars.parser_corpus import build_corpus
+
+ATOMS = [
+    "click(start_box='(100,200)')", "click(point='<point>10 20</point>')", "type(content='hello')",
+    "type(content='it's')", "type(content='a\\'b')", "type(content='x\\n')", "hotkey(key='ctrl c')",
+    "scroll(point='<point>5 5</point>', direction='down')",
+    "drag(start_point='<point>1 2</point>', end_point='<point>3 4</point>')", "finished(content='done \"ok\"')",
+    "health.upsert_patient(patient_name=\"Jane\", symptoms=[\"a\"], treatment_plan=\"x\")",
+    "health.search(query='cough', top_k=5)", "health.extract_and_update(dialogue=\"Patient: A\nPlan: B\")",
+    "wait()", "click(start_box='(1,2)'", "type(content='x') ", " click(x=1)", "f(a=1,)", "f(a=01)", "f(a=-1)",
+    "f(a='x' 'y')", "f(a=True, b=None)", "f(1)", "f(a='\\d')", "f(a='''x''')", "f(**k)", "type(content='a') b')",
+    "type(content='\\\\')", "f(a='x\\\ny')", "click(start_box='(1,2)')\n", "x.y.z(a='b')", "if(a=1)", "f (a=1)",
+    "f(a = 'b' , c= \"d\")", "f(a='\r')", "type(content='q\n')",
+    "f(a=[1, -2.5, (3,), {'k': [True, None]}])", "f(a=[1, 2,], b=(1), c={})", "f(a=[x])", "f(a={1: 'b'})",
+    "f(a={([1],): 2})", "f(a={1, 2})", "f(a=[\n 'x',\n 'y'\n])", "f(a=-0.5, b=[-1])",
+]
+HEADERS = [
+    "Thought: I will act.\nAction: ", "Reflection: r\nAction_Summary: s\nAction: ", "Action_Summary: s\nAction: ",
+    "Action: ", "Thought: Action: ", "Thought:  \n Action: x\nAction: ", "blah Thought: t Action:  ",
+]
+SEPARATORS = [")\n\n", "\n\n", ")\n\n"]
+NOISE = list("()'\"\\,=.\n <>[]{}:-0123456789") + ["Action: ", "[EOS]", "<point>", "</point>", "type(content='"]
+
+def _outcome(fn, text, **kw):
+    buf = io.StringIO()
+    with contextlib.redirect_stdout(buf):
+        try:
+            return ("ok", fn(text, 28, 800, 600, **kw), buf.getvalue())
+        except Exception as e:  # compare the failure itself, whatever it is
+            return ("err", type(e).__name__, str(e), buf.getvalue())
+
+def _ast_call(s):
+    """Reference for the literal scanner: (dotted name, {kw: literal}) or None."""
+    # raw newlines escaped like parse_action first; as written only if that fails (multi-line containers)
+    for candidate in (s.replace("\n", "\\n").lstrip(), s.lstrip()):
+        try:
+            call = ast.parse(candidate, mode="eval").body
+            break
+        except (SyntaxError, ValueError):
+            continue
+    else:
+        return None
+    if not isinstance(call, ast.Call) or call.args:
+        return None
+    parts, node = [], call.func
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if not isinstance(node, ast.Name):
+        return None
+    parts.append(node.id)
+    args = {}
+    for kw in call.keywords:
+        if kw.arg is None:
+            return None
+        try:
+            args[kw.arg] = ast.literal_eval(kw.value)
+        except (ValueError, TypeError):
+            return None
+    return {"function": ".".join(reversed(parts)), "args": args}
+
+def mutate(text: str, rng: random.Random) -> str:
+    for _ in range(rng.randint(1, 3)):
+        if not text:
+            break
+        i = rng.randrange(len(text))
+        op = rng.randrange(4)
+        if op == 0:
+            text = text[:i] + rng.choice(NOISE) + text[i:]
+        elif op == 1:
+            text = text[:i] + text[i + rng.randint(1, 3):]
+        elif op == 2:
+            j = min(len(text), i + rng.randint(1, 8))
+            text = text[:j] + text[i:j] + text[j:]
+        else:
+            j = rng.randrange(len(text))
+            chars = list(text)
+            chars[i], chars[j] = chars[j], chars[i]
+            text = "".join(chars)
+    return text
+
+def generate(rng: random.Random, corpus):
+    r = rng.random()
+    if r < 0.3 and corpus:
+        text = rng.choice(corpus)
+    else:
+        atoms = rng.sample(ATOMS, rng.randint(1, 3))
+        text = rng.choice(HEADERS) + rng.choice(SEPARATORS).join(atoms)
+        if rng.random() < 0.1:
+            text += " [EOS]"
+    if rng.random() < 0.5:
+        text = mutate(text, rng)
+    return text
+
+def check_fast(text):
+    for model_type in ("qwen25vl", "qwen2vl"):
+        got = _outcome(parse_action_to_structure_output, text, model_type=model_type)
+        want = _outcome(parse_action_to_structure_output_reference, text, model_type=model_type)
+        if got != want:
+            return {"path": "fast", "model_type": model_type, "text": text, "fast": got, "reference": want}
+    return None
+
+_accepted = {"literals": 0}
+
+def check_literals(text):
+    piece = text.rpartition("Action: ")[2].split(")\n\n")[0]
+    s = piece if piece.strip().endswith(")") else piece.strip() + ")"
+    got = _scan_call(s, literals=True, dotted=True)
+    if got is None:
+        return None  # the scanner may always decline; only accepted input has to agree
+    _accepted["literals"] += 1
+    want = _ast_call(s)
+    if got != want or repr(got) != repr(want):  # repr also catches 1 vs 1.0 vs True
+        return {"path": "literals", "text": s, "scanner": got, "ast": want}
+    return None
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--iterations", type=int, default=20000)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--show", type=int, default=5, help="mismatches to print")
+    args = ap.parse_args(argv)
+
+    warnings.filterwarnings("ignore", category=SyntaxWarning)  # ast.parse on mutated input
+    rng = random.Random(args.seed)
+    corpus = [text for _, text in build_corpus(100, args.seed)]
+    mismatches, checked = [], {"fast": 0, "literals": 0}
+    for _ in range(args.iterations):
+        text = generate(rng, corpus)
+        for name, check in (("fast", check_fast), ("literals", check_literals)):
+            checked[name] += 1
+            bad = check(text)
+            if bad is not None:
+                mismatches.append(bad)
+    print(f"checked: {checked}  literal scanner accepted: {_accepted['literals']}  mismatches: {len(mismatches)}")
+    for bad in mismatches[:args.show]:
+        print(bad)
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,16 @@
 # SPDX-License-Identifier: Apache-2.0
 from __future__ import annotations
-import os, re, json
+import os, re, json, time
 from dataclasses import dataclass
 from datetime import datetime
 from typing import List, Optional
 
+from ui_tars.aggregates import aggregates_for
+from ui_tars.icd10 import icd10_table, normalize_code
+from ui_tars.notes_index import notes_index_for
+from ui_tars.merkle import merkle_for
+from ui_tars import metrics
+
 DATE_FMT = "%Y-%m-%d"
 
 # ---------- 1) Lightweight info model ----------
@@ -70,9 +76,11 @@ def _first(seq):
 # ---------- 3) HIMS filesystem helpers ----------
 
 def ensure_hims_root(root: str) -> None:
-    os.makedirs(os.path.join(root, "Patients"), exist_ok=True)
-    os.makedirs(os.path.join(root, "Appointments"), exist_ok=True)
-    os.makedirs(os.path.join(root, "Imaging"), exist_ok=True)
+    for sub in ("Patients", "Appointments", "Imaging"):
+        path = os.path.join(root, sub)
+        if not os.path.isdir(path):
+            os.makedirs(path, exist_ok=True)
+            merkle_for(root).touch(path)
 
 def patient_id_from_name(name: str) -> str:
     # simple deterministic PID: "P" + 3-digit hash + underscore_name
@@ -85,44 +93,108 @@ def upsert_patient_files(root: str, info: DialogueInfo, pid: Optional[str] = Non
     p_dir = os.path.join(root, "Patients", pid)
     os.makedirs(p_dir, exist_ok=True)
 
+    today = _today()
+
     # demographics.txt (create if missing; don't overwrite existing lines)
     demo = os.path.join(p_dir, "demographics.txt")
     if not os.path.exists(demo):
+        agg = aggregates_for(root)
         with open(demo, "w", encoding="utf-8") as f:
             f.write(f"PatientID: {pid}\nName: {info.patient_name}\n")
-
-    today = _today()
+        agg.record_new_patient(today)
+        merkle_for(root).touch(demo)
 
     # symptoms.txt (append)
     if info.symptoms:
-        with open(os.path.join(p_dir, "symptoms.txt"), "a", encoding="utf-8") as f:
-            f.write(f"[{today}] " + "; ".join(info.symptoms) + "\n")
+        _append_note(root, pid, "symptoms.txt", f"[{today}] " + "; ".join(info.symptoms))
 
     # treatment_plan.txt (append)
     if info.treatment_plan or info.next_steps:
         line = f"[{today}] Plan: {info.treatment_plan}"
         if info.next_steps: line += f" | Next: {info.next_steps}"
-        with open(os.path.join(p_dir, "treatment_plan.txt"), "a", encoding="utf-8") as f:
-            f.write(line + "\n")
+        _append_note(root, pid, "treatment_plan.txt", line)
 
     return pid
 
+def _append_note(root: str, pid: str, fname: str, line: str) -> None:
+    # appends one entry and feeds it to the BM25 notes index
+    idx = notes_index_for(root)
+    path = os.path.join(root, "Patients", pid, fname)
+    with open(path, "a", encoding="utf-8") as f:
+        offset = f.tell()
+        f.write(line + "\n")
+    idx.add_entry(pid, fname, offset, line)
+    merkle_for(root).touch(path)
+
+def search_notes(root: str, query: str, top_k: int = 10) -> List[dict]:
+    return notes_index_for(root).search(query, top_k)
+
 def maybe_add_appointment(root: str, pid: str, date: Optional[str], doctor: Optional[str]) -> None:
     if not date: return
     path = os.path.join(root, "Appointments", "appointments.txt")
     doctor = doctor or "Unknown"
+    agg = aggregates_for(root)
     with open(path, "a", encoding="utf-8") as f:
         f.write(f"{date}, {pid}, {doctor}\n")
+    agg.record_appointment(date, doctor)
+    merkle_for(root).touch(path)
 
 def maybe_add_imaging(root: str, pid: str, imaging: Optional[str]) -> None:
     if not imaging: return
     path = os.path.join(root, "Imaging", "imaging_plan.txt")
+    today = _today()
+    agg = aggregates_for(root)
     with open(path, "a", encoding="utf-8") as f:
-        f.write(f"[{_today()}] {pid}: {imaging}\n")
+        f.write(f"[{today}] {pid}: {imaging}\n")
+    agg.record_imaging(today, imaging)
+    merkle_for(root).touch(path)
+
+# ---------- 4) ICD-10 lookups (local, no model round-trip) ----------
+
+def icd10_validate(code: str) -> bool:
+    return icd10_table().is_valid(code)
+
+def icd10_describe(code: str) -> Optional[str]:
+    return icd10_table().describe(code)
 
-# ---------- 4) Action execution entrypoint ----------
+def icd10_complete(prefix: str, limit: int = 20) -> List[tuple]:
+    return icd10_table().complete(prefix, limit)
 
-def execute_health_actions(actions: list[dict], root: str = "/HIMS") -> None:
+def icd10_search(text: str, limit: int = 20) -> List[tuple]:
+    return icd10_table().search(text, limit)
+
+def check_icd10_codes(obj) -> List[dict]:
+    """
+    Walk a structured record (e.g. results/improved/003output.json) and report every
+    'icd10_code' field: {'path', 'code', 'normalized', 'valid', 'description'}.
+    """
+    found = []
+    def walk(node, path):
+        if isinstance(node, dict):
+            for k, v in node.items():
+                if k == "icd10_code" and isinstance(v, str):
+                    desc = icd10_describe(v)
+                    found.append({"path": path + [k], "code": v, "normalized": normalize_code(v),
+                                  "valid": desc is not None, "description": desc})
+                else:
+                    walk(v, path + [k])
+        elif isinstance(node, list):
+            for i, v in enumerate(node):
+                walk(v, path + [i])
+    walk(obj, [])
+    return found
+
+# ---------- 5) Action execution entrypoint ----------
+
+HEALTH_ACTION_SECONDS = metrics.histogram("hims_health_action_seconds",
+                                          "Time to execute one health.* action", ("action_type",))
+HEALTH_BATCH_SECONDS = metrics.histogram("hims_health_batch_seconds",
+                                         "execute_health_actions() calls, including the batch flush")
+HEALTH_FAILURES = metrics.counter("hims_health_batch_failures_total",
+                                  "execute_health_actions() calls that raised", ("error",))
+
+@metrics.timed(HEALTH_BATCH_SECONDS, HEALTH_FAILURES)
+def execute_health_actions(actions: list[dict], root: str = "/HIMS") -> list[dict]:
     """
     Execute any action whose action_type starts with 'health.'.
     Supported action_types:
@@ -131,11 +203,16 @@ def execute_health_actions(actions: list[dict], root: str = "/HIMS") -> None:
       - 'health.upsert_patient'    with kwargs: {'patient_name': str, 'symptoms': list[str], 'treatment_plan': str,
                                                  'next_steps': str|None, 'appointment_date': 'YYYY-MM-DD'|None,
                                                  'doctor': str|None, 'imaging': str|None, 'patient_id': str|None}
+      - 'health.search'            with kwargs: {'query': str, 'top_k': int}
+    Returns one {'action_type', 'result'} per executed health action (result is None for writes).
     """
     ensure_hims_root(root)
+    results = []
     for a in actions:
+        t0 = time.perf_counter() if metrics.ENABLED else None
         at = (a.get("action_type") or "").lower()
         kwargs = a.get("action_inputs", {}) or {}
+        result = None
         if at == "health.ensure_hims":
             ensure_hims_root(root)
 
@@ -161,6 +238,18 @@ def execute_health_actions(actions: list[dict], root: str = "/HIMS") -> None:
             maybe_add_appointment(root, pid, info.appointment_date, info.doctor)
             maybe_add_imaging(root, pid, info.imaging)
 
+        elif at == "health.search":
+            result = search_notes(root, kwargs.get("query", "") or "", int(kwargs.get("top_k") or 10))
+
         else:
             # ignore non-health actions; let other executors handle them
-            continue
\ No newline at end of file
+            continue
+        results.append({"action_type": at, "result": result})
+        if t0 is not None:
+            HEALTH_ACTION_SECONDS.labels(at).observe(time.perf_counter() - t0)
+
+    # one snapshot/segment/manifest write per batch; per-event updates above are in-memory
+    aggregates_for(root).save()
+    notes_index_for(root).flush()
+    merkle_for(root).save()
+    return results
\ No newline at end of file
@@ -0,0 +1,114 @@
+# SPDX-License-Identifier: Apache-2.0
+from __future__ import annotations
+import os, re, mmap
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import List, Optional, Tuple
+
+# Bundled table: one "CODE<TAB>description" per line, sorted by the code bytes.
+# Only a clinically relevant subset of ICD-10(-CM) is shipped; point ICD10_TABLE
+# at a full export in the same format to widen coverage.
+ICD10_TABLE = os.environ.get(
+    "ICD10_TABLE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "icd10_codes.tsv"))
+
+_CODE_RE = re.compile(r"^[A-Z][0-9][0-9A-Z](?:\.[0-9A-Z]{1,4})?$")
+
+def normalize_code(code: str) -> str:
+    """'g4733' / ' G47.33 ' -> 'G47.33'."""
+    c = re.sub(r"\s+", "", code or "").upper()
+    if len(c) > 3 and c[3] != ".":
+        c = c[:3] + "." + c[3:]
+    return c
+
+# ---------- 1) Memory-mapped sorted array ----------
+
+class ICD10Table:
+    """Sorted-array view over a memory-mapped code table; nothing is read until first use."""
+
+    def __init__(self, path: str = ICD10_TABLE):
+        self.path = path
+        self._mm: Optional[mmap.mmap] = None
+        self._codes: List[bytes] = []     # sorted, for bisect
+        self._offsets = array("Q")        # start of each line in the mmap
+        self._lower: Optional[bytes] = None  # lowercased copy for description search, built on demand
+
+    def _load(self) -> None:
+        if self._mm is not None:
+            return
+        with open(self.path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        pos, end = 0, len(mm)
+        while pos < end:
+            tab = mm.find(b"\t", pos)
+            nl = mm.find(b"\n", pos)
+            if nl < 0:
+                nl = end
+            if 0 <= tab < nl:
+                self._codes.append(mm[pos:tab])
+                self._offsets.append(pos)
+            pos = nl + 1
+        self._mm = mm
+
+    def _row(self, i: int) -> Tuple[str, str]:
+        mm, start = self._mm, self._offsets[i]
+        tab = mm.find(b"\t", start)
+        nl = mm.find(b"\n", tab)
+        if nl < 0:
+            nl = len(mm)
+        return mm[start:tab].decode("ascii"), mm[tab + 1:nl].decode("utf-8").rstrip("\r")
+
+    def __len__(self) -> int:
+        self._load()
+        return len(self._codes)
+
+    def describe(self, code: str) -> Optional[str]:
+        """Exact lookup; returns the description or None if the code is unknown."""
+        self._load()
+        key = normalize_code(code).encode("ascii", "ignore")
+        i = bisect_left(self._codes, key)
+        if i < len(self._codes) and self._codes[i] == key:
+            return self._row(i)[1]
+        return None
+
+    def is_valid(self, code: str) -> bool:
+        return _CODE_RE.match(normalize_code(code)) is not None and self.describe(code) is not None
+
+    def complete(self, prefix: str, limit: int = 20) -> List[Tuple[str, str]]:
+        """All (code, description) whose code starts with `prefix`, in code order."""
+        self._load()
+        key = normalize_code(prefix).encode("ascii", "ignore")
+        lo = bisect_left(self._codes, key)
+        hi = bisect_right(self._codes, key + b"\xff", lo)
+        return [self._row(i) for i in range(lo, min(hi, lo + limit))]
+
+    def search(self, text: str, limit: int = 20) -> List[Tuple[str, str]]:
+        """Codes whose description contains every word of `text` (case-insensitive)."""
+        self._load()
+        words = [w.encode("utf-8") for w in text.lower().split()]
+        if not words:
+            return []
+        if self._lower is None:
+            self._lower = self._mm[:].lower()
+        hay, out, seen = self._lower, [], set()
+        pos = hay.find(words[0])
+        while pos >= 0 and len(out) < limit:
+            i = bisect_right(self._offsets, pos) - 1
+            if i not in seen:
+                seen.add(i)
+                start = self._offsets[i]
+                nl = hay.find(b"\n", start)
+                line = hay[hay.find(b"\t", start) + 1:nl if nl >= 0 else len(hay)]
+                if all(w in line for w in words):
+                    out.append(self._row(i))
+            pos = hay.find(words[0], pos + 1)
+        return sorted(out)
+
+# ---------- 2) Shared lazy instance ----------
+
+_TABLE: Optional[ICD10Table] = None
+
+def icd10_table() -> ICD10Table:
+    global _TABLE
+    if _TABLE is None:
+        _TABLE = ICD10Table()
+    return _TABLE
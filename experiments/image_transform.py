@@ -0,0 +1,214 @@
+# SPDX-License-Identifier: Apache-2.0
+"""
+Screenshot transformer for chat-completion messages.
+
+Agent conversations resend every earlier screenshot as a full-resolution base64 PNG on
+every turn. ScreenshotTransformer rewrites the `image_url` data-URL parts of a message
+list before it goes upstream:
+
+  resize    to the smart_resize() size the model's processor would use anyway (same
+            factor / min_pixels / max_pixels as action_parser), so coordinates keep
+            their meaning; only ever downscales (smart_resize may round a size up to
+            the next factor multiple, which saves nothing and is left to the upstream)
+  encode    JPEG or WebP at the highest quality that fits `target_bytes`; the original
+            bytes are kept when re-encoding would not make the part smaller
+  dedupe    an image byte-identical to one earlier in the conversation becomes a short
+            text placeholder pointing back at it
+
+Transformed images are memoized by content hash, so the history resent every turn is
+only decoded and encoded once. Parts that are not decodable images are passed through.
+
+A max_pixels below action_parser.MAX_PIXELS (HIMS_IMAGE_MAX_PIXELS) trades detail for
+tokens but changes the coordinate space: qwen25vl answers in absolute pixels of the image
+it was shown, so a client must then parse with the same max_pixels, or its smart_resize
+maps the coordinates from the larger default size and every box is scaled wrong.
+
+    transform = ScreenshotTransformer(fmt="webp", target_bytes=120_000)
+    body["messages"] = transform(body["messages"])
+    transform.stats()   # {'images': 12, 'deduped': 5, 'bytes_in': ..., 'bytes_saved': ..., 'tokens_saved': ...}
+"""
+from __future__ import annotations
+import io
+import os
+import base64
+import binascii
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from ui_tars.action_parser import IMAGE_FACTOR, MAX_PIXELS, MIN_PIXELS, smart_resize
+
+try:
+    from PIL import Image
+    _DECODE_ERRORS = (binascii.Error, ValueError, OSError, Image.DecompressionBombError)  # OSError: UnidentifiedImageError
+except ImportError:
+    Image = None
+
+FORMATS = {"jpeg": "image/jpeg", "webp": "image/webp"}
+PLACEHOLDER = "[screenshot identical to image {n} above]"
+
+def _data_url(part) -> Optional[str]:
+    """The base64 data URL of an OpenAI-style image part, or None for anything else."""
+    if not isinstance(part, dict) or part.get("type") != "image_url":
+        return None
+    image_url = part.get("image_url")
+    url = image_url.get("url") if isinstance(image_url, dict) else image_url
+    if isinstance(url, str) and url.startswith("data:image/") and ";base64," in url:
+        return url
+    return None
+
+def has_images(messages) -> bool:
+    return any(_data_url(part) is not None
+               for msg in messages if isinstance(msg, dict) and isinstance(msg.get("content"), list)
+               for part in msg["content"])
+
+def image_tokens(height: int, width: int, factor: int = IMAGE_FACTOR,
+                 min_pixels: int = MIN_PIXELS, max_pixels: int = MAX_PIXELS) -> int:
+    """Visual tokens the model spends on an image of this size (one per factor x factor patch)."""
+    h, w = smart_resize(height, width, factor, min_pixels, max_pixels)
+    return (h // factor) * (w // factor)
+
+class ScreenshotTransformer:
+
+    def __init__(self, max_pixels: int = MAX_PIXELS, min_pixels: int = MIN_PIXELS, factor: int = IMAGE_FACTOR,
+                 fmt: str = "jpeg", target_bytes: int = 150_000, min_quality: int = 40, max_quality: int = 90,
+                 dedupe: bool = True, memo_size: int = 256):
+        if fmt not in FORMATS:
+            raise ValueError(f"image format must be one of {tuple(FORMATS)}, got {fmt!r}")
+        self.max_pixels, self.min_pixels, self.factor = max_pixels, min_pixels, factor
+        self.fmt, self.target_bytes = fmt, target_bytes
+        self.min_quality, self.max_quality = min_quality, max_quality
+        self.dedupe = dedupe
+        self.memo_size = memo_size
+        self._memo: "OrderedDict[bytes, Tuple[str, int, int]]" = OrderedDict()  # digest -> (url, tokens in, out)
+        self._lock = threading.Lock()  # the proxy runs transforms in worker threads
+        self.counts = {"requests": 0, "images": 0, "deduped": 0, "resized": 0, "reencoded": 0,
+                       "bytes_in": 0, "bytes_out": 0, "tokens_in": 0, "tokens_out": 0}
+
+    @classmethod
+    def from_env(cls) -> "ScreenshotTransformer":
+        return cls(max_pixels=int(os.environ.get("HIMS_IMAGE_MAX_PIXELS", MAX_PIXELS)),
+                   fmt=os.environ.get("HIMS_IMAGE_FORMAT", "jpeg").lower(),
+                   target_bytes=int(float(os.environ.get("HIMS_IMAGE_TARGET_KB", "150")) * 1000),
+                   dedupe=os.environ.get("HIMS_IMAGE_DEDUPE", "1").lower() not in ("0", "false", "off"))
+
+    # ---------- one image ----------
+
+    def _encode(self, img) -> bytes:
+        """Highest quality in [min_quality, max_quality] that fits target_bytes (min_quality otherwise)."""
+        def save(quality):
+            buf = io.BytesIO()
+            img.save(buf, format=self.fmt.upper(), quality=quality)
+            return buf.getvalue()
+        best = save(self.max_quality)
+        if len(best) <= self.target_bytes:
+            return best
+        lo, hi, fit = self.min_quality, self.max_quality - 1, None
+        while lo <= hi:
+            q = (lo + hi) // 2
+            data = save(q)
+            if len(data) <= self.target_bytes:
+                fit, lo = data, q + 1   # fits: try for better quality
+            else:
+                hi = q - 1
+        return fit if fit is not None else save(self.min_quality)
+
+    def _transform(self, url: str) -> Tuple[str, int, int, bool, bool]:
+        """(new url, tokens before, tokens after, resized, reencoded) for one data URL."""
+        try:
+            raw = base64.b64decode(url.split(",", 1)[1])
+            img = Image.open(io.BytesIO(raw))
+            img = img.convert("RGB")  # forces the decode: truncated data fails here, not in resize()
+        except _DECODE_ERRORS:  # not a decodable image: pass it through for the upstream to judge
+            return url, 0, 0, False, False
+        width, height = img.size
+        try:
+            new_h, new_w = smart_resize(height, width, self.factor, self.min_pixels, self.max_pixels)
+            tokens_in = image_tokens(height, width, self.factor)
+        except ValueError:  # extreme aspect ratio: leave it to the upstream to reject
+            return url, 0, 0, False, False
+        resized = new_h * new_w < height * width  # 1920x1080 rounds *up* to 1932x1092: not worth a resample
+        if resized:
+            img = img.resize((new_w, new_h), Image.LANCZOS)
+            tokens_out = image_tokens(new_h, new_w, self.factor)
+        else:
+            tokens_out = tokens_in
+        data = self._encode(img)
+        if len(data) >= len(raw) and not resized:
+            return url, tokens_in, tokens_out, False, False
+        new_url = f"data:{FORMATS[self.fmt]};base64," + base64.b64encode(data).decode("ascii")
+        return new_url, tokens_in, tokens_out, resized, True
+
+    def _cached_transform(self, digest: bytes, url: str) -> Tuple[str, int, int]:
+        with self._lock:
+            hit = self._memo.get(digest)
+            if hit is not None:
+                self._memo.move_to_end(digest)
+                return hit
+        new_url, tokens_in, tokens_out, resized, reencoded = self._transform(url)
+        with self._lock:
+            self.counts["resized"] += resized
+            self.counts["reencoded"] += reencoded
+            self._memo[digest] = (new_url, tokens_in, tokens_out)
+            while len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+        return new_url, tokens_in, tokens_out
+
+    # ---------- a whole message list ----------
+
+    def __call__(self, messages: List[dict]) -> List[dict]:
+        """A new message list with image parts transformed; the input is not modified."""
+        seen = {}  # digest -> (image number, tokens before)
+        n = 0
+        counts = dict.fromkeys(self.counts, 0)
+        counts["requests"] = 1
+        out = []
+        for msg in messages:
+            content = msg.get("content") if isinstance(msg, dict) else None
+            if not isinstance(content, list):
+                out.append(msg)
+                continue
+            parts = []
+            for part in content:
+                url = _data_url(part)
+                if url is None:
+                    parts.append(part)
+                    continue
+                n += 1
+                counts["images"] += 1
+                counts["bytes_in"] += len(url)
+                digest = hashlib.sha256(url.encode("ascii", "replace")).digest()
+                if self.dedupe and digest in seen:
+                    first, tokens = seen[digest]
+                    text = PLACEHOLDER.format(n=first)
+                    parts.append({"type": "text", "text": text})
+                    counts["deduped"] += 1
+                    counts["bytes_out"] += len(text)
+                    counts["tokens_in"] += tokens
+                    continue
+                if Image is None:  # no Pillow: dedupe only
+                    new_url, tokens_in, tokens_out = url, 0, 0
+                else:
+                    new_url, tokens_in, tokens_out = self._cached_transform(digest, url)
+                seen[digest] = (n, tokens_in)
+                counts["bytes_out"] += len(new_url)
+                counts["tokens_in"] += tokens_in
+                counts["tokens_out"] += tokens_out
+                if new_url is url:
+                    parts.append(part)
+                else:
+                    image_url = part["image_url"]
+                    image_url = dict(image_url, url=new_url) if isinstance(image_url, dict) else new_url
+                    parts.append(dict(part, image_url=image_url))
+            out.append(dict(msg, content=parts))
+        with self._lock:
+            for k, v in counts.items():
+                if k not in ("resized", "reencoded"):
+                    self.counts[k] += v
+        return out
+
+    def stats(self) -> dict:
+        c = self.counts
+        return dict(c, bytes_saved=c["bytes_in"] - c["bytes_out"], tokens_saved=c["tokens_in"] - c["tokens_out"],
+                    memo_entries=len(self._memo))
@@ -0,0 +1,222 @@
+# SPDX-License-Identifier: Apache-2.0
+"""
+Load test for the run_health chat-completions proxy against a local stub upstream.
+
+The stub answers every completion after --delay seconds and records how many requests
+it is serving at once. With a non-blocking proxy, N concurrent clients finish in about
+one delay and the stub sees up to N requests in flight; a blocking proxy serializes
+them (wall ≈ N × delay, max in flight 1).
+
+With --stream the clients send `stream: true` and the stub emits --tokens SSE chunks,
+one every --token-interval seconds after the initial delay. Client-side time to first
+token should then be about --delay rather than the full generation time.
+
+With --distinct K only K different prompts are sent (request i asks for case i % K), so
+identical requests overlap and the proxy coalesces them: the stub should see about K
+calls instead of --requests.
+
+With --backends N the proxy balances over N stubs. --slow-prob makes that fraction of
+stub calls take --slow-delay instead, so the tail is visible in p95/p99, and --hedge
+turns on the proxy's p95 hedging to cut it.
+
+With --batch-requests M, M batch-priority requests (x-priority: batch) are fired in the
+background first and the measured --requests go out as interactive ones while the batch
+backlog is queued. --max-concurrency sets the proxy's admission limit (0: no limit).
+
+  python ui_tars/loadtest_proxy.py --requests 50 --delay 0.5     # from the directory containing ui_tars/
+  python ui_tars/loadtest_proxy.py --stream --tokens 20 --token-interval 0.05
+  python ui_tars/loadtest_proxy.py --requests 120 --distinct 6 [--stream]
+  python ui_tars/loadtest_proxy.py --requests 400 --concurrency 20 --delay 0.05 --backends 3 \
+      --slow-prob 0.03 --slow-delay 1.0 [--hedge]
+  python ui_tars/loadtest_proxy.py --requests 40 --concurrency 4 --delay 0.2 --batch-requests 400 \
+      --batch-concurrency 200 --max-concurrency 16 [--max-concurrency 0]
+"""
+from __future__ import annotations
+import os, sys, time, json, random, socket, asyncio, argparse, statistics
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+# ---------- 1) Stub upstream ----------
+
+def _chunk(delta: dict, finish=None) -> bytes:
+    event = {"id": "stub", "object": "chat.completion.chunk",
+             "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+    return f"data: {json.dumps(event)}\n\n".encode()
+
+def make_stub(delay: float, tokens: int = 20, token_interval: float = 0.05,
+              slow_prob: float = 0.0, slow_delay: float = 0.0, seed: int = 0) -> FastAPI:
+    stub = FastAPI()
+    rng = random.Random(seed)
+    stub.state.in_flight = 0
+    stub.state.max_in_flight = 0
+    stub.state.calls = 0
+    stub.state.request_bytes = 0
+
+    @stub.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "stub", "object": "model"}]}
+
+    @stub.post("/v1/chat/completions")
+    async def completions(request: Request):
+        stub.state.request_bytes += len(await request.body())
+        body = await request.json()
+        stub.state.calls += 1
+        stub.state.in_flight += 1
+        stub.state.max_in_flight = max(stub.state.max_in_flight, stub.state.in_flight)
+        last = body["messages"][-1]["content"] if body.get("messages") else ""
+        wait = slow_delay if rng.random() < slow_prob else delay
+        if body.get("stream"):
+            async def events():
+                try:
+                    yield _chunk({"role": "assistant"})
+                    await asyncio.sleep(wait)
+                    for i in range(tokens):
+                        yield _chunk({"content": f"tok{i} "})
+                        await asyncio.sleep(token_interval)
+                    yield _chunk({}, finish="stop")
+                    yield b"data: [DONE]\n\n"
+                finally:
+                    stub.state.in_flight -= 1
+            return StreamingResponse(events(), media_type="text/event-stream")
+        try:
+            await asyncio.sleep(wait)
+        finally:
+            stub.state.in_flight -= 1
+        return {"id": "stub", "object": "chat.completion", "model": body.get("model", "stub"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": f"Thought: echo\nAction: finished(content='{last[:20]}')"}}]}
+
+    return stub
+
+# ---------- 2) Harness ----------
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+async def serve(app, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on"))
+    server.task = asyncio.get_running_loop().create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    return server
+
+async def shutdown(*servers: uvicorn.Server) -> None:
+    for server in servers:
+        server.should_exit = True
+    await asyncio.gather(*(server.task for server in servers))
+
+def _pct(xs, q):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(q * len(xs)))]
+
+async def _read_stream(client, url, body, headers, t0) -> tuple:
+    """(status, seconds to the first content delta or None) for one streamed completion."""
+    ttft = None
+    async with client.stream("POST", url, json=body, headers=headers) as r:
+        async for line in r.aiter_lines():
+            if ttft is None and line.startswith("data:") and '"content"' in line:
+                ttft = time.perf_counter() - t0
+        return r.status_code, ttft
+
+async def fire(url: str, n: int, concurrency: int, body_fn, headers=None, stream: bool = False) -> dict:
+    latencies, ttfts, statuses = [], [], {}
+    sem = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(timeout=120, limits=httpx.Limits(max_connections=concurrency)) as client:
+        async def one(i):
+            async with sem:
+                t0 = time.perf_counter()
+                try:
+                    if stream:
+                        status, ttft = await _read_stream(client, url, body_fn(i), headers, t0)
+                        if ttft is not None:
+                            ttfts.append(ttft)
+                    else:
+                        status = (await client.post(url, json=body_fn(i), headers=headers)).status_code
+                except httpx.HTTPError as e:  # counted like a status instead of aborting the run
+                    status = type(e).__name__
+                latencies.append(time.perf_counter() - t0)
+                statuses[status] = statuses.get(status, 0) + 1
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(n)))
+        wall = time.perf_counter() - t0
+    result = {"requests": n, "wall_s": round(wall, 3), "statuses": statuses,
+              "p50_s": round(_pct(latencies, 0.5), 3), "p95_s": round(_pct(latencies, 0.95), 3),
+              "p99_s": round(_pct(latencies, 0.99), 3), "max_s": round(max(latencies), 3)}
+    if ttfts:
+        result.update({"ttft_p50_s": round(_pct(ttfts, 0.5), 3), "ttft_p95_s": round(_pct(ttfts, 0.95), 3)})
+    return result
+
+def _body(i, distinct=None, stream=False):
+    case = i % distinct if distinct else i
+    body = {"model": "stub", "messages": [{"role": "user", "content": f"case {case}"}]}
+    if stream:
+        body["stream"] = True
+    return body
+
+async def run(args) -> dict:
+    ports, proxy_port = [free_port() for _ in range(args.backends)], free_port()
+    stubs = [make_stub(args.delay, args.tokens, args.token_interval, args.slow_prob, args.slow_delay, seed=k)
+             for k in range(args.backends)]
+    stub_servers = [await serve(stub, port) for stub, port in zip(stubs, ports)]
+    os.environ["HIMS_UPSTREAM_URL"] = f"http://127.0.0.1:{ports[0]}"
+    os.environ["HIMS_UPSTREAM_URLS"] = ",".join(f"http://127.0.0.1:{port}" for port in ports)
+    if args.hedge:
+        os.environ["HIMS_HEDGE"] = "1"
+    if args.max_concurrency is not None:
+        os.environ["HIMS_MAX_CONCURRENCY"] = str(args.max_concurrency)
+    from ui_tars import run_health  # reads HIMS_UPSTREAM_URL(S) / HIMS_HEDGE / HIMS_MAX_CONCURRENCY at import
+    proxy_server = await serve(run_health.app, proxy_port)
+    url = f"http://127.0.0.1:{proxy_port}/v1/chat/completions"
+    try:
+        batch = None
+        if args.batch_requests:
+            batch = asyncio.get_running_loop().create_task(fire(
+                url, args.batch_requests, args.batch_concurrency, lambda i: _body(args.requests + i),
+                headers={"x-priority": "batch"}))
+            await asyncio.sleep(0.2)  # let the batch backlog build up
+        result = await fire(url, args.requests, args.concurrency,
+                            lambda i: _body(i, args.distinct, args.stream), stream=args.stream,
+                            headers={"x-priority": "interactive"})
+        if batch is not None:
+            result["batch"] = await batch
+        async with httpx.AsyncClient() as client:
+            result["proxy_stats"] = (await client.get(f"http://127.0.0.1:{proxy_port}/proxy/stats")).json()
+    finally:
+        await shutdown(proxy_server, *stub_servers)
+    generation_s = args.delay + (args.tokens * args.token_interval if args.stream else 0)
+    result.update({"upstream_delay_s": args.delay,
+                   "serial_estimate_s": round(args.requests * generation_s, 3),
+                   "upstream_max_in_flight": sum(stub.state.max_in_flight for stub in stubs),
+                   "upstream_calls": sum(stub.state.calls for stub in stubs),
+                   "upstream_request_bytes": sum(stub.state.request_bytes for stub in stubs)})
+    result["overlap"] = round(result["serial_estimate_s"] / result["wall_s"], 1)
+    return result
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--requests", type=int, default=50)
+    ap.add_argument("--concurrency", type=int, default=50)
+    ap.add_argument("--delay", type=float, default=0.5, help="stub upstream latency per request (s)")
+    ap.add_argument("--stream", action="store_true", help="send stream: true and measure time to first token")
+    ap.add_argument("--tokens", type=int, default=20, help="content chunks per streamed completion")
+    ap.add_argument("--token-interval", type=float, default=0.05, help="seconds between streamed chunks")
+    ap.add_argument("--distinct", type=int, default=None, help="number of different prompts (default: all differ)")
+    ap.add_argument("--backends", type=int, default=1, help="number of stub upstreams behind the proxy")
+    ap.add_argument("--slow-prob", type=float, default=0.0, help="fraction of stub calls that take --slow-delay")
+    ap.add_argument("--slow-delay", type=float, default=1.0, help="latency of a slow stub call (s)")
+    ap.add_argument("--hedge", action="store_true", help="enable the proxy's p95 hedging (HIMS_HEDGE=1)")
+    ap.add_argument("--batch-requests", type=int, default=0, help="background batch-priority requests")
+    ap.add_argument("--batch-concurrency", type=int, default=200)
+    ap.add_argument("--max-concurrency", type=int, default=None, help="proxy admission limit (HIMS_MAX_CONCURRENCY)")
+    args = ap.parse_args(argv)
+    sys.path.insert(0, os.getcwd())
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,258 @@
+# SPDX-License-Identifier: Apache-2.0
+"""
+Merkle hashes over a HIMS root (and over nested JSON results) for fast end-state checks.
+
+  python merkle.py snapshot HIMS golden.json      # record a golden manifest
+  python merkle.py verify   HIMS golden.json      # print only the divergent paths
+"""
+from __future__ import annotations
+import os, sys, json, hashlib, argparse
+from typing import Dict, List, Optional, Set
+
+MANIFEST_SUFFIX = ".merkle.json"
+IGNORED = frozenset({".DS_Store", "Icon\r"})
+
+def _sha(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def hash_file(path: str) -> str:
+    h = hashlib.sha256(b"f\0")
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def manifest_path(root: str) -> str:
+    return os.path.abspath(root).rstrip(os.sep) + MANIFEST_SUFFIX
+
+def _parent(rel: str) -> str:
+    return rel.rsplit("/", 1)[0] if "/" in rel else ""
+
+# ---------- 1) Tree over a directory ----------
+
+class MerkleTree:
+    """
+    hashes:   {relpath: hex}   ('' is the root; '/'-separated)
+    children: {dir relpath: {child name}}
+    File hash = sha256(b"f\\0" + content); directory hash = sha256(b"d\\0" + its sorted
+    "name\\0child hash\\n" lines). The type prefixes keep a file from colliding with a directory
+    whose listing happens to be its content.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.hashes: Dict[str, str] = {}
+        self.children: Dict[str, Set[str]] = {}
+        self.stats: Dict[str, tuple] = {}   # file relpath -> (mtime_ns, size) at last hash
+
+    @property
+    def root_hash(self) -> str:
+        return self.hashes.get("", "")
+
+    def _abs(self, rel: str) -> str:
+        return os.path.join(self.root, *rel.split("/")) if rel else self.root
+
+    def _dir_hash(self, rel: str) -> str:
+        prefix = rel + "/" if rel else ""
+        body = "".join(f"{n}\0{self.hashes[prefix + n]}\n" for n in sorted(self.children[rel]))
+        return _sha(b"d\0" + body.encode("utf-8"))
+
+    def _scan(self, rel: str) -> None:
+        path = self._abs(rel)
+        prefix = rel + "/" if rel else ""
+        if os.path.isdir(path):
+            names = {n for n in os.listdir(path) if n not in IGNORED}
+            for gone in self.children.get(rel, set()) - names:
+                self._drop(prefix + gone)
+            self.children[rel] = names
+            for n in names:
+                self._scan(prefix + n)
+            self.hashes[rel] = self._dir_hash(rel)
+        else:
+            for gone in self.children.pop(rel, ()):
+                self._drop(prefix + gone)
+            st = os.stat(path)
+            key = (st.st_mtime_ns, st.st_size)
+            if self.stats.get(rel) != key or rel not in self.hashes:
+                self.hashes[rel] = hash_file(path)
+                self.stats[rel] = key
+
+    def _drop(self, rel: str) -> None:
+        for name in self.children.pop(rel, ()):
+            self._drop(f"{rel}/{name}" if rel else name)
+        self.hashes.pop(rel, None)
+        self.stats.pop(rel, None)
+
+    def build(self) -> "MerkleTree":
+        self.hashes.clear()
+        self.children.clear()
+        self.stats.clear()
+        return self.refresh()
+
+    def refresh(self) -> "MerkleTree":
+        """Pick up writes made by other processes: only files whose (mtime, size) changed are re-hashed."""
+        if os.path.isdir(self.root):
+            self._scan("")
+        return self
+
+    def touch(self, path: str) -> None:
+        """Re-hash one written/removed path and only its ancestors (O(depth * fan-out))."""
+        if not self.hashes:
+            self.build()
+            return
+        rel = os.path.relpath(os.path.abspath(path), os.path.abspath(self.root)).replace(os.sep, "/")
+        if rel == "." or rel.startswith(".."):
+            return
+        self._drop(rel)
+        exists = os.path.exists(self._abs(rel)) and rel.rsplit("/", 1)[-1] not in IGNORED
+        if exists:
+            self._scan(rel)
+        # link into (possibly new) parent dirs, then refresh the chain up to the root
+        node = rel
+        while node:
+            parent = _parent(node)
+            if parent not in self.children:
+                self.children[parent] = set()
+            name = node.rsplit("/", 1)[-1]
+            if exists:
+                self.children[parent].add(name)
+            else:
+                self.children[parent].discard(name)
+            self.hashes[parent] = self._dir_hash(parent)
+            node, exists = parent, True
+
+    def to_manifest(self) -> dict:
+        return {"root_hash": self.root_hash,
+                "nodes": {rel: {"hash": h, "children": sorted(self.children[rel]) if rel in self.children else None}
+                          for rel, h in sorted(self.hashes.items())},
+                "stats": {rel: list(st) for rel, st in sorted(self.stats.items())}}
+
+    def resume(self, path: Optional[str] = None) -> "MerkleTree":
+        """
+        Start from a saved manifest and refresh(): files whose (mtime, size) still match are
+        not re-hashed, so a new process pays a stat walk instead of a full rehash.
+        """
+        path = path or manifest_path(self.root)
+        try:
+            manifest = load_manifest(path)
+            nodes, stats = manifest["nodes"], manifest["stats"]
+        except (OSError, ValueError, KeyError):
+            return self.build()
+        self.hashes = {rel: n["hash"] for rel, n in nodes.items()}
+        self.children = {rel: set(n["children"]) for rel, n in nodes.items() if n["children"] is not None}
+        self.stats = {rel: tuple(st) for rel, st in stats.items()}
+        return self.refresh()
+
+    def save(self, path: Optional[str] = None) -> str:
+        path = path or manifest_path(self.root)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.to_manifest(), f, indent=1, sort_keys=True)
+        os.replace(path + ".tmp", path)
+        return path
+
+def load_manifest(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+# ---------- 2) Comparator: descend only into mismatching subtrees ----------
+
+def diff_manifests(actual: dict, golden: dict) -> List[dict]:
+    """[{'path', 'status': 'changed'|'missing'|'unexpected'}] for the leaves (or whole subtrees) that differ."""
+    a_nodes, g_nodes = actual["nodes"], golden["nodes"]
+    out: List[dict] = []
+    stack = [""]
+    while stack:
+        rel = stack.pop()
+        a, g = a_nodes.get(rel), g_nodes.get(rel)
+        if a and g and a["hash"] == g["hash"]:
+            continue
+        if a is None:
+            out.append({"path": rel, "status": "missing"})
+        elif g is None:
+            out.append({"path": rel, "status": "unexpected"})
+        elif a["children"] is None or g["children"] is None:
+            out.append({"path": rel, "status": "changed"})
+        else:
+            prefix = rel + "/" if rel else ""
+            stack.extend(prefix + n for n in sorted(set(a["children"]) | set(g["children"]), reverse=True))
+    return out
+
+def verify(root: str, golden_path: str) -> List[dict]:
+    """Compare the registered tree of `root` (kept current by touch(), see merkle_for) with a golden manifest."""
+    return diff_manifests(merkle_for(root).to_manifest(), load_manifest(golden_path))
+
+# ---------- 3) Nested JSON results ----------
+
+def json_manifest(obj) -> dict:
+    """Same manifest shape as MerkleTree, with JSON paths ('steps/3/thought') instead of file paths."""
+    nodes: Dict[str, dict] = {}
+
+    def walk(node, rel: str) -> str:
+        if isinstance(node, (dict, list)):
+            items = node.items() if isinstance(node, dict) else enumerate(node)
+            prefix = rel + "/" if rel else ""
+            names = []
+            body = []
+            for k, v in items:
+                k = str(k)
+                names.append(k)
+                body.append(f"{k}\0{walk(v, prefix + k)}\n")
+            h = _sha(("d\0" if isinstance(node, dict) else "l\0").encode() + "".join(sorted(body)).encode("utf-8"))
+            nodes[rel] = {"hash": h, "children": names}
+        else:
+            h = _sha(b"v\0" + json.dumps(node, sort_keys=True).encode("utf-8"))
+            nodes[rel] = {"hash": h, "children": None}
+        return h
+
+    return {"root_hash": walk(obj, ""), "nodes": nodes}
+
+def diff_json(actual, golden) -> List[dict]:
+    return diff_manifests(json_manifest(actual), json_manifest(golden))
+
+# ---------- 4) Per-root registry (kept current by the health.py write path) ----------
+
+_REGISTRY: Dict[str, MerkleTree] = {}
+
+def merkle_for(root: str) -> MerkleTree:
+    """The tree for `root`, created on first use from the saved manifest (see MerkleTree.resume)."""
+    key = os.path.abspath(root)
+    tree = _REGISTRY.get(key)
+    if tree is None:
+        tree = _REGISTRY[key] = MerkleTree(root).resume()
+    return tree
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    s = sub.add_parser("snapshot", help="write a manifest for ROOT")
+    s.add_argument("root")
+    s.add_argument("out", nargs="?")
+    v = sub.add_parser("verify", help="compare ROOT (dir or .json result) against a golden manifest/JSON")
+    v.add_argument("root")
+    v.add_argument("golden")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "snapshot":
+        if os.path.isdir(args.root):
+            print(merkle_for(args.root).save(args.out))
+        else:
+            out = args.out or args.root + MANIFEST_SUFFIX
+            with open(out, "w", encoding="utf-8") as f:
+                json.dump(json_manifest(load_manifest(args.root)), f, indent=1, sort_keys=True)
+            print(out)
+        return 0
+
+    if os.path.isdir(args.root):
+        diffs = verify(args.root, args.golden)
+    else:
+        golden = load_manifest(args.golden)
+        if "nodes" not in golden or "root_hash" not in golden:
+            golden = json_manifest(golden)
+        diffs = diff_manifests(json_manifest(load_manifest(args.root)), golden)
+    for d in diffs:
+        print(f"{d['status']:>10}  {d['path'] or '/'}")
+    print("OK" if not diffs else f"{len(diffs)} divergent path(s)")
+    return 1 if diffs else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,220 @@
+# SPDX-License-Identifier: Apache-2.0
+"""
+Minimal Prometheus-style metrics (text exposition format 0.0.4, no client library).
+
+    PARSE_SECONDS = histogram("hims_action_parse_seconds", "Action parse time", ("parser",))
+    PARSE_SECONDS.labels("fast").observe(dt)
+
+    @timed(PARSE_SECONDS, PARSE_ERRORS, parser="fast")
+    def parse(...): ...
+
+    register_collector(fn)   # fn() -> [(name, type, help, [(labels, value), ...])], called per scrape
+    render()                 # the /metrics body
+
+Off unless HIMS_METRICS=1: instrumentation is only worth its cost where something
+scrapes it. While off, timed() returns the function unchanged and call sites that
+observe directly check `ENABLED` first, so nothing is paid. Values that other modules
+already count (cache hits, pool load, ...) are exported by collectors, read only when
+/metrics is scraped.
+
+Updates take a per-child lock: parses and health actions are observed from worker
+threads, and `+=` on a shared value is not atomic across them.
+"""
+from __future__ import annotations
+import os
+import time
+import functools
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+ENABLED = os.environ.get("HIMS_METRICS", "0").lower() in ("1", "true", "on")
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _number(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) and not v.is_integer() else str(int(v))
+
+# ---------- 1) Metric types ----------
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._children: Dict[tuple, object] = {}
+        self._lock = threading.Lock()  # guards child creation
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def labels(self, *values, **kw):
+        if kw:
+            values = tuple(kw[n] for n in self.labelnames)
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = self._children[key] = self._child()
+        return child
+
+    def samples(self) -> Iterable[str]:
+        for key, child in list(self._children.items()):  # children are added from worker threads too
+            yield f"{self.name}{_labels(self.labelnames, key)} {_number(child.value)}"
+
+class _Value:
+    __slots__ = ("value", "lock")
+
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, n: float = 1) -> None:
+        with self.lock:
+            self.value += n
+
+    def dec(self, n: float = 1) -> None:
+        with self.lock:
+            self.value -= n
+
+    def set(self, v: float) -> None:
+        self.value = v
+
+class Counter(_Metric):
+    type = "counter"
+    _child = _Value
+
+    def inc(self, n: float = 1) -> None:
+        self._default.inc(n)
+
+class Gauge(_Metric):
+    type = "gauge"
+    _child = _Value
+
+    def set(self, v: float) -> None:
+        self._default.set(v)
+
+class _Buckets:
+    __slots__ = ("bounds", "counts", "sum", "count", "lock")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)   # last: above the largest bound
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, v: float) -> None:
+        i = bisect_left(self.bounds, v)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += v
+            self.count += 1
+
+    def snapshot(self):
+        with self.lock:  # counts, sum and count from the same moment
+            return list(self.counts), self.sum, self.count
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames)
+
+    def _child(self):
+        return _Buckets(self.buckets)
+
+    def observe(self, v: float) -> None:
+        self._default.observe(v)
+
+    def samples(self) -> Iterable[str]:
+        for key, child in list(self._children.items()):
+            counts, total, count = child.snapshot()
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = 'le="%s"' % _number(bound)
+                yield f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {count}"
+
+# ---------- 2) Registry ----------
+
+Collected = Tuple[str, str, str, List[Tuple[Dict[str, object], float]]]  # name, type, help, samples
+
+_METRICS: Dict[str, _Metric] = {}
+_COLLECTORS: List[Callable[[], Iterable[Collected]]] = []
+
+def _register(metric: _Metric) -> _Metric:
+    existing = _METRICS.get(metric.name)
+    if existing is not None:
+        if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+            raise ValueError(f"metric {metric.name!r} is already registered differently")
+        return existing  # module reloads re-declare their metrics
+    _METRICS[metric.name] = metric
+    return metric
+
+def counter(name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+    return _register(Counter(name, help, labelnames))
+
+def gauge(name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+    return _register(Gauge(name, help, labelnames))
+
+def histogram(name: str, help: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+    return _register(Histogram(name, help, labelnames, buckets))
+
+def register_collector(fn: Callable[[], Iterable[Collected]]) -> None:
+    _COLLECTORS.append(fn)
+
+def render() -> str:
+    lines = []
+    for metric in _METRICS.values():
+        if not metric._children:
+            continue
+        lines += [f"# HELP {metric.name} {metric.help}", f"# TYPE {metric.name} {metric.type}"]
+        lines.extend(metric.samples())
+    for collect in _COLLECTORS:
+        for name, kind, help, samples in collect():
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(list(labels), list(labels.values()))} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+# ---------- 3) Instrumentation helpers ----------
+
+def timed(hist: Histogram, errors: Optional[Counter] = None, **labels):
+    """
+    Decorator: observe each call's duration in `hist` (with `labels`) and count calls that
+    raise in `errors` (labels plus error=<exception type>). Identity when metrics are off.
+    """
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+        child = hist.labels(**labels)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if errors is not None:
+                    errors.labels(**labels, error=type(e).__name__).inc()
+                raise
+            finally:
+                child.observe(time.perf_counter() - t0)
+        return wrapper
+    return decorate
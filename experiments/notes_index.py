@@ -0,0 +1,233 @@
+# SPDX-License-Identifier: Apache-2.0
+from __future__ import annotations
+import os, re, json, math, threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+INDEX_SUFFIX = ".search"
+INDEXED_FILES = ("symptoms.txt", "treatment_plan.txt")
+MERGE_FACTOR = 8          # merge once this many segments are live
+K1, B = 1.2, 0.75         # standard BM25 parameters
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_ENTRY_RE = re.compile(rb"\[\d{4}-\d{2}-\d{2}\] ")   # health.py starts every note entry with "[date] "
+_STOP = frozenset("a an and or the of to in on for with at by is was be as no not if".split())
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOP]
+
+def index_dir(root: str) -> str:
+    # kept next to the HIMS root (like the aggregates snapshot), never inside it
+    return os.path.abspath(root).rstrip(os.sep) + INDEX_SUFFIX
+
+def _manifest_path(directory: str) -> str:
+    return os.path.join(directory, "manifest.json")
+
+def _manifest_stamp(directory: str) -> Optional[tuple]:
+    try:
+        st = os.stat(_manifest_path(directory))
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+# ---------- 1) Segments ----------
+
+class Segment:
+    """Immutable once flushed: docs {doc_id: [pid, file, text, length]} + postings {term: [[doc_id, tf], ...]}."""
+
+    def __init__(self, name: Optional[str] = None):
+        self.name = name
+        self.docs: Dict[str, list] = {}
+        self.postings: Dict[str, List[list]] = {}
+        self.total_len = 0
+
+    def add(self, doc_id: str, pid: str, fname: str, text: str) -> None:
+        terms = tokenize(text)
+        self.docs[doc_id] = [pid, fname, text, len(terms)]
+        self.total_len += len(terms)
+        for term, tf in Counter(terms).items():
+            self.postings.setdefault(term, []).append([doc_id, tf])
+
+    def write(self, directory: str, name: str) -> None:
+        path = os.path.join(directory, name)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"docs": self.docs, "postings": self.postings}, f)
+        os.replace(path + ".tmp", path)
+        self.name = name
+
+    @classmethod
+    def read(cls, directory: str, name: str) -> "Segment":
+        with open(os.path.join(directory, name), encoding="utf-8") as f:
+            data = json.load(f)
+        seg = cls(name)
+        seg.docs, seg.postings = data["docs"], data["postings"]
+        seg.total_len = sum(d[3] for d in seg.docs.values())
+        return seg
+
+    @classmethod
+    def merged(cls, segments: List["Segment"]) -> "Segment":
+        out = cls()
+        for seg in segments:
+            out.docs.update(seg.docs)
+            out.total_len += seg.total_len
+            for term, plist in seg.postings.items():
+                out.postings.setdefault(term, []).extend(plist)
+        return out
+
+# ---------- 2) Index ----------
+
+class NotesIndex:
+    """
+    BM25 over the entries of symptoms.txt / treatment_plan.txt (an entry may span several lines).
+    New entries go to an in-memory buffer, flushed as a new segment per write batch;
+    a background thread merges segments once MERGE_FACTOR of them are live.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.dir = index_dir(root)
+        self.lock = threading.RLock()
+        self.segments: List[Segment] = []
+        self.buffer = Segment()
+        self.next_seg = 0
+        self.stamp: Optional[tuple] = None   # manifest (mtime_ns, size) last read or written here
+        self._merging: Optional[threading.Thread] = None
+
+    # --- write path ---
+    def add_entry(self, pid: str, fname: str, offset: int, text: str) -> None:
+        # doc id uses the entry's byte offset in its file: unique and O(1) to get on append
+        with self.lock:
+            self.buffer.add(f"{pid}/{fname}@{offset}", pid, fname, text)
+
+    def flush(self) -> None:
+        with self.lock:
+            if not self.buffer.docs:
+                return
+            os.makedirs(self.dir, exist_ok=True)
+            self.buffer.write(self.dir, f"seg_{self.next_seg:06d}.json")
+            self.next_seg += 1
+            self.segments.append(self.buffer)
+            self.buffer = Segment()
+            self._write_manifest()
+            if len(self.segments) >= MERGE_FACTOR and not (self._merging and self._merging.is_alive()):
+                self._merging = threading.Thread(target=self.merge, daemon=True)
+                self._merging.start()
+
+    def merge(self) -> None:
+        """Fold all currently live segments into one; searches keep running against the old set meanwhile."""
+        with self.lock:
+            victims = list(self.segments)
+            name = f"seg_{self.next_seg:06d}.json"
+            self.next_seg += 1
+        if len(victims) < 2:
+            return
+        merged = Segment.merged(victims)
+        merged.write(self.dir, name)
+        with self.lock:
+            self.segments = [merged] + [s for s in self.segments if s not in victims]
+            self._write_manifest()
+        for s in victims:
+            try:
+                os.remove(os.path.join(self.dir, s.name))
+            except OSError:
+                pass
+
+    def _write_manifest(self) -> None:
+        path = _manifest_path(self.dir)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"segments": [s.name for s in self.segments], "next_seg": self.next_seg}, f)
+        os.replace(path + ".tmp", path)
+        self.stamp = _manifest_stamp(self.dir)
+
+    # --- read path ---
+    def search(self, query: str, top_k: int = 10) -> List[dict]:
+        terms = tokenize(query)
+        with self.lock:
+            segs = self.segments + ([self.buffer] if self.buffer.docs else [])
+        n_docs = sum(len(s.docs) for s in segs)
+        if not terms or not n_docs:
+            return []
+        avgdl = sum(s.total_len for s in segs) / n_docs or 1.0
+        scores: Dict[str, float] = {}
+        where: Dict[str, Segment] = {}
+        for term in set(terms):
+            df = sum(len(s.postings.get(term, ())) for s in segs)
+            if not df:
+                continue
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for s in segs:
+                for doc_id, tf in s.postings.get(term, ()):
+                    dl = s.docs[doc_id][3]
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * dl / avgdl))
+                    where[doc_id] = s
+        ranked: List[Tuple[str, float]] = sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))[:top_k]
+        out = []
+        for doc_id, score in ranked:
+            pid, fname, text, _ = where[doc_id].docs[doc_id]
+            out.append({"patient_id": pid, "file": fname, "text": text, "score": round(score, 4)})
+        return out
+
+    # --- lifecycle ---
+    @classmethod
+    def load(cls, root: str) -> "NotesIndex":
+        idx = cls(root)
+        if _manifest_stamp(idx.dir) is not None:
+            idx.refresh()
+        elif os.path.isdir(os.path.join(root, "Patients")):
+            idx.rebuild()
+        return idx
+
+    def refresh(self) -> None:
+        """Pick up segments another process flushed or merged; the unflushed buffer is kept as it is."""
+        stamp = _manifest_stamp(self.dir)  # before reading: a newer write is picked up next time
+        if stamp is None or stamp == self.stamp:
+            return
+        with self.lock:
+            known = {s.name: s for s in self.segments}
+            try:
+                with open(_manifest_path(self.dir), encoding="utf-8") as f:
+                    data = json.load(f)
+                segments = [known.get(n) or Segment.read(self.dir, n) for n in data["segments"]]
+            except FileNotFoundError:
+                return  # a segment was merged away meanwhile; the next call sees the newer manifest
+            self.segments = segments
+            self.next_seg = max(self.next_seg, data["next_seg"])
+            self.stamp = stamp
+
+    def rebuild(self) -> None:
+        """One-off scan of every patient's note files (used when no index exists yet)."""
+        patients = os.path.join(self.root, "Patients")
+        for pid in sorted(os.listdir(patients)):
+            for fname in INDEXED_FILES:
+                path = os.path.join(patients, pid, fname)
+                if os.path.exists(path):
+                    with open(path, "rb") as f:
+                        for offset, text in _entries(f.read()):
+                            self.add_entry(pid, fname, offset, text)
+        self.flush()
+
+def _entries(data: bytes):
+    """(offset, text) of each entry as health.py appended it: a "[date] " line plus any continuation lines."""
+    starts = [m.start() for m in _ENTRY_RE.finditer(data) if m.start() == 0 or data[m.start() - 1:m.start()] == b"\n"]
+    if data and starts[:1] != [0]:
+        starts.insert(0, 0)  # leading text written without a date prefix
+    for start, end in zip(starts, starts[1:] + [len(data)]):
+        text = data[start:end].decode("utf-8")
+        if text.endswith("\n"):
+            text = text[:-1]
+        if text.strip():
+            yield start, text
+
+# ---------- 3) Per-root registry ----------
+
+_REGISTRY: Dict[str, NotesIndex] = {}
+
+def notes_index_for(root: str) -> NotesIndex:
+    """The process-wide index of `root`, refreshed (one stat) if another process changed its manifest."""
+    key = os.path.abspath(root)
+    idx = _REGISTRY.get(key)
+    if idx is None:
+        idx = _REGISTRY[key] = NotesIndex.load(root)
+    else:
+        idx.refresh()
+    return idx
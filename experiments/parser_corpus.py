@@ -0,0 +1,172 @@
+# SPDX-License-Identifier: Apache-2.0
+"""
+Response corpus for benchmarking and fuzzing action_parser.
+
+"recorded" responses are rebuilt from the thoughts/actions in results/baseline/*.json and
+results/improved/*.json (rendered in the "Thought: ...\nAction: name(kw='...')" format the
+model emits). Synthetic variants reuse those thoughts with the GUI action space:
+
+  multi       2-4 actions separated by ")\n\n"
+  reflection  "Reflection: ... Action_Summary: ..." and "Action_Summary: ..." headers
+  point       <point>x y</point> tags and start_point/end_point/point spellings
+  escaped     type/finished content with \', \", \n, backslashes and bare quotes
+
+  python experiments/parser_corpus.py --out corpus.jsonl [--synthetic 2000 --seed 0]
+"""
+from __future__ import annotations
+import os, sys, glob, json, random, argparse
+from typing import Dict, List, Tuple
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "results")
+RESULT_SETS = ("baseline", "improved")
+KINDS = ("recorded", "multi", "reflection", "point", "escaped")
+
+# ---------- 1) Recorded trajectories ----------
+
+def _steps(node):
+    if isinstance(node, dict):
+        if "thought" in node and isinstance(node.get("actions"), list):
+            yield node
+        for v in node.values():
+            yield from _steps(v)
+    elif isinstance(node, list):
+        for v in node:
+            yield from _steps(v)
+
+def _render_action(a: dict) -> str:
+    name = a.get("type") or "wait"
+    kwargs = {k: v for k, v in a.items() if k != "type" and isinstance(v, str)}
+    return f"{name}(" + ", ".join(f"{k}={v!r}" for k, v in kwargs.items()) + ")"
+
+def load_responses(results_dir: str = RESULTS_DIR, sets=RESULT_SETS) -> List[str]:
+    out = []
+    for name in sets:
+        for path in sorted(glob.glob(os.path.join(results_dir, name, "*.json"))):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f)
+            except (ValueError, UnicodeDecodeError):
+                continue  # a few logs are shell transcripts rather than JSON
+            for step in _steps(data):
+                actions = [_render_action(a) for a in step["actions"] if isinstance(a, dict)]
+                if actions:
+                    out.append(f"Thought: {step['thought']}\nAction: " + "\n\n".join(actions))
+    return out
+
+def load_thoughts(results_dir: str = RESULTS_DIR, sets=RESULT_SETS) -> List[str]:
+    thoughts = []
+    for text in load_responses(results_dir, sets):
+        thoughts.append(text[len("Thought: "):text.rindex("\nAction: ")])
+    return thoughts
+
+# ---------- 2) Synthetic variants ----------
+
+_TEXTS = ["hello", "Jane Doe", "Amoxicillin 500mg TID", "chest X-ray", "2025-09-12", "Dr. Patel", "咳嗽 发烧 3 天"]
+
+def _xy(rng: random.Random) -> Tuple[int, int]:
+    return rng.randint(0, 1919), rng.randint(0, 1079)
+
+def _box(rng: random.Random) -> str:
+    x, y = _xy(rng)
+    if rng.random() < 0.3:
+        return f"'({x},{y},{x + rng.randint(1, 80)},{y + rng.randint(1, 40)})'"
+    return f"'({x},{y})'"
+
+def _plain_action(rng: random.Random) -> str:
+    kind = rng.randrange(8)
+    if kind == 0:
+        return f"click(start_box={_box(rng)})"
+    if kind == 1:
+        return f"left_double(start_box={_box(rng)})"
+    if kind == 2:
+        return f"right_single(start_box={_box(rng)})"
+    if kind == 3:
+        return f"drag(start_box={_box(rng)}, end_box={_box(rng)})"
+    if kind == 4:
+        return f"hotkey(key='{rng.choice(['ctrl c', 'ctrl v', 'enter', 'cmd shift 3', 'arrowdown'])}')"
+    if kind == 5:
+        return f"scroll(start_box={_box(rng)}, direction='{rng.choice(['up', 'down', 'left', 'right'])}')"
+    if kind == 6:
+        return f"type(content='{rng.choice(_TEXTS)}')"
+    return rng.choice(["wait()", f"finished(content='{rng.choice(_TEXTS)}')"])
+
+def _point_action(rng: random.Random) -> str:
+    (x1, y1), (x2, y2) = _xy(rng), _xy(rng)
+    return rng.choice([
+        f"click(point='<point>{x1} {y1}</point>')",
+        f"left_double(point='<point>{x1} {y1}</point>')",
+        f"drag(start_point='<point>{x1} {y1}</point>', end_point='<point>{x2} {y2}</point>')",
+        f"scroll(point='<point>{x1} {y1}</point>', direction='down')",
+        f"click(start_point='({x1},{y1})')",
+        f"click(point='({x1},{y1})')",
+    ])
+
+def _escaped_action(rng: random.Random) -> str:
+    text = rng.choice(_TEXTS)
+    return rng.choice([
+        f"type(content='{text}\\n')",
+        f"type(content='it\\'s {text}')",
+        f"type(content='it's {text}')",                    # bare quote, repaired by escape_single_quotes
+        f"type(content='say \"{text}\"')",
+        f"type(content='C:\\\\Users\\\\{text}')",
+        f"finished(content='done: \\'{text}\\'')",
+        f"finished(content=\"{text} \\\"quoted\\\"\")",
+        f"hotkey(key='ctrl \\'')",
+    ])
+
+def _header(rng: random.Random, thought: str, kind: str) -> str:
+    if kind == "reflection":
+        if rng.random() < 0.5:
+            return f"Reflection: {thought}\nAction_Summary: {rng.choice(_TEXTS)}\nAction: "
+        return f"Action_Summary: {thought}\nAction: "
+    return f"Thought: {thought}\nAction: "
+
+def synthetic(kind: str, thoughts: List[str], rng: random.Random) -> str:
+    thought = rng.choice(thoughts) if thoughts else rng.choice(_TEXTS)
+    if kind == "multi":
+        actions = [_plain_action(rng) for _ in range(rng.randint(2, 4))]
+    elif kind == "point":
+        actions = [_point_action(rng) for _ in range(rng.randint(1, 2))]
+    elif kind == "escaped":
+        actions = [_escaped_action(rng)]
+    else:
+        actions = [_plain_action(rng) for _ in range(rng.randint(1, 2))]
+    text = _header(rng, thought, kind) + "\n\n".join(actions)
+    if rng.random() < 0.05:
+        text += "[EOS]"
+    return text
+
+def build_corpus(synthetic_per_kind: int = 500, seed: int = 0) -> List[Tuple[str, str]]:
+    """[(kind, response)]: every recorded response plus `synthetic_per_kind` of each synthetic kind."""
+    rng = random.Random(seed)
+    recorded = load_responses()
+    thoughts = load_thoughts()
+    corpus = [("recorded", t) for t in recorded]
+    for kind in KINDS[1:]:
+        corpus.extend((kind, synthetic(kind, thoughts, rng)) for _ in range(synthetic_per_kind))
+    return corpus
+
+def by_kind(corpus: List[Tuple[str, str]]) -> Dict[str, List[str]]:
+    out: Dict[str, List[str]] = {}
+    for kind, text in corpus:
+        out.setdefault(kind, []).append(text)
+    return out
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--out", default="-")
+    ap.add_argument("--synthetic", type=int, default=500, help="responses per synthetic kind")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args(argv)
+    corpus = build_corpus(args.synthetic, args.seed)
+    f = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8")
+    try:
+        for kind, text in corpus:
+            f.write(json.dumps({"kind": kind, "text": text}, ensure_ascii=False) + "\n")
+    finally:
+        if f is not sys.stdout:
+            f.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
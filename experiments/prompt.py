@@ -38,6 +38,7 @@ finished(content='xxx') # Use escape characters \\', \\", and \\n in content par
   - `health.ensure_hims()`
   - `health.extract_and_update(dialogue="<对话原文>")`
   - `health.upsert_patient(patient_name="…", symptoms=[…], treatment_plan="…", next_steps="…", appointment_date="YYYY-MM-DD", doctor="…", imaging="…")`
+  - `health.search(query="…", top_k=10)` 检索所有患者的症状/治疗记录（BM25 排序）
 输出示例：
 Thought: …  
 Action: health.extract_and_update(dialogue="Patient: …")
@@ -0,0 +1,254 @@
+# SPDX-License-Identifier: Apache-2.0
+"""
+Warm-standby replication of a HIMS root using the Merkle trees from merkle.py.
+
+  python -m ui_tars.replicate serve  HIMS            --port 9700        # on the primary
+  python -m ui_tars.replicate follow localhost:9700  HIMS_replica -i 2  # on the replica
+
+(run from the directory containing ui_tars/, like the other proxy tools)
+
+The replica walks the primary's tree one level per round trip, descending only into
+directories whose hashes differ, then pulls the differing files as zlib-compressed
+batches. An unchanged tree costs one round trip and a few hundred bytes.
+
+The primary picks up writes made by other processes once per sync connection (a stat
+walk that re-hashes only changed files), not on every round trip of the walk.
+"""
+from __future__ import annotations
+import os, sys, json, time, zlib, socket, struct, argparse, socketserver, threading
+from typing import Dict, List, Optional
+
+from ui_tars.merkle import MerkleTree, IGNORED, merkle_for
+
+DEFAULT_PORT = 9700
+BATCH_BYTES = 4 << 20      # raw bytes per compressed file batch
+_HDR = struct.Struct(">II")  # json header length, blob length
+
+# ---------- 1) Framing ----------
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("peer closed connection")
+        buf += chunk
+    return bytes(buf)
+
+def send_msg(sock: socket.socket, header: dict, blob: bytes = b"") -> int:
+    head = json.dumps(header).encode("utf-8")
+    sock.sendall(_HDR.pack(len(head), len(blob)) + head + blob)
+    return _HDR.size + len(head) + len(blob)
+
+def recv_msg(sock: socket.socket):
+    hlen, blen = _HDR.unpack(_recv_exact(sock, _HDR.size))
+    header = json.loads(_recv_exact(sock, hlen))
+    blob = _recv_exact(sock, blen) if blen else b""
+    return header, blob, _HDR.size + hlen + blen
+
+def _safe_rel(rel: str) -> str:
+    parts = rel.split("/")
+    if not rel or rel.startswith("/") or any(p in ("", ".", "..") for p in parts):
+        raise ValueError(f"refusing unsafe path from peer: {rel!r}")
+    return rel
+
+# ---------- 2) Primary ----------
+
+def node_info(tree: MerkleTree, rel: str) -> Optional[dict]:
+    if rel not in tree.hashes:
+        return None
+    if rel not in tree.children:
+        return {"hash": tree.hashes[rel], "children": None}
+    prefix = rel + "/" if rel else ""
+    return {"hash": tree.hashes[rel],
+            "children": {n: [tree.hashes[prefix + n], prefix + n in tree.children] for n in tree.children[rel]}}
+
+class _PrimaryHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        server: "PrimaryServer" = self.server  # type: ignore[assignment]
+        refreshed = False  # one connection = one sync pass: refresh once, then walk a stable tree
+        while True:
+            try:
+                header, _, _ = recv_msg(self.request)
+            except ConnectionError:
+                return
+            op = header.get("op")
+            if op == "nodes":
+                with server.lock:
+                    if not refreshed:
+                        server.tree.refresh()
+                        refreshed = True
+                    nodes = {rel: node_info(server.tree, rel) for rel in header["paths"]}
+                send_msg(self.request, {"nodes": nodes})
+            elif op == "fetch":
+                for batch in _pack_files(server.tree.root, header["paths"]):
+                    send_msg(self.request, {"batch": batch["paths"], "last": False}, batch["blob"])
+                send_msg(self.request, {"batch": [], "last": True})
+            else:
+                send_msg(self.request, {"error": f"unknown op {op!r}"})
+
+def _pack_files(root: str, paths: List[str]):
+    """Yield {'paths': [...], 'blob': zlib(record*)}; record = 4-byte path len, path, 8-byte size, bytes."""
+    buf, names = bytearray(), []
+    for rel in paths:
+        path = os.path.join(root, *_safe_rel(rel).split("/"))
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except (FileNotFoundError, IsADirectoryError):
+            continue  # changed again since the walk; the next sync picks it up
+        p = rel.encode("utf-8")
+        buf += struct.pack(">I", len(p)) + p + struct.pack(">Q", len(data)) + data
+        names.append(rel)
+        if len(buf) >= BATCH_BYTES:
+            yield {"paths": names, "blob": zlib.compress(bytes(buf), 6)}
+            buf, names = bytearray(), []
+    if names:
+        yield {"paths": names, "blob": zlib.compress(bytes(buf), 6)}
+
+def _unpack_files(blob: bytes):
+    raw, pos = zlib.decompress(blob), 0
+    while pos < len(raw):
+        (plen,) = struct.unpack_from(">I", raw, pos); pos += 4
+        rel = raw[pos:pos + plen].decode("utf-8"); pos += plen
+        (size,) = struct.unpack_from(">Q", raw, pos); pos += 8
+        yield rel, raw[pos:pos + size]
+        pos += size
+
+class PrimaryServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, root: str, host: str = "127.0.0.1", port: int = DEFAULT_PORT):
+        self.tree = merkle_for(root)  # shared with this process's health.py writes (touch())
+        self.lock = threading.Lock()
+        super().__init__((host, port), _PrimaryHandler)
+
+# ---------- 3) Replica ----------
+
+class Replica:
+    def __init__(self, root: str, host: str, port: int = DEFAULT_PORT):
+        self.root, self.addr = root, (host, port)
+        os.makedirs(root, exist_ok=True)
+        self.tree = MerkleTree(root).build()
+
+    def _abs(self, rel: str) -> str:
+        return os.path.join(self.root, *_safe_rel(rel).split("/"))
+
+    def _remove(self, rel: str) -> None:
+        path = self._abs(rel)
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path, topdown=False):
+                for n in filenames:
+                    os.remove(os.path.join(dirpath, n))
+                for n in dirnames:
+                    os.rmdir(os.path.join(dirpath, n))
+            os.rmdir(path)
+        elif os.path.exists(path):
+            os.remove(path)
+        self.tree.touch(path)
+
+    def _write(self, rel: str, data: bytes) -> None:
+        path = self._abs(rel)
+        if os.path.isdir(path):
+            self._remove(rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".repl-tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".repl-tmp", path)
+        self.tree.touch(path)
+
+    def sync_once(self) -> dict:
+        """One reconciliation pass; returns what moved and how long it took."""
+        t0 = time.time()
+        stats = {"round_trips": 0, "files": 0, "deleted": 0, "dirs": 0,
+                 "bytes_sent": 0, "bytes_received": 0, "bytes_raw": 0}
+        with socket.create_connection(self.addr) as sock:
+            def ask(header):
+                stats["bytes_sent"] += send_msg(sock, header)
+                reply, _, n = recv_msg(sock)
+                stats["bytes_received"] += n
+                stats["round_trips"] += 1
+                return reply
+
+            level, fetch = [""], []
+            while level:
+                nodes = ask({"op": "nodes", "paths": level})["nodes"]
+                nxt = []
+                for rel in level:
+                    remote = nodes.get(rel)
+                    if remote is None or remote["hash"] == self.tree.hashes.get(rel):
+                        continue
+                    if remote["children"] is None:
+                        fetch.append(rel)
+                        continue
+                    if rel and rel in self.tree.hashes and rel not in self.tree.children:
+                        self._remove(rel)  # file on replica, directory on primary
+                    if rel and not os.path.isdir(self._abs(rel)):
+                        os.makedirs(self._abs(rel), exist_ok=True)
+                        self.tree.touch(self._abs(rel))
+                        stats["dirs"] += 1
+                    prefix = rel + "/" if rel else ""
+                    for name in sorted(self.tree.children.get(rel, set()) - set(remote["children"])):
+                        self._remove(prefix + name)
+                        stats["deleted"] += 1
+                    for name, (h, is_dir) in sorted(remote["children"].items()):
+                        if name in IGNORED or self.tree.hashes.get(prefix + name) == h:
+                            continue
+                        (nxt if is_dir else fetch).append(prefix + name)
+                level = nxt
+
+            if fetch:
+                stats["bytes_sent"] += send_msg(sock, {"op": "fetch", "paths": fetch})
+                stats["round_trips"] += 1
+                while True:
+                    header, blob, n = recv_msg(sock)
+                    stats["bytes_received"] += n
+                    if header.get("last"):
+                        break
+                    for rel, data in _unpack_files(blob):
+                        self._write(rel, data)
+                        stats["files"] += 1
+                        stats["bytes_raw"] += len(data)
+        stats["lag_s"] = round(time.time() - t0, 4)
+        return stats
+
+    def follow(self, interval: float = 2.0, stop: Optional[threading.Event] = None, log=print) -> None:
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            try:
+                stats = self.sync_once()
+                if stats["files"] or stats["deleted"]:
+                    log(json.dumps(stats))
+            except (OSError, ValueError) as e:
+                log(f"sync failed: {e}")
+            stop.wait(interval)
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    s = sub.add_parser("serve")
+    s.add_argument("root")
+    s.add_argument("--host", default="127.0.0.1")
+    s.add_argument("--port", type=int, default=DEFAULT_PORT)
+    f = sub.add_parser("follow")
+    f.add_argument("primary", help="host:port")
+    f.add_argument("root")
+    f.add_argument("-i", "--interval", type=float, default=2.0)
+    f.add_argument("--once", action="store_true")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "serve":
+        with PrimaryServer(args.root, args.host, args.port) as srv:
+            srv.serve_forever()
+        return 0
+    host, _, port = args.primary.rpartition(":")
+    replica = Replica(args.root, host or "127.0.0.1", int(port or DEFAULT_PORT))
+    if args.once:
+        print(json.dumps(replica.sync_once()))
+    else:
+        replica.follow(args.interval)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
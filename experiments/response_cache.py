@@ -0,0 +1,152 @@
+# SPDX-License-Identifier: Apache-2.0
+"""
+Content-addressed cache of chat-completion responses, for record/replay runs.
+
+A request is keyed by the SHA-256 of a canonical JSON encoding of the fields that decide
+its output (model, messages, sampling parameters, tools, stream). Responses live on
+disk, one file per key, and the oldest-used entries are evicted once the cache exceeds
+`max_bytes`.
+
+  off     no caching (default)
+  record  serve hits from disk; on a miss call the upstream and store the response
+  replay  serve hits from disk; a miss raises CacheMiss and never reaches the upstream
+
+    cache = ResponseCache.from_env()          # HIMS_CACHE_MODE / HIMS_CACHE_DIR / HIMS_CACHE_MAX_MB
+    key = cache.key(body)
+    hit = cache.get(key)                      # CachedResponse or None (raises CacheMiss in replay)
+    ...
+    cache.put(key, CachedResponse(200, "application/json", content))
+"""
+from __future__ import annotations
+import os
+import json
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+MODES = ("off", "record", "replay")
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".response_cache")
+
+# request fields that change the completion; anything else (user, metadata, ...) is ignored
+KEY_FIELDS = (
+    "model", "messages", "stream",
+    "temperature", "top_p", "top_k", "min_p", "max_tokens", "max_completion_tokens", "n", "seed", "stop",
+    "presence_penalty", "frequency_penalty", "repetition_penalty", "logit_bias", "logprobs", "top_logprobs",
+    "response_format", "tools", "tool_choice",
+)
+
+class CacheMiss(LookupError):
+    """Replay mode was asked for a request that was never recorded."""
+
+@dataclass
+class CachedResponse:
+    status_code: int
+    content_type: Optional[str]
+    content: bytes
+
+def canonical_key(body: dict) -> str:
+    """SHA-256 of the output-relevant request fields; dict order and whitespace do not matter."""
+    fields = {k: body[k] for k in KEY_FIELDS if body.get(k) is not None}
+    if not fields.get("stream"):
+        fields.pop("stream", None)  # stream: false is the same request as no stream field
+    blob = json.dumps(fields, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """Disk-backed LRU: one `<key>.bin` file per entry (JSON header line, then the raw body)."""
+
+    def __init__(self, mode: str = "off", directory: str = DEFAULT_DIR, max_bytes: int = 512 << 20):
+        if mode not in MODES:
+            raise ValueError(f"cache mode must be one of {MODES}, got {mode!r}")
+        self.mode, self.directory, self.max_bytes = mode, directory, max_bytes
+        self.counts = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._sizes: "OrderedDict[str, int]" = OrderedDict()  # key -> file size, least recently used first
+        self._total = 0
+        if mode != "off":
+            self._load_index()
+
+    @classmethod
+    def from_env(cls) -> "ResponseCache":
+        return cls(os.environ.get("HIMS_CACHE_MODE", "off").lower(),
+                   os.environ.get("HIMS_CACHE_DIR", DEFAULT_DIR),
+                   int(float(os.environ.get("HIMS_CACHE_MAX_MB", "512")) * (1 << 20)))
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    key = staticmethod(canonical_key)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".bin")
+
+    def _load_index(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".bin"):
+                st = os.stat(os.path.join(self.directory, name))
+                entries.append((st.st_mtime, name[:-4], st.st_size))
+        for _, key, size in sorted(entries):  # mtime doubles as the last-used time
+            self._sizes[key] = size
+            self._total += size
+        self._evict()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        if self.mode == "off":
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                header = json.loads(f.readline())
+                content = f.read()
+        except (OSError, ValueError):
+            self.counts["misses"] += 1
+            if self.mode == "replay":
+                raise CacheMiss(f"no recorded response for request {key[:12]}") from None
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass  # evicted by another process since the read; the content is still good
+        if key in self._sizes:
+            self._sizes.move_to_end(key)
+        else:  # written by another process (or worker) after this index was loaded
+            self._sizes[key] = size
+            self._total += size
+            self._evict()
+        self.counts["hits"] += 1
+        return CachedResponse(header["status_code"], header.get("content_type"), content)
+
+    def put(self, key: str, response: CachedResponse) -> None:
+        """Store a successful response (record mode only; errors are never cached)."""
+        if self.mode != "record" or response.status_code != 200:
+            return
+        header = json.dumps({"status_code": response.status_code, "content_type": response.content_type})
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(header.encode("utf-8") + b"\n" + response.content)
+        os.replace(tmp, path)  # readers never see a half-written entry
+        size = os.path.getsize(path)
+        self._total += size - self._sizes.pop(key, 0)
+        self._sizes[key] = size
+        self.counts["stores"] += 1
+        self._evict()
+
+    def _evict(self) -> None:
+        while self._total > self.max_bytes and len(self._sizes) > 1:
+            key, size = self._sizes.popitem(last=False)
+            self._total -= size
+            self.counts["evictions"] += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        lookups = self.counts["hits"] + self.counts["misses"]
+        return dict(self.counts, mode=self.mode, entries=len(self._sizes), bytes=self._total,
+                    hit_ratio=round(self.counts["hits"] / lookups, 3) if lookups else None)
@@ -1,65 +1,596 @@
 # run_health.py
 
+import os
+import json
+import math
+import logging
+import asyncio
+import time
+import uuid
 import subprocess
+from collections import deque
+from contextlib import asynccontextmanager, nullcontext
+
 import requests
 
-from ui_tars.action_parser import (
-    parse_action_to_structure_output,
-    parsing_response_to_pyautogui_code,
-)
+from ui_tars import metrics
+from ui_tars.action_parser import optimize_actions
+from ui_tars.admission import AdmissionController, PriorityClass, QueueFull
+from ui_tars.action_repair import PARSE_ERRORS, ActionRepairer
+from ui_tars.action_schema import parse_typed_actions, route_actions, split_response
+from ui_tars.executor import ActionExecutor, PyAutoGUIBackend
+from ui_tars.settle import SettleWaiter, ScreenshotSignal
 from ui_tars.health import execute_health_actions
+from ui_tars.image_transform import ScreenshotTransformer, has_images
+from ui_tars.response_cache import CachedResponse, CacheMiss, ResponseCache, canonical_key
+from ui_tars.singleflight import Broadcast, SingleFlight
+from ui_tars.upstream_pool import UpstreamPool
 
 try:
     from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse, Response, StreamingResponse
+    import httpx
     import uvicorn
 except ImportError:
     FastAPI = None
     Request = None
+    JSONResponse = None
+    Response = None
+    StreamingResponse = None
+    httpx = None
     uvicorn = None
 
-app = FastAPI()
+# upstream agent server and the proxy's connection pool (overridable per deployment)
+UPSTREAM_URL = os.environ.get("HIMS_UPSTREAM_URL", "http://localhost:8888")
+UPSTREAM_MAX_CONNECTIONS = int(os.environ.get("HIMS_UPSTREAM_MAX_CONNECTIONS", "100"))
+UPSTREAM_MAX_KEEPALIVE = int(os.environ.get("HIMS_UPSTREAM_MAX_KEEPALIVE", "20"))
+UPSTREAM_CONNECT_TIMEOUT_S = float(os.environ.get("HIMS_UPSTREAM_CONNECT_TIMEOUT", "5"))
+UPSTREAM_TIMEOUT_S = float(os.environ.get("HIMS_UPSTREAM_TIMEOUT", "60"))
+# several agent servers: comma-separated; the proxy balances, health-checks and (optionally) hedges
+UPSTREAM_URLS = [u.strip() for u in os.environ.get("HIMS_UPSTREAM_URLS", UPSTREAM_URL).split(",") if u.strip()]
+UPSTREAM_HEALTH_PATH = os.environ.get("HIMS_UPSTREAM_HEALTH_PATH", "/v1/models") or None
+UPSTREAM_HEALTH_INTERVAL_S = float(os.environ.get("HIMS_UPSTREAM_HEALTH_INTERVAL", "5"))
+BREAKER_FAILURES = int(os.environ.get("HIMS_BREAKER_FAILURES", "5"))
+BREAKER_OPEN_S = float(os.environ.get("HIMS_BREAKER_OPEN_S", "10"))
+HEDGE = os.environ.get("HIMS_HEDGE", "0").lower() in ("1", "true", "on")
+HEDGE_QUANTILE = float(os.environ.get("HIMS_HEDGE_QUANTILE", "0.95"))
+# admission control: at most MAX_CONCURRENCY upstream calls at once (0 disables); interactive
+# calls are queued ahead of batch ones, and batch may hold at most BATCH_MAX_ACTIVE slots
+MAX_CONCURRENCY = int(os.environ.get("HIMS_MAX_CONCURRENCY", "32"))
+QUEUE_INTERACTIVE = int(os.environ.get("HIMS_QUEUE_INTERACTIVE", "64"))
+QUEUE_BATCH = int(os.environ.get("HIMS_QUEUE_BATCH", "512"))
+BATCH_MAX_ACTIVE = int(os.environ.get("HIMS_BATCH_MAX_ACTIVE", str(max(1, MAX_CONCURRENCY * 3 // 4))))
+PRIORITY_HEADER = "x-priority"  # interactive | batch
+DEFAULT_PRIORITY = os.environ.get("HIMS_DEFAULT_PRIORITY", "interactive").strip().lower()
+# "key1=batch,key2=interactive": the class of a bearer token, taking precedence over the header
+PRIORITY_KEYS = {key.strip(): cls.strip().lower() for key, _, cls in
+                 (item.partition("=") for item in os.environ.get("HIMS_PRIORITY_KEYS", "").split(",") if "=" in item)}
+TIMEOUT_HEADER = "x-upstream-timeout"  # optional per-request override, in seconds
+STREAM_TEE_DIR = os.environ.get("HIMS_STREAM_TEE_DIR")  # if set, every SSE stream is also written here
+
+CACHE_HEADER = "x-cache"  # hit | miss on every proxied response while the cache is enabled
+COALESCED_HEADER = "x-coalesced"  # set on responses that shared another request's upstream call
+COALESCE = os.environ.get("HIMS_COALESCE", "1").lower() not in ("0", "false", "off")
+
+# record/replay of completions (HIMS_CACHE_MODE=off|record|replay, HIMS_CACHE_DIR, HIMS_CACHE_MAX_MB)
+response_cache = ResponseCache.from_env()
+
+# server-side health.* execution: on for every request with HIMS_EXECUTE_HEALTH=1, or per
+# request with "x-execute-health: 1"; only the GUI actions are left in the returned completion
+EXECUTE_HEALTH = os.environ.get("HIMS_EXECUTE_HEALTH", "0").lower() in ("1", "true", "on")
+EXECUTE_HEALTH_HEADER = "x-execute-health"
+HIMS_ROOT = os.environ.get("HIMS_ROOT", "HIMS")
+
+# main(): wait for the screen to settle between GUI actions; HIMS_SETTLE=0 restores the fixed 1 s / 0.5 s sleeps
+SETTLE = os.environ.get("HIMS_SETTLE", "1").lower() not in ("0", "false", "off")
+
+# screenshot resize / re-encode / cross-turn dedupe before forwarding (HIMS_IMAGE_* settings)
+screenshot_transform = (ScreenshotTransformer.from_env()
+                        if os.environ.get("HIMS_IMAGE_TRANSFORM", "1").lower() not in ("0", "false", "off") else None)
+
+PROMPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompt.py")
 
-with open("ui_tars/prompt.py") as f:
+with open(PROMPT_PATH) as f:
     system_prompt = f.read()
 
+def make_upstream_client(base_url: str = None) -> "httpx.AsyncClient":
+    """One shared keep-alive pool for all forwarded requests."""
+    return httpx.AsyncClient(
+        base_url=base_url or UPSTREAM_URL,
+        limits=httpx.Limits(max_connections=UPSTREAM_MAX_CONNECTIONS,
+                            max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE),
+        timeout=httpx.Timeout(UPSTREAM_TIMEOUT_S, connect=UPSTREAM_CONNECT_TIMEOUT_S),
+    )
+
+def make_upstream_pool(urls=None) -> UpstreamPool:
+    return UpstreamPool(urls or UPSTREAM_URLS, make_upstream_client,
+                        failure_threshold=BREAKER_FAILURES, open_s=BREAKER_OPEN_S,
+                        health_path=UPSTREAM_HEALTH_PATH, health_interval_s=UPSTREAM_HEALTH_INTERVAL_S,
+                        hedge=HEDGE, hedge_quantile=HEDGE_QUANTILE)
+
+@asynccontextmanager
+async def lifespan(app):
+    app.state.upstream = make_upstream_pool()
+    await app.state.upstream.start()
+    try:
+        yield
+    finally:
+        await app.state.upstream.aclose()
+
+app = FastAPI(lifespan=lifespan)
+
+# Prometheus text exposition at GET /metrics; off (no instrumentation at all) unless HIMS_METRICS=1
+METRIC_ROUTES = ("/v1/chat/completions", "/proxy/stats", "/metrics")  # anything else is "other"
+HTTP_REQUESTS = metrics.counter("hims_http_requests_total", "HTTP requests by route and status", ("route", "status"))
+HTTP_SECONDS = metrics.histogram("hims_http_request_seconds",
+                                 "Request received to last response byte, by route", ("route",))
+HTTP_IN_FLIGHT = metrics.gauge("hims_http_in_flight", "Requests being handled, by route", ("route",))
+HTTP_REQUEST_BYTES = metrics.counter("hims_http_request_bytes_total", "Request body bytes, by route", ("route",))
+HTTP_RESPONSE_BYTES = metrics.counter("hims_http_response_bytes_total", "Response body bytes, by route", ("route",))
+PROXY_SECONDS = metrics.histogram("hims_proxy_latency_seconds",
+                                  "Completion request received to: upstream dispatch (prepare), full response "
+                                  "(completion), first streamed byte (ttfb), first token (ttft), end of stream "
+                                  "(stream)", ("phase",))
+QUEUE_SECONDS = metrics.histogram("hims_admission_queue_seconds", "Time queued for an upstream slot",
+                                  ("priority",))
+
+class MetricsMiddleware:
+    """Plain ASGI (no response buffering): counts, latency, in-flight and body bytes per route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        route = scope["path"] if scope["path"] in METRIC_ROUTES else "other"
+        t0, status, size_in, size_out = time.perf_counter(), 500, 0, 0
+
+        async def receive_counted():
+            nonlocal size_in
+            message = await receive()
+            if message["type"] == "http.request":
+                size_in += len(message.get("body", b""))
+            return message
+
+        async def send_counted(message):
+            nonlocal status, size_out
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size_out += len(message.get("body", b""))
+            await send(message)
+
+        in_flight = HTTP_IN_FLIGHT.labels(route)
+        in_flight.inc()
+        try:
+            await self.app(scope, receive_counted, send_counted)
+        finally:
+            in_flight.dec()
+            HTTP_REQUESTS.labels(route, status).inc()
+            HTTP_SECONDS.labels(route).observe(time.perf_counter() - t0)
+            HTTP_REQUEST_BYTES.labels(route).inc(size_in)
+            HTTP_RESPONSE_BYTES.labels(route).inc(size_out)
+
+if metrics.ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+def make_admission():
+    if MAX_CONCURRENCY <= 0:
+        return None
+    return AdmissionController(MAX_CONCURRENCY, {
+        "interactive": PriorityClass(0, QUEUE_INTERACTIVE),
+        "batch": PriorityClass(1, QUEUE_BATCH, max_active=BATCH_MAX_ACTIVE),
+    })
+
+def check_priorities(admission) -> None:
+    """Fail at startup, not per request, if HIMS_DEFAULT_PRIORITY / HIMS_PRIORITY_KEYS name an unknown class."""
+    if admission is None:
+        return
+    unknown = sorted({DEFAULT_PRIORITY, *PRIORITY_KEYS.values()} - set(admission.classes))
+    if unknown:
+        raise ValueError(f"unknown priority class(es) {unknown} in HIMS_DEFAULT_PRIORITY / HIMS_PRIORITY_KEYS; "
+                         f"expected one of {sorted(admission.classes)}")
+
+admission = make_admission()
+check_priorities(admission)
+
+class LatencyWindow:
+    """The most recent `size` latencies (seconds) of one kind, summarized on demand (and fed to `metric`)."""
+
+    def __init__(self, size: int = 4096, metric=None):
+        self.samples = deque(maxlen=size)
+        self.count = 0
+        self.metric = metric if metrics.ENABLED else None
+
+    def add(self, seconds: float) -> None:
+        self.samples.append(seconds)
+        self.count += 1
+        if self.metric is not None:
+            self.metric.observe(seconds)
+
+    def summary(self) -> dict:
+        xs = sorted(self.samples)
+        if not xs:
+            return {"count": 0}
+        pick = lambda q: xs[min(len(xs) - 1, int(q * len(xs)))]
+        return {"count": self.count,
+                "p50_s": round(pick(0.50), 4),
+                "p90_s": round(pick(0.90), 4),
+                "p99_s": round(pick(0.99), 4),
+                "max_s": round(xs[-1], 4)}
+
+# request received -> upstream dispatch (after prompt injection, image transform and cache
+# lookup: the proxy's own overhead) / full non-streamed response / first streamed byte /
+# first non-empty content delta (time to first token) / end of stream
+proxy_stats = {phase: LatencyWindow(metric=PROXY_SECONDS.labels(phase))
+               for phase in ("prepare", "completion", "ttfb", "ttft", "stream")}
+inflight = SingleFlight()
+health_stats = {"responses": 0, "actions": 0, "errors": 0}
+
+@app.get("/proxy/stats")
+async def get_proxy_stats():
+    stats = {name: window.summary() for name, window in proxy_stats.items()}
+    stats["upstream"] = app.state.upstream.stats()
+    if admission is not None:
+        stats["admission"] = admission.stats()
+    stats["cache"] = response_cache.stats()
+    stats["coalesce"] = dict(inflight.stats(), in_flight=inflight.in_flight())
+    stats["health"] = dict(health_stats)
+    if screenshot_transform is not None:
+        stats["images"] = screenshot_transform.stats()
+    return stats
+
+def _collect_metrics():
+    """Counters and gauges the proxy's components already keep, read at scrape time."""
+    def family(name, kind, help, samples):
+        return name, kind, help, list(samples)
+
+    pool = getattr(app.state, "upstream", None)
+    if pool is not None:
+        now = time.monotonic()
+        per = lambda f: [({"upstream": b.url}, f(b)) for b in pool.backends]
+        yield family("hims_upstream_in_flight", "gauge", "Requests outstanding per backend",
+                     per(lambda b: b.outstanding))
+        yield family("hims_upstream_requests_total", "counter", "Requests sent per backend",
+                     per(lambda b: b.requests))
+        yield family("hims_upstream_errors_total", "counter", "Transport errors and 5xx per backend",
+                     per(lambda b: b.errors))
+        yield family("hims_upstream_breaker_open", "gauge", "1 while the backend's circuit breaker is open",
+                     per(lambda b: int(now < b.open_until)))
+        yield family("hims_upstream_breaker_trips_total", "counter", "Times the backend's breaker opened",
+                     per(lambda b: b.trips))
+        yield family("hims_upstream_healthy", "gauge", "1 if the backend passed its last health check",
+                     per(lambda b: int(b.healthy)))
+        yield family("hims_upstream_pool_events_total", "counter", "Hedges sent and won, retries, calls with "
+                     "every breaker open", [({"event": k}, v) for k, v in pool.counts.items()])
+    if admission is not None:
+        per = lambda f: [({"priority": n}, f(c)) for n, c in admission.classes.items()]
+        yield family("hims_admission_active", "gauge", "Upstream slots held", per(lambda c: c.active))
+        yield family("hims_admission_queued", "gauge", "Calls waiting for a slot", per(lambda c: len(c.waiters)))
+        yield family("hims_admission_admitted_total", "counter", "Calls given a slot", per(lambda c: c.admitted))
+        yield family("hims_admission_rejected_total", "counter", "Calls rejected with a full queue",
+                     per(lambda c: c.rejected))
+    if response_cache.enabled:
+        yield family("hims_cache_events_total", "counter", "Response cache hits, misses, stores and evictions",
+                     [({"event": k}, v) for k, v in response_cache.counts.items()])
+        yield family("hims_cache_bytes", "gauge", "Bytes stored in the response cache", [({}, response_cache.stats()["bytes"])])
+    yield family("hims_coalesce_requests_total", "counter", "Requests eligible for coalescing",
+                 [({}, inflight.counts["requests"])])
+    yield family("hims_coalesce_upstream_calls_total", "counter", "Upstream calls those requests made",
+                 [({}, inflight.counts["upstream_calls"])])
+    yield family("hims_coalesce_in_flight", "gauge", "Distinct upstream calls in flight", [({}, inflight.in_flight())])
+    yield family("hims_health_events_total", "counter", "Server-side health execution: responses, actions, errors",
+                 [({"event": k}, v) for k, v in health_stats.items()])
+    if screenshot_transform is not None:
+        yield family("hims_image_events_total", "counter", "Screenshot transform counters (images, bytes, tokens)",
+                     [({"event": k}, v) for k, v in screenshot_transform.counts.items()])
+
+if metrics.ENABLED:
+    metrics.register_collector(_collect_metrics)
+
+@app.get("/metrics")
+async def get_metrics():
+    if not metrics.ENABLED:
+        return JSONResponse({"error": "metrics are disabled (start the proxy with HIMS_METRICS=1)"}, status_code=404)
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+def _request_timeout(request: Request):
+    """The x-upstream-timeout override; ValueError (-> 400) unless it is a positive number of seconds."""
+    value = request.headers.get(TIMEOUT_HEADER)
+    if not value:
+        return httpx.USE_CLIENT_DEFAULT
+    try:
+        seconds = float(value)
+    except ValueError:
+        seconds = math.nan
+    if not math.isfinite(seconds) or seconds <= 0:
+        raise ValueError(f"invalid {TIMEOUT_HEADER} header {value!r}: expected a positive number of seconds")
+    return httpx.Timeout(seconds, connect=UPSTREAM_CONNECT_TIMEOUT_S)
+
+def _priority(request: Request) -> str:
+    auth = request.headers.get("authorization", "")
+    if auth[:7].lower() == "bearer " and auth[7:].strip() in PRIORITY_KEYS:
+        return PRIORITY_KEYS[auth[7:].strip()]
+    value = (request.headers.get(PRIORITY_HEADER) or "").lower()
+    if admission is not None and value in admission.classes:
+        return value
+    return DEFAULT_PRIORITY
+
+def _admit(priority: str):
+    """A slot for one upstream call (raises QueueFull when the class's queue is full)."""
+    return admission.slot(priority) if admission is not None else nullcontext()
+
+def _observe_queue(priority: str, waited) -> None:
+    if waited is not None and metrics.ENABLED:  # None: admission control is off
+        QUEUE_SECONDS.labels(priority).observe(waited)
+
+def _has_content(lines: bytes) -> bool:
+    """True if any complete `data:` line carries a non-empty choices[].delta.content."""
+    for line in lines.split(b"\n"):
+        if not line.startswith(b"data:") or b'"content"' not in line:
+            continue
+        try:
+            event = json.loads(line[5:])
+        except ValueError:
+            continue
+        for choice in event.get("choices") or ():
+            if (choice.get("delta") or {}).get("content"):
+                return True
+    return False
+
+log = logging.getLogger(__name__)
+
+def _open_tee():
+    """The .sse file this stream is copied to, or None; a tee that cannot be opened never fails the stream."""
+    if not STREAM_TEE_DIR:
+        return None
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.sse"
+    try:
+        os.makedirs(STREAM_TEE_DIR, exist_ok=True)
+        return open(os.path.join(STREAM_TEE_DIR, name), "wb")
+    except OSError as e:
+        log.warning("stream tee disabled for this stream: %s", e)
+        return None
+
+def _error(status_code: int, message: str) -> CachedResponse:
+    return CachedResponse(status_code, "application/json", json.dumps({"error": message}).encode())
+
+async def _complete(pool: UpstreamPool, body: dict, timeout, t0: float, cache_key: str = None,
+                    priority: str = DEFAULT_PRIORITY) -> CachedResponse:
+    """One non-streamed upstream call; transport errors become 504/502 responses."""
+    # non-blocking: other requests keep being served while this one waits on the upstream
+    async with _admit(priority) as waited:
+        _observe_queue(priority, waited)
+        try:
+            response = await pool.post("/v1/chat/completions", json=body, timeout=timeout)
+        except httpx.TimeoutException as e:
+            return _error(504, f"upstream timeout: {e!r}")
+        except httpx.HTTPError as e:
+            return _error(502, f"upstream unavailable: {e!r}")
+    proxy_stats["completion"].add(time.perf_counter() - t0)
+    result = CachedResponse(response.status_code, response.headers.get("content-type"), response.content)
+    if cache_key:
+        response_cache.put(cache_key, result)
+    return result
+
+async def _pump_stream(flight: Broadcast, pool: UpstreamPool, body: dict, timeout, t0: float,
+                       cache_key: str = None, priority: str = DEFAULT_PRIORITY):
+    """
+    Hold an admission slot for the whole stream. Whatever goes wrong, the flight is closed and an
+    unresolved head fails (QueueFull -> 503 in the handler), so no attached request waits forever.
+    """
+    try:
+        async with _admit(priority) as waited:
+            _observe_queue(priority, waited)
+            await _relay_stream(flight, pool, body, timeout, t0, cache_key)
+    except QueueFull as e:
+        if not flight.head.done():
+            flight.head.set_exception(e)
+    except BaseException as e:
+        if not flight.head.done():
+            if isinstance(e, asyncio.CancelledError):
+                flight.head.cancel()
+            else:
+                flight.head.set_exception(e)
+        raise
+    finally:
+        flight.close()
+
+async def _relay_stream(flight: Broadcast, pool: UpstreamPool, body: dict, timeout, t0: float, cache_key: str = None):
+    """Read one upstream SSE stream into `flight` as chunks arrive (and record it once complete)."""
+    try:
+        upstream = await pool.open_stream("/v1/chat/completions", json=body, timeout=timeout)
+    except httpx.TimeoutException as e:
+        flight.head.set_result(_error(504, f"upstream timeout: {e!r}"))
+        flight.close()
+        return
+    except httpx.HTTPError as e:
+        flight.head.set_result(_error(502, f"upstream unavailable: {e!r}"))
+        flight.close()
+        return
+    if upstream.status_code != 200:
+        # errors come back as a plain body, not a stream
+        content = await upstream.aread()
+        await upstream.aclose()
+        flight.head.set_result(CachedResponse(upstream.status_code, upstream.headers.get("content-type"), content))
+        flight.close()
+        return
+    media_type = upstream.headers.get("content-type", "text/event-stream")
+    flight.head.set_result(CachedResponse(200, media_type, b""))
+
+    tee, first_byte, pending = None, True, b""  # pending: unterminated SSE line, kept until the first token
+    try:
+        tee = _open_tee()
+        async for chunk in upstream.aiter_raw():
+            if first_byte:
+                proxy_stats["ttfb"].add(time.perf_counter() - t0)
+                first_byte = False
+            if pending is not None:
+                lines, _, rest = (pending + chunk).rpartition(b"\n")
+                if _has_content(lines):
+                    proxy_stats["ttft"].add(time.perf_counter() - t0)
+                    pending = None
+                else:
+                    pending = rest
+            if tee:
+                try:
+                    tee.write(chunk)
+                except OSError as e:  # e.g. disk full: keep streaming to the clients
+                    log.warning("stream tee stopped: %s", e)
+                    tee.close()
+                    tee = None
+            flight.publish(chunk)
+        proxy_stats["stream"].add(time.perf_counter() - t0)
+        if cache_key:  # only streams that ran to the end are recorded
+            response_cache.put(cache_key, CachedResponse(200, media_type, b"".join(flight.chunks)))
+    except httpx.HTTPError:
+        pass  # upstream dropped mid-stream: end ours too; the client sees no [DONE]
+    finally:
+        await upstream.aclose()
+        if tee:
+            try:
+                tee.close()
+            except OSError as e:
+                log.warning("stream tee not flushed: %s", e)
+        flight.close()
+
+def _execute_health_requested(request: Request) -> bool:
+    value = request.headers.get(EXECUTE_HEALTH_HEADER)
+    if value is None:
+        return EXECUTE_HEALTH
+    return value.lower() in ("1", "true", "on")
+
+_health_lock = asyncio.Lock()  # HIMS registries are per-root singletons: one batch at a time
+
+async def _execute_health(result: CachedResponse) -> CachedResponse:
+    """
+    Run the health.* actions of a completion here and return it with only the GUI actions
+    left in the message, plus a top-level "hims" entry with the results (or the error).
+    Anything that is not a parseable chat completion is passed through unchanged.
+    """
+    try:
+        data = json.loads(result.content)
+        message = data["choices"][0]["message"]
+        content = message["content"]
+    except (ValueError, KeyError, IndexError, TypeError):
+        return result
+    if not isinstance(content, str) or "health." not in content:
+        return result
+    try:
+        rest, actions = split_response(content, "health")
+    except PARSE_ERRORS as e:
+        # leave the completion as it was; the client's own parser reports the problem
+        health_stats["errors"] += 1
+        data["hims"] = {"executed": 0, "error": f"parse: {e}"}
+        return CachedResponse(200, "application/json", json.dumps(data, ensure_ascii=False).encode())
+    if not actions:
+        return result
+    message["content"] = rest
+    try:
+        async with _health_lock:
+            results = await asyncio.to_thread(execute_health_actions, actions, HIMS_ROOT)
+        data["hims"] = {"executed": len(actions), "results": results}
+    except Exception as e:  # the writes may be partial: report, do not hand them back to the client
+        health_stats["errors"] += 1
+        data["hims"] = {"executed": 0, "error": f"{type(e).__name__}: {e}"}
+    health_stats["responses"] += 1
+    health_stats["actions"] += len(actions)
+    return CachedResponse(200, "application/json", json.dumps(data, ensure_ascii=False, default=str).encode())
+
 @app.post("/v1/chat/completions")
 async def proxy_chat_completions(request: Request):
+    t0 = time.perf_counter()
+    try:
+        timeout = _request_timeout(request)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
     body = await request.json()
+    execute_health = _execute_health_requested(request)
+    if execute_health and body.get("stream"):
+        # the health.* actions are only known once the whole completion is in, and the client
+        # would still receive them in the stream: refuse rather than silently not executing
+        return JSONResponse({"error": "health execution needs the full completion: send stream: false, "
+                                      f"or {EXECUTE_HEALTH_HEADER}: 0 to stream without it"}, status_code=400)
     messages = body.get("messages", [])
     # Prepend system prompt as a system message
     new_messages = [{"role": "system", "content": system_prompt}] + messages
     body["messages"] = new_messages
+    if screenshot_transform is not None and has_images(new_messages):
+        # decode/resize/encode is CPU work: keep it off the event loop
+        body["messages"] = await asyncio.to_thread(screenshot_transform, new_messages)
 
-    response = requests.post(
-        "http://localhost:8888/v1/chat/completions",
-        json=body,
-        timeout=60,
-    )
-    response.raise_for_status()
-    return response.json()
+    # keyed after the system prompt is injected (and images transformed), so editing prompt.py
+    # invalidates old entries
+    key = canonical_key(body)
+    cache_key = key if response_cache.enabled else None
+    if cache_key:
+        try:
+            hit = response_cache.get(cache_key)
+        except CacheMiss as e:
+            return JSONResponse({"error": f"replay mode: {e}"}, status_code=503, headers={CACHE_HEADER: "miss"})
+        if hit is not None:
+            if hit.status_code == 200 and execute_health:  # replay runs the same writes as record did
+                hit = await _execute_health(hit)
+            return Response(hit.content, status_code=hit.status_code, media_type=hit.content_type,
+                            headers={CACHE_HEADER: "hit"})
+
+    # identical requests already in flight share that upstream call instead of starting their own
+    # (per priority class, so an interactive request never waits in a batch leader's queue)
+    pool, priority = request.app.state.upstream, _priority(request)
+    proxy_stats["prepare"].add(time.perf_counter() - t0)
+    flight_key = f"{priority}:{key}" if COALESCE else None
+    headers = {CACHE_HEADER: "miss"} if cache_key else {}
+    try:
+        if body.get("stream"):
+            flight, shared = inflight.join(flight_key, lambda: Broadcast(
+                lambda f: _pump_stream(f, pool, body, timeout, t0, cache_key, priority)))
+            head = await asyncio.shield(flight.head)
+        else:
+            flight, shared = inflight.join(flight_key, lambda: asyncio.ensure_future(
+                _complete(pool, body, timeout, t0, cache_key, priority)))
+            head = await asyncio.shield(flight)
+    except QueueFull as e:
+        return JSONResponse({"error": f"overloaded: {e}"}, status_code=503, headers={"retry-after": "1"})
+    if shared:
+        headers[COALESCED_HEADER] = "1"
+    if head.status_code == 200 and execute_health:
+        head = await _execute_health(head)
+    if head.status_code != 200 or not body.get("stream"):
+        # pass the upstream body through untouched (no decode/re-encode, non-JSON errors survive)
+        return Response(head.content, status_code=head.status_code, media_type=head.content_type,
+                        headers=headers)
+    headers.update({"cache-control": "no-cache", "x-accel-buffering": "no"})
+    return StreamingResponse(flight.subscribe(), status_code=200, media_type=head.content_type, headers=headers)
 
 def call_model(prompt: str) -> str:
     """
     Call the agent-tars local server running at http://localhost:8888,
     sending the prompt and returning the model's output.
+    In replay mode a request that was never recorded raises CacheMiss.
     """
-    response = requests.post(
-        "http://localhost:8888/v1/chat/completions",
-        json={
-            "model": "claude-opus-4-1-20250805",
-            "messages": [
-                {"role": "user", "content": prompt}
-            ]
-        },
-        timeout=60,
-    )
-    response.raise_for_status()
-    data = response.json()
+    payload = {
+        "model": "claude-opus-4-1-20250805",
+        "messages": [
+            {"role": "user", "content": prompt}
+        ]
+    }
+    cache_key = response_cache.key(payload) if response_cache.enabled else None
+    hit = response_cache.get(cache_key) if cache_key else None
+    if hit is not None:
+        content = hit.content
+    else:
+        response = requests.post(f"{UPSTREAM_URL}/v1/chat/completions", json=payload, timeout=60)
+        response.raise_for_status()
+        content = response.content
+        if cache_key:
+            response_cache.put(cache_key, CachedResponse(200, response.headers.get("content-type"), content))
+    data = json.loads(content)
     return data["choices"][0]["message"]["content"]
 
 def main():
     # 1) 准备 prompt（包括你在 prompt.py 里写的“医疗工作流模式”）
-    with open("ui_tars/prompt.py") as f:
+    with open(PROMPT_PATH) as f:
         system_prompt = f.read()
     medical_dialogue = """Patient: Jane Doe
     Symptoms: cough, fever for 3 days
@@ -69,18 +600,21 @@ def main():
     Imaging: Chest X-ray"""
     raw = call_model(system_prompt + "\n" + medical_dialogue)
 
-    # 2) 解析成动作
-    structured = parse_action_to_structure_output(raw, factor=28, origin_resized_height=800, origin_resized_width=600)
+    # 2) 解析成动作：按 schema 校验参数类型（格式小错误在本地修复，不再重新请求模型）
+    repairer = ActionRepairer(parse_fn=parse_typed_actions)
+    structured = repairer.parse(raw, factor=28, origin_resized_height=800, origin_resized_width=600)
 
-    # 3) 分流：先跑 health，再跑 GUI
-    health_actions = [a for a in structured if a["action_type"].startswith("health.")]
-    if health_actions:
-        execute_health_actions(health_actions, root="HIMS")
+    # 3) 按 schema 声明的 target 分流：先跑 health，再跑 GUI
+    routed = route_actions(structured)
+    if routed.get("health"):
+        execute_health_actions(routed["health"], root="HIMS")
 
-    gui_actions = [a for a in structured if not a["action_type"].startswith("health.")]
+    gui_actions = routed.get("gui", [])
     if gui_actions:
-        code = parsing_response_to_pyautogui_code(gui_actions, image_height=800, image_width=600)
-        exec(code, globals())
+        # 直接调用输入后端；需要导出脚本时仍可用 parsing_response_to_pyautogui_code
+        settle = SettleWaiter(ScreenshotSignal()) if SETTLE else None
+        executor = ActionExecutor(PyAutoGUIBackend(), image_height=800, image_width=600, settle=settle)
+        executor.execute(optimize_actions(gui_actions))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,126 @@
+# SPDX-License-Identifier: Apache-2.0
+"""
+Adaptive settle detection between GUI actions.
+
+The generated pyautogui code sleeps a fixed 1 s between actions and 0.5 s after every
+paste. SettleWaiter instead polls a cheap screen signal and returns as soon as the UI
+has stopped changing (or a timeout hits), recording how long each settle took.
+
+    waiter = SettleWaiter(ScreenshotSignal())
+    executor = ActionExecutor(PyAutoGUIBackend(), 800, 600, settle=waiter)
+    ...
+    waiter.stats()   # {'action': {'count': 40, 'p50_s': 0.12, 'p90_s': 0.41, ..., 'timeouts': 1}}
+
+Signals are plain callables returning a fingerprint; two consecutive equal (or, for
+screenshots, near-equal) fingerprints count as one stable poll.
+"""
+from __future__ import annotations
+import time
+import hashlib
+from collections import deque
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+MAX_SAMPLES = 10_000    # per kind; older settle times roll off
+
+# ---------- 1) Signals ----------
+
+class ScreenshotSignal:
+    """
+    Downscaled grayscale screenshot. Fingerprints are the raw thumbnail bytes; they are
+    "equal" when the mean absolute pixel difference is at most `tolerance` gray levels,
+    which absorbs cursor blink and antialiasing noise.
+    """
+
+    def __init__(self, size: Tuple[int, int] = (64, 36), region=None, tolerance: float = 1.0, grab=None):
+        self.size, self.region, self.tolerance = size, region, tolerance
+        if grab is None:
+            import pyautogui
+            grab = pyautogui.screenshot
+        self.grab = grab
+
+    def __call__(self) -> bytes:
+        img = self.grab(region=self.region) if self.region else self.grab()
+        return img.convert("L").resize(self.size).tobytes()
+
+    def same(self, a: bytes, b: bytes) -> bool:
+        if a == b:
+            return True
+        if len(a) != len(b):
+            return False
+        return sum(abs(x - y) for x, y in zip(a, b)) / len(a) <= self.tolerance
+
+class HashSignal:
+    """Exact-match variant: a short digest of any bytes-producing probe (e.g. a thumbnail)."""
+
+    def __init__(self, probe: Callable[[], bytes]):
+        self.probe = probe
+
+    def __call__(self) -> bytes:
+        return hashlib.blake2b(self.probe(), digest_size=8).digest()
+
+class CounterSignal:
+    """
+    Wraps a change counter, e.g. the number of accessibility-tree events seen so far
+    (AXObserver notifications on macOS, AT-SPI events on Linux). Stable = no new events.
+    """
+
+    def __init__(self, read_counter: Callable[[], int]):
+        self.read_counter = read_counter
+
+    def __call__(self) -> int:
+        return self.read_counter()
+
+# ---------- 2) Waiter ----------
+
+class SettleWaiter:
+    """
+    wait(kind) blocks until `stable_polls` consecutive polls see no change, but at least
+    `min_wait_s` and at most `max_wait_s`. Returns the observed settle time in seconds.
+    """
+
+    def __init__(self, signal: Callable[[], object], poll_s: float = 0.05, stable_polls: int = 2,
+                 min_wait_s: float = 0.05, max_wait_s: float = 3.0,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.signal = signal
+        self.same = getattr(signal, "same", None) or (lambda a, b: a == b)
+        self.poll_s, self.stable_polls = poll_s, stable_polls
+        self.min_wait_s, self.max_wait_s = min_wait_s, max_wait_s
+        self.clock, self.sleep = clock, sleep
+        self.samples: Dict[str, Deque[float]] = {}
+        self.timeouts: Dict[str, int] = {}
+
+    def wait(self, kind: str = "action", max_wait_s: Optional[float] = None) -> float:
+        limit = self.max_wait_s if max_wait_s is None else max_wait_s
+        t0 = self.clock()
+        prev, stable, timed_out = self.signal(), 0, False
+        while True:
+            self.sleep(self.poll_s)
+            elapsed = self.clock() - t0
+            cur = self.signal()
+            stable = stable + 1 if self.same(prev, cur) else 0
+            prev = cur
+            if stable >= self.stable_polls and elapsed >= self.min_wait_s:
+                break
+            if elapsed >= limit:
+                timed_out = True
+                break
+        elapsed = self.clock() - t0
+        self.samples.setdefault(kind, deque(maxlen=MAX_SAMPLES)).append(elapsed)
+        if timed_out:
+            self.timeouts[kind] = self.timeouts.get(kind, 0) + 1
+        return elapsed
+
+    def stats(self) -> Dict[str, dict]:
+        """Per kind: count, mean and p50/p90/p99/max settle time, plus how many waits hit the timeout."""
+        out = {}
+        for kind, samples in self.samples.items():
+            xs = sorted(samples)
+            pick = lambda q: xs[min(len(xs) - 1, int(q * len(xs)))]
+            out[kind] = {"count": len(xs),
+                         "mean_s": round(sum(xs) / len(xs), 4),
+                         "p50_s": round(pick(0.50), 4),
+                         "p90_s": round(pick(0.90), 4),
+                         "p99_s": round(pick(0.99), 4),
+                         "max_s": round(xs[-1], 4),
+                         "timeouts": self.timeouts.get(kind, 0)}
+        return out
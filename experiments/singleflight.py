@@ -0,0 +1,102 @@
+# SPDX-License-Identifier: Apache-2.0
+"""
+Single-flight coalescing of identical in-flight requests.
+
+Concurrent requests with the same key share one upstream call: the first one (the
+leader) starts it, later ones attach to it until it finishes, and all of them get the
+same result. Flights run as their own tasks, so a client that disconnects does not
+cancel the call for the others.
+
+    inflight = SingleFlight()
+    task, shared = inflight.join(key, lambda: asyncio.ensure_future(fetch()))
+    result = await asyncio.shield(task)
+
+    # streams: every subscriber sees every chunk, from the first one
+    flight, shared = inflight.join(key, lambda: Broadcast(pump))
+    head = await asyncio.shield(flight.head)
+    async for chunk in flight.subscribe(): ...
+
+    inflight.stats()   # {'requests': 120, 'upstream_calls': 20, 'coalesced': 100, 'ratio': 6.0}
+"""
+from __future__ import annotations
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+class Broadcast:
+    """
+    One upstream stream fanned out to any number of subscribers. `pump(broadcast)` runs as
+    a task: it resolves `head` once the upstream has answered, then publishes chunks and
+    closes. The pump is cancelled when its last subscriber goes away.
+    """
+
+    def __init__(self, pump: Callable[["Broadcast"], Awaitable[None]]):
+        loop = asyncio.get_running_loop()
+        self.head: asyncio.Future = loop.create_future()
+        self.chunks: List[bytes] = []
+        self.closed = False
+        self.abandoned = False
+        self.subscribers = 0
+        self._changed = asyncio.Event()
+        self.task = loop.create_task(pump(self))
+
+    def publish(self, chunk: bytes) -> None:
+        self.chunks.append(chunk)
+        self._wake()
+
+    def close(self) -> None:
+        self.closed = True
+        self._wake()
+
+    def _wake(self) -> None:
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def subscribe(self):
+        self.subscribers += 1
+        i = 0
+        try:
+            while True:
+                while i < len(self.chunks):
+                    yield self.chunks[i]
+                    i += 1
+                if self.closed:
+                    return
+                await self._changed.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.closed:
+                self.abandoned = True  # nobody is listening any more; new requests start afresh
+                self.task.cancel()
+
+class SingleFlight:
+    """key -> the flight (a Future/Task, or a Broadcast) currently serving that key."""
+
+    def __init__(self):
+        self._flights: Dict[str, Any] = {}
+        self.counts = {"requests": 0, "upstream_calls": 0}
+
+    def join(self, key: Optional[str], start: Callable[[], Any]) -> Tuple[Any, bool]:
+        """(flight, shared). Starts a new flight unless one for `key` is running; key=None never shares."""
+        self.counts["requests"] += 1
+        flight = self._flights.get(key) if key is not None else None
+        if flight is not None and not getattr(flight, "abandoned", False):
+            return flight, True
+        self.counts["upstream_calls"] += 1
+        flight = start()
+        if key is not None:
+            self._flights[key] = flight
+            task = flight if isinstance(flight, asyncio.Future) else flight.task
+            task.add_done_callback(lambda _: self._forget(key, flight))
+        return flight, False
+
+    def _forget(self, key: str, flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    def stats(self) -> dict:
+        requests, calls = self.counts["requests"], self.counts["upstream_calls"]
+        return {"requests": requests, "upstream_calls": calls, "coalesced": requests - calls,
+                "ratio": round(requests / calls, 2) if calls else None}
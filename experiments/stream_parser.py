@@ -0,0 +1,153 @@
+# SPDX-License-Identifier: Apache-2.0
+"""
+Incremental parser for streamed model responses.
+
+Tracks the Thought / Reflection / Action_Summary / Action sections as tokens arrive
+and hands back each action as soon as its closing parenthesis is seen, so execution
+can start while the rest of the response is still being generated.
+
+The actions are the ones parse_action_to_ir returns for the whole response, quirks
+included: like it, a trailing [EOS] is only dropped when the response has <point> tags;
+otherwise close() raises on it (after the actions before it were already handed out).
+
+    parser = StreamingActionParser(factor=28, origin_resized_height=1080, origin_resized_width=1920)
+    for chunk in token_stream:
+        for action in parser.feed(chunk):
+            executor.execute(action)
+    for action in parser.close():
+        executor.execute(action)
+"""
+from __future__ import annotations
+from typing import Iterable, Iterator, List, Optional
+
+from ui_tars.action_parser import Action, parse_action_to_ir, _split_thought
+
+ACTION_MARK = "Action: "
+SECTION_MARKS = (("Reflection: ", "reflection"), ("Action_Summary: ", "action_summary"), ("Thought: ", "thought"))
+_OVERLAP = max(len(m) for m, _ in SECTION_MARKS)  # a mark may straddle two chunks
+
+class StreamingActionParser:
+    """feed() text chunks, get completed Actions back; close() flushes whatever is left."""
+
+    def __init__(self, factor, origin_resized_height, origin_resized_width, model_type="qwen25vl",
+                 max_pixels=16384 * 28 * 28, min_pixels=100 * 28 * 28):
+        self.parse_args = (factor, origin_resized_height, origin_resized_width, model_type, max_pixels, min_pixels)
+        self.buf = ""
+        self.section = "preamble"          # preamble | thought | reflection | action_summary | action
+        self.header: Optional[str] = None  # everything before "Action: "
+        self.emitted = 0
+        self._searched = 0                 # how far the buffer has been scanned for section marks
+        # action scanner state
+        self._pos = 0
+        self._start: Optional[int] = None
+        self._depth = 0
+        self._quote: Optional[str] = None
+        self._escape = False
+        self._is_type: Optional[bool] = None
+
+    @property
+    def thought(self) -> Optional[str]:
+        return _split_thought(self.header.strip() + "\n" + ACTION_MARK)[1] if self.header is not None else None
+
+    # ---------- feeding ----------
+
+    def feed(self, chunk: str) -> List[Action]:
+        self.buf += chunk
+        if self.header is None and not self._find_action_section():
+            return []
+        return self._scan()
+
+    def close(self) -> List[Action]:
+        if self.header is None:
+            # no "Action: " ever arrived: let the regular parser report it the usual way
+            return parse_action_to_ir(self.buf, *self.parse_args)
+        out = self._scan()
+        if self._start is not None:
+            rest = self._strip_eos(self.buf[self._start:]).strip()
+            self._start = None
+            if rest:
+                out.append(self._parse_piece(rest))
+        return out
+
+    def _find_action_section(self) -> bool:
+        lo = max(0, self._searched - _OVERLAP)
+        last = max(((self.buf.rfind(mark, lo), name) for mark, name in SECTION_MARKS), default=(-1, None))
+        if last[0] >= 0:
+            self.section = last[1]
+        k = self.buf.find(ACTION_MARK, lo)
+        self._searched = len(self.buf)
+        if k < 0:
+            return False
+        self.header = self.buf[:k]
+        self.section = "action"
+        self._pos = k + len(ACTION_MARK)
+        return True
+
+    # ---------- action scanning ----------
+
+    def _scan(self) -> List[Action]:
+        out: List[Action] = []
+        buf, i, n = self.buf, self._pos, len(self.buf)
+        while i < n:
+            ch = buf[i]
+            if self._start is None:
+                if ch.isspace():
+                    i += 1
+                    continue
+                self._start, self._depth, self._quote, self._escape, self._is_type = i, 0, None, False, None
+            if self._is_type:
+                # type(content='...') may contain bare quotes; it is single-line, so "')" + newline closes it
+                if ch == ")" and buf[i - 1] == "'" and i + 1 < n and buf[i + 1] == "\n":
+                    out.append(self._emit(i + 1))
+                elif ch == ")" and buf[i - 1] == "'" and i + 1 >= n:
+                    break  # need one more character to decide
+                i += 1
+                continue
+            if self._quote:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == self._quote:
+                    self._quote = None
+            elif ch in "'\"":
+                self._quote = ch
+            elif ch == "(":
+                if self._depth == 0 and self._is_type is None:
+                    self._is_type = buf[self._start:i].strip() == "type"
+                    if self._is_type:
+                        i += 1
+                        continue
+                self._depth += 1
+            elif ch == ")":
+                self._depth -= 1
+                if self._depth <= 0:
+                    out.append(self._emit(i + 1))
+            i += 1
+        self._pos = i
+        return out
+
+    def _emit(self, end: int) -> Action:
+        piece = self.buf[self._start:end]
+        self._start = None
+        return self._parse_piece(piece)
+
+    def _strip_eos(self, piece: str) -> str:
+        # parse_action_to_ir only drops [EOS] while converting <point> tags; a trailing [EOS]
+        # without them fails there, and must fail (or stay in type content) here too
+        return piece.replace("[EOS]", "") if "<point>" in self.buf else piece
+
+    def _parse_piece(self, piece: str) -> Action:
+        text = self.header.strip() + "\n" + ACTION_MARK + self._strip_eos(piece)
+        action = parse_action_to_ir(text, *self.parse_args)[0]
+        action.text = self.buf
+        self.emitted += 1
+        return action
+
+def iter_actions(chunks: Iterable[str], factor, origin_resized_height, origin_resized_width,
+                 model_type="qwen25vl", **kwargs) -> Iterator[Action]:
+    """Yield Actions from an iterable of text chunks as soon as each one closes."""
+    parser = StreamingActionParser(factor, origin_resized_height, origin_resized_width, model_type, **kwargs)
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
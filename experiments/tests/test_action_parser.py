@@ -0,0 +1,49 @@
+# SPDX-License-Identifier: Apache-2.0
+# python -m pytest ui_tars/tests   (from the directory containing ui_tars/)
+import io
+import contextlib
+
+import pytest
+
+from ui_tars import fuzz_action_parser
+from ui_tars.action_parser import (
+    parse_action_to_ir,
+    parse_action_to_structure_output,
+    parse_action_to_structure_output_reference,
+)
+from ui_tars.parser_corpus import KINDS, build_corpus, load_responses
+
+CORPUS = build_corpus(synthetic_per_kind=100, seed=0)
+MODEL_TYPES = ("qwen25vl", "doubao")
+
+def _outcome(fn, text, model_type):
+    buf = io.StringIO()
+    with contextlib.redirect_stdout(buf):
+        try:
+            return ("ok", fn(text, 28, 1080, 1920, model_type=model_type), buf.getvalue())
+        except Exception as e:
+            return ("err", type(e).__name__, str(e), buf.getvalue())
+
+def test_corpus_covers_every_kind():
+    assert load_responses(), "no recorded responses under results/"
+    assert {kind for kind, _ in CORPUS} == set(KINDS)
+
+@pytest.mark.parametrize("model_type", MODEL_TYPES)
+@pytest.mark.parametrize("kind", KINDS)
+def test_fast_parser_matches_reference(kind, model_type):
+    texts = [text for k, text in CORPUS if k == kind]
+    for text in texts:
+        assert _outcome(parse_action_to_structure_output, text, model_type) == \
+            _outcome(parse_action_to_structure_output_reference, text, model_type), text
+
+def test_ir_round_trips_to_legacy_dicts():
+    for _, text in CORPUS:
+        try:
+            legacy = parse_action_to_structure_output(text, 28, 1080, 1920)
+        except (ValueError, AssertionError, AttributeError):
+            continue
+        assert [a.to_dict() for a in parse_action_to_ir(text, 28, 1080, 1920)] == legacy
+
+@pytest.mark.filterwarnings("ignore::DeprecationWarning", "ignore::SyntaxWarning")  # ast on mutated input
+def test_differential_fuzz(capsys):
+    assert fuzz_action_parser.main(["--iterations", "2000", "--seed", "1"]) == 0, capsys.readouterr().out
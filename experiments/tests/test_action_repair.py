@@ -0,0 +1,48 @@
+# SPDX-License-Identifier: Apache-2.0
+# python -m pytest ui_tars/tests   (from the directory containing ui_tars/)
+import pytest
+
+from ui_tars.action_repair import ActionRepairer, ActionRepairError
+
+ARGS = (28, 1080, 1920)
+
+def _parse(text):
+    repairer = ActionRepairer()
+    actions = repairer.parse(text, *ARGS)
+    return [(a.action_type, a.action_inputs) for a in actions], repairer.counts
+
+@pytest.mark.parametrize("text", [
+    "Thought: go\nAction: click(start_box='(100,200)",
+    "Thought: go\nAction: click(start_box='(100,200)')[EOS]",
+    "Thought: go\naction: click(start_box='(100,200)')",
+    "Thought: go\nAction: click(start_box=[100, 200])",
+    "Thought: go\nAction: click(start_box='(100,200)')\nThis clicks the button.",
+])
+def test_repairs_single_click(text):
+    actions, counts = _parse(text)
+    assert [name for name, _ in actions] == ["click"]
+    assert counts["repaired"] == 1
+
+def test_truncated_trailing_type_is_closed_not_dropped():
+    actions, counts = _parse("Thought: t\nAction: click(start_box='(1,2)')\n\ntype(content='he said \"hi\"")
+    assert actions[1] == ("type", {"content": 'he said "hi"'})
+    assert [name for name, _ in actions] == ["click", "type"]
+    assert counts["strip_trailing_junk"] == 0
+
+def test_broken_type_does_not_swallow_following_action():
+    actions, _ = _parse("Thought: t\nAction: type(content='abc)\n\nclick(start_box='(1,2)')")
+    assert [name for name, _ in actions] == ["type", "click"]
+    assert actions[0][1] == {"content": "abc"}
+
+def test_finished_content_quote_is_escaped():
+    actions, _ = _parse("Thought: t\nAction: finished(content='it's done')")
+    assert actions == [("finished", {"content": "it's done"})]
+
+def test_repair_never_returns_fewer_actions():
+    repairer = ActionRepairer(repairs=[("keep_first", lambda text: text.split("\n\n")[0])])
+    with pytest.raises(ActionRepairError):
+        repairer.parse("Thought: t\nAction: click(start_box='(1,2)')\n\ntype(content='x", *ARGS)
+
+def test_unrepairable_raises():
+    with pytest.raises(ActionRepairError):
+        ActionRepairer().parse("complete garbage", *ARGS)
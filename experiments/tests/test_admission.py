@@ -0,0 +1,94 @@
+# SPDX-License-Identifier: Apache-2.0
+# python -m pytest ui_tars/tests   (from the directory containing ui_tars/)
+import asyncio
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from ui_tars import run_health
+from ui_tars.admission import AdmissionController, PriorityClass, QueueFull
+from ui_tars.upstream_pool import UpstreamPool
+
+def _controller(limit=1, queue=8, batch_max_active=None):
+    return AdmissionController(limit, {"interactive": PriorityClass(0, queue),
+                                       "batch": PriorityClass(1, queue, max_active=batch_max_active)})
+
+def _run(coro):
+    return asyncio.run(asyncio.wait_for(coro, 5))  # a lost wakeup fails, not hangs
+
+async def _job(a, name, tag, order, gate):
+    async with a.slot(name):
+        order.append(tag)
+        await gate.wait()
+
+def test_interactive_overtakes_queued_batch():
+    async def main():
+        a, order, gate = _controller(), [], asyncio.Event()
+        holder = asyncio.create_task(_job(a, "batch", "holder", order, gate))
+        await asyncio.sleep(0)
+        jobs = [asyncio.create_task(_job(a, "batch", f"b{i}", order, gate)) for i in range(3)]
+        await asyncio.sleep(0)
+        jobs += [asyncio.create_task(_job(a, "interactive", f"i{i}", order, gate)) for i in range(2)]
+        await asyncio.sleep(0)
+        assert a.stats()["classes"]["batch"]["queued"] == 3
+        gate.set()
+        await asyncio.gather(holder, *jobs)
+        assert order == ["holder", "i0", "i1", "b0", "b1", "b2"]  # FIFO within a class
+        assert (a.active, a.classes["batch"].admitted, a.classes["interactive"].admitted) == (0, 4, 2)
+    _run(main())
+
+def test_batch_max_active_leaves_headroom():
+    async def main():
+        a, order, gate = _controller(limit=2, batch_max_active=1), [], asyncio.Event()
+        jobs = [asyncio.create_task(_job(a, "batch", f"b{i}", order, gate)) for i in range(2)]
+        await asyncio.sleep(0)
+        jobs.append(asyncio.create_task(_job(a, "interactive", "i0", order, gate)))
+        await asyncio.sleep(0)
+        assert order == ["b0", "i0"] and a.classes["batch"].active == 1  # b1 waits though a slot was free
+        gate.set()
+        await asyncio.gather(*jobs)
+        assert order == ["b0", "i0", "b1"]
+    _run(main())
+
+def test_full_queue_is_rejected():
+    async def main():
+        a, gate = _controller(queue=1), asyncio.Event()
+        jobs = [asyncio.create_task(_job(a, "batch", "", [], gate)) for _ in range(2)]  # one active, one queued
+        await asyncio.sleep(0)
+        with pytest.raises(QueueFull):
+            await a.acquire("batch")
+        assert a.classes["batch"].rejected == 1
+        gate.set()
+        await asyncio.gather(*jobs)
+    _run(main())
+
+def _never_called(request):
+    raise AssertionError("an overloaded proxy must not call the upstream")
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_overload_returns_503(monkeypatch, stream):
+    a = _controller(queue=0)
+    a.active = a.classes["interactive"].active = 1  # the only slot is taken and nobody may queue
+    monkeypatch.setattr(run_health, "admission", a)
+    client = TestClient(run_health.app)  # no lifespan: the pool is set up by hand
+    monkeypatch.setattr(run_health.app.state, "upstream", UpstreamPool(
+        ["http://a"], lambda url: httpx.AsyncClient(base_url=url, transport=httpx.MockTransport(_never_called)),
+        health_path=None), raising=False)
+    r = client.post("/v1/chat/completions", json={"messages": [], "stream": stream},
+                    headers={run_health.EXECUTE_HEALTH_HEADER: "0"})
+    assert r.status_code == 503 and r.headers["retry-after"] == "1"
+    assert "overloaded" in r.json()["error"]
+    assert a.classes["interactive"].rejected == 1
+
+def test_check_priorities(monkeypatch):
+    a = _controller()
+    run_health.check_priorities(a)
+    run_health.check_priorities(None)  # admission control off: nothing to check
+    monkeypatch.setattr(run_health, "DEFAULT_PRIORITY", "urgent")
+    with pytest.raises(ValueError, match="urgent"):
+        run_health.check_priorities(a)
+    monkeypatch.setattr(run_health, "DEFAULT_PRIORITY", "interactive")
+    monkeypatch.setattr(run_health, "PRIORITY_KEYS", {"key1": "batch", "key2": "bulk"})
+    with pytest.raises(ValueError, match="bulk"):
+        run_health.check_priorities(a)
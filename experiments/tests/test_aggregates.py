@@ -0,0 +1,62 @@
+# SPDX-License-Identifier: Apache-2.0
+# python -m pytest ui_tars/tests   (from the directory containing ui_tars/)
+from datetime import datetime
+
+from ui_tars.aggregates import HimsAggregates, aggregates_for, iso_week, snapshot_path
+from ui_tars.health import execute_health_actions
+
+TODAY = datetime.now().strftime("%Y-%m-%d")
+
+def _upsert(name, date=None, doctor=None, imaging=None):
+    return {"action_type": "health.upsert_patient",
+            "action_inputs": {"patient_name": name, "symptoms": ["cough"], "treatment_plan": "rest",
+                              "appointment_date": date, "doctor": doctor, "imaging": imaging}}
+
+def _tables(agg):
+    return {t: dict(v) for t, v in agg.tables.items()}
+
+def _populate(root):
+    execute_health_actions([
+        _upsert("Jane Doe", "2025-09-12", "Dr. Patel", "Chest X-ray"),
+        _upsert("John Roe", "2025-09-12", "Dr. Patel", "CT abdomen"),
+        _upsert("Ann Poe", "2025-09-13", "Dr. Lee\nsecond line", "routine follow-up\nMRI knee"),
+        _upsert("Jane Doe", "2025-09-13", None, "mammogram"),
+    ], root=root)
+
+def test_incremental_counts_and_queries(tmp_path):
+    root = str(tmp_path / "HIMS")
+    _populate(root)
+    agg = aggregates_for(root)
+    assert agg.appointments_per_doctor("2025-09-12") == {"2025-09-12": {"Dr. Patel": 2}}
+    assert agg.appointments_per_doctor("2025-09-13") == {"2025-09-13": {"Dr. Lee": 1, "Unknown": 1}}
+    assert agg.imaging_per_modality(TODAY) == {iso_week(TODAY): {"X-ray": 1, "CT": 1, "Other": 1, "Mammogram": 1}}
+    assert agg.new_patients_per_day(TODAY) == {TODAY: 3}
+
+def test_rebuild_matches_incremental(tmp_path):
+    root = str(tmp_path / "HIMS")
+    _populate(root)
+    rebuilt = HimsAggregates(root)
+    rebuilt.rebuild()
+    assert _tables(rebuilt) == _tables(aggregates_for(root))
+
+def test_reader_follows_snapshots_saved_elsewhere(tmp_path):
+    root = str(tmp_path / "HIMS")
+    _populate(root)
+    reader = aggregates_for(root)
+    assert reader.new_patients_per_day("2030-01-01") == {"2030-01-01": 0}
+
+    writer = HimsAggregates.load(root)  # another process
+    writer.record_new_patient("2030-01-01")
+    writer.save()
+    assert aggregates_for(root).new_patients_per_day("2030-01-01") == {"2030-01-01": 1}
+
+def test_reload_keeps_unsaved_local_events(tmp_path):
+    root = str(tmp_path / "HIMS")
+    _populate(root)
+    local = aggregates_for(root)
+    local.record_new_patient("2030-01-02")  # not saved yet
+    writer = HimsAggregates.load(root)
+    writer.record_new_patient("2030-01-03")
+    writer.save()
+    assert aggregates_for(root).new_patients_per_day("2030-01-02") == {"2030-01-02": 1}
+    assert snapshot_path(root).endswith("HIMS.aggregates.json")
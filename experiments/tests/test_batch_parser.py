@@ -0,0 +1,33 @@
+# SPDX-License-Identifier: Apache-2.0
+# python -m pytest ui_tars/tests   (from the directory containing ui_tars/)
+import numpy as np
+import pytest
+
+from ui_tars.action_parser import parse_action_to_ir
+from ui_tars.batch_parser import parse_actions_batch
+
+TEXTS = ["Thought: t\nAction: click(start_box='(100,200)')",
+         "Action: drag(start_box='(1,2,3,4)', end_box='(500,600)')",
+         "Action: type(content='hi')"]
+SIZES = [(1080, 1920), (800, 600), (2160, 3840)]
+
+def _check(result, sizes):
+    assert not result.errors
+    for i, (text, (h, w)) in enumerate(zip(TEXTS, sizes)):
+        assert result.actions(i) == parse_action_to_ir(text, 28, h, w)
+
+@pytest.mark.parametrize("sizes", [SIZES, np.array(SIZES), np.array(SIZES, dtype=np.int32)])
+def test_one_size_per_text(sizes):
+    _check(parse_actions_batch(TEXTS, sizes, workers=0), SIZES)
+
+@pytest.mark.parametrize("size", [(1080, 1920), [1080, 1920], np.array([1080, 1920]), np.array([1080, 1920], dtype=np.int32)])
+def test_one_size_for_all(size):
+    _check(parse_actions_batch(TEXTS, size, workers=0), [(1080, 1920)] * len(TEXTS))
+
+@pytest.mark.parametrize("sizes", [SIZES[:2], np.array(SIZES[:2]), np.zeros((3, 3)), (1080, 1920, 3)])
+def test_bad_sizes_are_rejected(sizes):
+    with pytest.raises(ValueError):
+        parse_actions_batch(TEXTS, sizes, workers=0)
+
+def test_empty_batch():
+    assert len(parse_actions_batch([], [], workers=0)) == 0
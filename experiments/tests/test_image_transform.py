@@ -0,0 +1,44 @@
+# SPDX-License-Identifier: Apache-2.0
+# python -m pytest ui_tars/tests   (from the directory containing ui_tars/)
+import io
+import base64
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+from ui_tars.image_transform import ScreenshotTransformer
+
+def _messages(url):
+    return [{"role": "user", "content": [{"type": "image_url", "image_url": {"url": url}}]}]
+
+def _png(size, truncate=False):
+    buf = io.BytesIO()
+    Image.new("RGB", size, (240, 240, 240)).save(buf, "PNG")
+    data = buf.getvalue()
+    return "data:image/png;base64," + base64.b64encode(data[:len(data) // 2] if truncate else data).decode()
+
+def _size(messages):
+    url = messages[0]["content"][0]["image_url"]["url"]
+    return Image.open(io.BytesIO(base64.b64decode(url.split(",", 1)[1]))).size
+
+@pytest.mark.parametrize("url", [
+    "data:image/png;base64,!!!not-base64",
+    "data:image/png;base64," + base64.b64encode(b"not an image").decode(),
+    _png((640, 480), truncate=True),
+])
+def test_undecodable_parts_pass_through(url):
+    transform = ScreenshotTransformer()
+    assert transform(_messages(url)) == _messages(url)
+
+def test_no_upscale_when_smart_resize_rounds_up():
+    transform = ScreenshotTransformer()
+    out = transform(_messages(_png((1920, 1080))))
+    assert _size(out) == (1920, 1080)
+    assert transform.stats()["resized"] == 0
+
+def test_downscale_to_lower_max_pixels():
+    transform = ScreenshotTransformer(max_pixels=1000 * 28 * 28)
+    out = transform(_messages(_png((1920, 1080))))
+    assert _size(out) == (1176, 644)
+    assert transform.stats()["resized"] == 1
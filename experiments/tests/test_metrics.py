@@ -0,0 +1,35 @@
+# SPDX-License-Identifier: Apache-2.0
+# python -m pytest ui_tars/tests   (from the directory containing ui_tars/)
+import threading
+
+from ui_tars import metrics
+
+def _hammer(fn, threads=8, n=20_000):
+    workers = [threading.Thread(target=lambda: [fn() for _ in range(n)]) for _ in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return threads * n
+
+def test_counter_and_histogram_are_thread_safe():
+    counter = metrics.counter("test_thread_total", "test", ("k",))
+    hist = metrics.histogram("test_thread_seconds", "test", ("k",))
+    total = _hammer(lambda: (counter.labels("a").inc(), hist.labels("a").observe(0.002)))
+    assert counter.labels("a").value == total
+    counts, _, count = hist.labels("a").snapshot()
+    assert count == sum(counts) == total
+
+def test_render_exposition_format():
+    hist = metrics.histogram("test_render_seconds", "render test", ("parser",), buckets=(0.1, 1.0))
+    hist.labels("fast").observe(0.5)
+    text = metrics.render()
+    assert "# TYPE test_render_seconds histogram" in text
+    assert 'test_render_seconds_bucket{parser="fast",le="0.1"} 0' in text
+    assert 'test_render_seconds_bucket{parser="fast",le="+Inf"} 1' in text
+    assert 'test_render_seconds_count{parser="fast"} 1' in text
+
+def test_timed_is_identity_when_disabled(monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", False)
+    fn = lambda: 1
+    assert metrics.timed(metrics.histogram("test_off_seconds", "test"))(fn) is fn
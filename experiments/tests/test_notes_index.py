@@ -0,0 +1,46 @@
+# SPDX-License-Identifier: Apache-2.0
+# python -m pytest ui_tars/tests   (from the directory containing ui_tars/)
+import shutil
+
+from ui_tars.health import execute_health_actions
+from ui_tars.notes_index import NotesIndex, notes_index_for
+
+QUERIES = ["cough", "fever headache", "rest fluids", "ibuprofen", "follow up knee", "chest pain"]
+
+def _upsert(name, symptoms, plan, next_steps=None):
+    return {"action_type": "health.upsert_patient",
+            "action_inputs": {"patient_name": name, "symptoms": symptoms, "treatment_plan": plan,
+                              "next_steps": next_steps}}
+
+def _populate(root):
+    execute_health_actions([
+        _upsert("Jane Doe", ["cough", "fever"], "rest and fluids"),
+        _upsert("John Roe", ["chest pain\nradiating to left arm", "shortness of breath"], "ECG\nfollow up in 2 days"),
+        _upsert("Jane Doe", ["headache"], "ibuprofen 400mg\n\nrest", "follow up\nknee MRI"),
+        _upsert("Ann Poe", ["knee pain"], "physio", "follow up"),
+    ], root=root)
+
+def test_rebuild_matches_incremental(tmp_path):
+    root = str(tmp_path / "HIMS")
+    _populate(root)
+    live = notes_index_for(root)
+    copy = str(tmp_path / "copy" / "HIMS")
+    shutil.copytree(root, copy)
+    rebuilt = NotesIndex.load(copy)  # no index next to the copy: scans the note files
+    docs = lambda idx: {d: v for s in idx.segments + [idx.buffer] for d, v in s.docs.items()}
+    assert docs(rebuilt) == docs(live)
+    for q in QUERIES:
+        assert rebuilt.search(q) == live.search(q), q
+
+def test_reader_follows_segments_flushed_elsewhere(tmp_path):
+    root = str(tmp_path / "HIMS")
+    _populate(root)
+    reader = notes_index_for(root)
+    assert reader.search("tinnitus") == []
+
+    writer = NotesIndex.load(root)  # another process
+    writer.add_entry("P9", "symptoms.txt", 0, "[2030-01-01] tinnitus")
+    writer.flush()
+    reader.add_entry("P8", "symptoms.txt", 0, "[2030-01-01] tinnitus both ears")  # not flushed yet
+    hits = notes_index_for(root).search("tinnitus")
+    assert sorted(h["patient_id"] for h in hits) == ["P8", "P9"]
@@ -0,0 +1,30 @@
+# SPDX-License-Identifier: Apache-2.0
+# python -m pytest ui_tars/tests   (from the directory containing ui_tars/)
+import pytest
+
+from ui_tars.response_cache import CachedResponse, CacheMiss, ResponseCache, canonical_key
+
+def test_key_ignores_order_and_per_user_fields():
+    assert canonical_key({"model": "m", "messages": [], "stream": False, "user": "x"}) == \
+        canonical_key({"messages": [], "model": "m"})
+
+def test_lru_eviction_keeps_within_budget(tmp_path):
+    cache = ResponseCache("record", str(tmp_path), max_bytes=300)
+    for i in range(5):
+        cache.put(str(i), CachedResponse(200, "x", b"a" * 100))
+    assert cache.stats()["bytes"] <= 300
+    assert cache.get("0") is None and cache.get("4") is not None
+
+def test_hit_on_entry_written_by_another_process(tmp_path):
+    reader = ResponseCache("replay", str(tmp_path), max_bytes=1 << 20)
+    writer = ResponseCache("record", str(tmp_path), max_bytes=1 << 20)
+    writer.put("k", CachedResponse(200, "application/json", b"{}"))
+    hit = reader.get("k")
+    assert hit.content == b"{}"
+    assert reader.stats()["entries"] == 1
+    assert reader.stats()["bytes"] == writer.stats()["bytes"]
+    assert reader.get("k") is not None  # now indexed: moves to the LRU end
+
+def test_replay_miss_raises(tmp_path):
+    with pytest.raises(CacheMiss):
+        ResponseCache("replay", str(tmp_path)).get("missing")
@@ -0,0 +1,58 @@
+# SPDX-License-Identifier: Apache-2.0
+# python -m pytest ui_tars/tests   (from the directory containing ui_tars/)
+import time
+import asyncio
+
+import httpx
+import pytest
+
+from ui_tars import run_health
+from ui_tars.singleflight import Broadcast
+from ui_tars.upstream_pool import UpstreamPool
+
+SSE = [b'data: {"choices": [{"delta": {"content": "hi"}}]}\n\n', b"data: [DONE]\n\n"]
+
+def _pool(handler):
+    return UpstreamPool(["http://a"], lambda url: httpx.AsyncClient(base_url=url, transport=httpx.MockTransport(handler)),
+                        health_path=None)
+
+def _sse(request):
+    async def chunks():
+        for chunk in SSE:
+            yield chunk
+    return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=chunks())
+
+async def _relay(pool):
+    """(head, streamed bytes, pump exception or None) for one stream through _pump_stream."""
+    flight = Broadcast(lambda f: run_health._pump_stream(f, pool, {"stream": True}, httpx.USE_CLIENT_DEFAULT,
+                                                         time.perf_counter()))
+    try:
+        head = await asyncio.wait_for(asyncio.shield(flight.head), 2)
+    except Exception as e:
+        head = e
+    body = b"".join([chunk async for chunk in flight.subscribe()])
+    error = (await asyncio.gather(flight.task, return_exceptions=True))[0]
+    return head, body, error
+
+def test_stream_survives_unwritable_tee_dir(tmp_path, monkeypatch):
+    blocker = tmp_path / "file"
+    blocker.write_text("")
+    monkeypatch.setattr(run_health, "STREAM_TEE_DIR", str(blocker / "tee"))  # makedirs fails: parent is a file
+    pool = _pool(_sse)
+    head, body, error = asyncio.run(asyncio.wait_for(_relay(pool), 5))  # a stuck flight fails, not hangs
+    assert head.status_code == 200 and body == b"".join(SSE) and error is None
+    assert pool.backends[0].outstanding == 0  # the upstream response was closed and released
+
+def test_stream_is_teed(tmp_path, monkeypatch):
+    monkeypatch.setattr(run_health, "STREAM_TEE_DIR", str(tmp_path))
+    asyncio.run(asyncio.wait_for(_relay(_pool(_sse)), 5))
+    assert [p.read_bytes() for p in tmp_path.iterdir()] == [b"".join(SSE)]
+
+def test_unexpected_error_before_head_fails_the_flight():
+    def broken(request):
+        raise RuntimeError("not an httpx error")
+    pool = _pool(broken)
+    head, body, error = asyncio.run(asyncio.wait_for(_relay(pool), 5))
+    assert isinstance(head, RuntimeError) and isinstance(error, RuntimeError)
+    assert body == b""
+    assert pool.backends[0].outstanding == 0
@@ -0,0 +1,47 @@
+# SPDX-License-Identifier: Apache-2.0
+# python -m pytest ui_tars/tests   (from the directory containing ui_tars/)
+import io
+import contextlib
+
+import pytest
+
+from ui_tars.action_parser import parse_action_to_ir
+from ui_tars.parser_corpus import KINDS, build_corpus
+from ui_tars.stream_parser import StreamingActionParser
+
+CORPUS = build_corpus(synthetic_per_kind=100, seed=0)
+ARGS = (28, 1080, 1920)
+
+def _summary(actions):
+    return [(a.action_type, a.action_inputs, a.thought, a.reflection) for a in actions]
+
+def _batch(text):
+    try:
+        return _summary(parse_action_to_ir(text, *ARGS))
+    except Exception as e:
+        return ("err", type(e).__name__)
+
+def _streamed(text, size):
+    parser, actions = StreamingActionParser(*ARGS), []
+    try:
+        for i in range(0, len(text), size):
+            actions += parser.feed(text[i:i + size])
+        actions += parser.close()
+    except Exception as e:
+        return ("err", type(e).__name__)
+    return _summary(actions)
+
+@pytest.mark.parametrize("size", [1, 7, 64, 1 << 20])
+@pytest.mark.parametrize("kind", KINDS)
+def test_streamed_matches_batch(kind, size):
+    with contextlib.redirect_stdout(io.StringIO()):  # the batch parser prints unparseable actions
+        for k, text in CORPUS:
+            if k == kind:
+                assert _streamed(text, size) == _batch(text), text
+
+def test_eos_follows_batch_parser():
+    with contextlib.redirect_stdout(io.StringIO()):
+        point = "Thought: t\nAction: click(start_box='<point>10 20</point>')[EOS]"
+        assert _streamed(point, 3) == _batch(point) != ("err", "ValueError")
+        plain = "Thought: t\nAction: click(start_box='(10,20)')[EOS]"
+        assert _streamed(plain, 3) == _batch(plain) == ("err", "ValueError")
@@ -0,0 +1,87 @@
+# SPDX-License-Identifier: Apache-2.0
+# python -m pytest ui_tars/tests   (from the directory containing ui_tars/)
+import asyncio
+
+import httpx
+
+from ui_tars.upstream_pool import UpstreamPool
+
+def _pool(handler, **kw):
+    """Backends http://a and http://b, both served by `handler` (sync or async)."""
+    return UpstreamPool(["http://a", "http://b"],
+                        lambda url: httpx.AsyncClient(base_url=url, transport=httpx.MockTransport(handler)),
+                        health_path=None, **kw)
+
+def _run(coro):
+    return asyncio.run(asyncio.wait_for(coro, 5))  # a stuck request fails, not hangs
+
+def test_breaker_opens_and_recovers_after_cooldown():
+    a_fails = [True]
+
+    def handler(request):
+        if request.url.host == "a" and a_fails[0]:
+            return httpx.Response(500)
+        return httpx.Response(200, json={"from": request.url.host})
+
+    async def main():
+        pool = _pool(handler, failure_threshold=2, open_s=60.0)
+        a, b = pool.backends
+        codes = [(await pool.post("/v1/chat/completions", json={})).status_code for _ in range(6)]
+        assert codes == [500, 200, 500, 200, 200, 200]  # a alternates with b until its second failure
+        assert (a.requests, a.trips, pool.stats()["backends"][0]["breaker"]) == (2, 1, "open")
+
+        a.open_until = 0.0  # cooldown over: half-open, a single further failure re-opens it
+        assert (await pool.post("/v1/chat/completions", json={})).status_code == 500
+        assert (a.requests, a.trips) == (3, 2)
+        assert (await pool.post("/v1/chat/completions", json={})).json() == {"from": "b"}
+
+        a_fails[0], a.open_until = False, 0.0
+        assert (await pool.post("/v1/chat/completions", json={})).json() == {"from": "a"}
+        assert (a.failures, a.errors, pool.stats()["backends"][0]["breaker"]) == (0, 3, "closed")
+        assert [x.outstanding for x in pool.backends] == [0, 0]
+        await pool.aclose()
+    _run(main())
+
+def test_connect_error_is_retried_on_another_backend():
+    def handler(request):
+        if request.url.host == "a":
+            raise httpx.ConnectError("connection refused", request=request)
+        return httpx.Response(200, json={"from": request.url.host})
+
+    async def main():
+        pool = _pool(handler)
+        a, b = pool.backends
+        assert (await pool.post("/v1/chat/completions", json={})).json() == {"from": "b"}
+        stream = await pool.open_stream("/v1/chat/completions", json={})
+        assert (stream.status_code, await stream.aread()) == (200, b'{"from":"b"}')
+        await stream.aclose()
+        assert pool.counts["retried"] == 2
+        assert (a.requests, a.errors, b.requests, b.errors) == (2, 2, 2, 0)
+        assert [x.outstanding for x in pool.backends] == [0, 0]
+        await pool.aclose()
+    _run(main())
+
+def test_hedged_request_cancels_the_loser():
+    async def main():
+        slow_cancelled = asyncio.Event()
+
+        async def handler(request):
+            if request.url.host == "a":
+                try:
+                    await asyncio.sleep(10)
+                except asyncio.CancelledError:
+                    slow_cancelled.set()
+                    raise
+            return httpx.Response(200, json={"from": request.url.host})
+
+        pool = _pool(handler, hedge=True, hedge_min_samples=4)
+        pool.latencies.extend([0.01] * 4)  # recent p95: hedge after 10 ms
+        a, b = pool.backends
+        assert (await pool.post("/v1/chat/completions", json={})).json() == {"from": "b"}
+        await asyncio.wait_for(slow_cancelled.wait(), 1)
+        await asyncio.sleep(0)
+        assert (pool.counts["hedged"], pool.counts["hedge_wins"]) == (1, 1)
+        assert (a.outstanding, a.errors, a.failures) == (0, 0, 0)  # losing a race is not a failure
+        assert (b.outstanding, b.errors) == (0, 0)
+        await pool.aclose()
+    _run(main())
@@ -0,0 +1,263 @@
+# SPDX-License-Identifier: Apache-2.0
+"""
+Pool of upstream agent servers for the completions proxy.
+
+  balancing   each request goes to the available backend with the fewest requests
+              outstanding (ties: the one that has served fewest so far)
+  breaker     `failure_threshold` consecutive failures (transport errors or 5xx) take a
+              backend out for `open_s`; after that it gets traffic again, and a single
+              further failure takes it out again
+  health      a background task GETs `health_path` on every backend each
+              `health_interval_s`; a backend that does not answer (or answers 5xx) is
+              skipped while any healthy one is left
+  retry       a connection error (nothing was sent) is retried once on another backend
+  hedging     optional, non-streamed calls only: when the first backend has not answered
+              within the pool's recent p95 latency, the same request goes to a second
+              backend and whichever answers first wins (the other is cancelled)
+
+    pool = UpstreamPool(["http://a:8888", "http://b:8888"], make_client, hedge=True)
+    await pool.start()
+    response = await pool.post("/v1/chat/completions", json=body)
+    stream = await pool.open_stream("/v1/chat/completions", json=body)   # .aiter_raw(), .aclose()
+    pool.stats()
+
+Per-backend call latency is observed in the `hims_upstream_request_seconds` histogram
+(see metrics.py); load, errors and breaker state are exported from stats().
+"""
+from __future__ import annotations
+import time
+import asyncio
+from collections import deque
+from typing import Callable, Iterable, List, Optional
+
+import httpx
+
+from ui_tars import metrics
+
+UPSTREAM_SECONDS = metrics.histogram("hims_upstream_request_seconds",
+                                     "Upstream calls per backend: until the full response (post) or the "
+                                     "response headers (stream)", ("upstream", "kind", "outcome"))
+
+def _outcome(ok: Optional[bool]) -> str:
+    return "cancelled" if ok is None else "ok" if ok else "error"
+
+class NoUpstreamAvailable(httpx.TransportError):
+    """Every backend's circuit breaker is open."""
+
+class Backend:
+
+    def __init__(self, url: str, client: "httpx.AsyncClient"):
+        self.url, self.client = url, client
+        self.outstanding = 0
+        self.requests = 0
+        self.errors = 0
+        self.failures = 0           # consecutive
+        self.trips = 0
+        self.open_until = 0.0       # breaker open while monotonic() < open_until
+        self.healthy = True
+        self.latencies = deque(maxlen=1024)
+
+    def stats(self, now: float) -> dict:
+        xs = sorted(self.latencies)
+        pick = lambda q: round(xs[min(len(xs) - 1, int(q * len(xs)))], 4) if xs else None
+        return {"url": self.url, "outstanding": self.outstanding, "requests": self.requests,
+                "errors": self.errors, "breaker": "open" if now < self.open_until else "closed",
+                "trips": self.trips, "healthy": self.healthy, "p50_s": pick(0.50), "p95_s": pick(0.95)}
+
+class PooledStream:
+    """An upstream streaming response that returns its backend to the pool when closed."""
+
+    def __init__(self, pool: "UpstreamPool", backend: Backend, response: "httpx.Response"):
+        self.pool, self.backend, self.response = pool, backend, response
+        self.status_code, self.headers = response.status_code, response.headers
+        self._released = False
+
+    def aiter_raw(self):
+        return self.response.aiter_raw()
+
+    async def aread(self) -> bytes:
+        return await self.response.aread()
+
+    async def aclose(self) -> None:
+        try:
+            await self.response.aclose()
+        finally:
+            if not self._released:
+                self._released = True
+                self.pool._release(self.backend, self.status_code < 500, None)
+
+class UpstreamPool:
+
+    def __init__(self, urls: Iterable[str], make_client: Callable[[str], "httpx.AsyncClient"],
+                 failure_threshold: int = 5, open_s: float = 10.0,
+                 health_path: Optional[str] = "/v1/models", health_interval_s: float = 5.0,
+                 hedge: bool = False, hedge_quantile: float = 0.95, hedge_min_samples: int = 20):
+        self.backends: List[Backend] = [Backend(url, make_client(url)) for url in urls]
+        if not self.backends:
+            raise ValueError("an upstream pool needs at least one backend URL")
+        self.failure_threshold, self.open_s = failure_threshold, open_s
+        self.health_path, self.health_interval_s = health_path, health_interval_s
+        self.hedge, self.hedge_quantile, self.hedge_min_samples = hedge, hedge_quantile, hedge_min_samples
+        self.latencies = deque(maxlen=4096)   # successful non-streamed calls, all backends
+        self._hedge_delay: Optional[float] = None
+        self._since_quantile = 0
+        self.counts = {"hedged": 0, "hedge_wins": 0, "retried": 0, "no_backend": 0}
+        self._health_task: Optional[asyncio.Task] = None
+
+    # ---------- lifecycle ----------
+
+    async def start(self) -> None:
+        if self.health_path and self._health_task is None:
+            self._health_task = asyncio.get_running_loop().create_task(self._health_loop())
+
+    async def aclose(self) -> None:
+        if self._health_task is not None:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+            self._health_task = None
+        for b in self.backends:
+            await b.client.aclose()
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.gather(*(self._check(b) for b in self.backends))
+            await asyncio.sleep(self.health_interval_s)
+
+    async def _check(self, b: Backend) -> None:
+        try:
+            r = await b.client.get(self.health_path, timeout=min(2.0, self.health_interval_s))
+            b.healthy = r.status_code < 500
+        except httpx.HTTPError:
+            b.healthy = False
+
+    # ---------- selection and bookkeeping ----------
+
+    def pick(self, exclude=()) -> Optional[Backend]:
+        now = time.monotonic()
+        closed = [b for b in self.backends if b not in exclude and now >= b.open_until]
+        candidates = [b for b in closed if b.healthy] or closed  # unhealthy beats nothing
+        if not candidates:
+            return None
+        return min(candidates, key=lambda b: (b.outstanding, b.requests))
+
+    def _acquire(self, exclude=()) -> Backend:
+        b = self.pick(exclude)
+        if b is None:
+            self.counts["no_backend"] += 1
+            raise NoUpstreamAvailable("all upstream circuit breakers are open")
+        b.outstanding += 1
+        b.requests += 1
+        return b
+
+    def _release(self, b: Backend, ok: Optional[bool], latency: Optional[float]) -> None:
+        """ok=None (cancelled: lost a hedge race, or the caller went away) leaves the breaker alone."""
+        b.outstanding -= 1
+        if ok is None:
+            return
+        if ok:
+            b.failures = 0
+            if latency is not None:
+                b.latencies.append(latency)
+                self.latencies.append(latency)
+                self._since_quantile += 1
+            return
+        b.errors += 1
+        b.failures += 1
+        if b.failures >= self.failure_threshold:
+            b.open_until = time.monotonic() + self.open_s
+            b.trips += 1
+            b.failures = self.failure_threshold - 1  # after the cooldown one more failure re-opens it
+
+    def hedge_delay(self) -> Optional[float]:
+        """Recent p95 of successful calls; None until there are enough samples (or hedging is off)."""
+        if not self.hedge or len(self.backends) < 2 or len(self.latencies) < self.hedge_min_samples:
+            return None
+        if self._hedge_delay is None or self._since_quantile >= 50:
+            xs = sorted(self.latencies)
+            self._hedge_delay = xs[min(len(xs) - 1, int(self.hedge_quantile * len(xs)))]
+            self._since_quantile = 0
+        return self._hedge_delay
+
+    # ---------- requests ----------
+
+    async def _post(self, b: Backend, path: str, json, timeout) -> "httpx.Response":
+        t0, ok, latency = time.perf_counter(), False, None
+        try:
+            r = await b.client.post(path, json=json, timeout=timeout)
+            ok = r.status_code < 500
+            latency = time.perf_counter() - t0 if ok else None
+            return r
+        except asyncio.CancelledError:
+            ok = None
+            raise
+        finally:
+            self._release(b, ok, latency)
+            if metrics.ENABLED:
+                UPSTREAM_SECONDS.labels(b.url, "post", _outcome(ok)).observe(time.perf_counter() - t0)
+
+    async def post(self, path: str, json=None, timeout=httpx.USE_CLIENT_DEFAULT) -> "httpx.Response":
+        first = self._acquire()
+        try:
+            return await self._post_hedged(first, path, json, timeout)
+        except httpx.ConnectError:
+            # nothing was sent: safe to try once more elsewhere
+            if self.pick(exclude=(first,)) is None:
+                raise
+            self.counts["retried"] += 1
+            return await self._post_hedged(self._acquire(exclude=(first,)), path, json, timeout)
+
+    async def _post_hedged(self, first: Backend, path: str, json, timeout) -> "httpx.Response":
+        delay = self.hedge_delay()
+        if delay is None:
+            return await self._post(first, path, json, timeout)
+        tasks = [asyncio.ensure_future(self._post(first, path, json, timeout))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                second = self.pick(exclude=(first,))
+                if second is not None:
+                    second = self._acquire(exclude=(first,))
+                    self.counts["hedged"] += 1
+                    tasks.append(asyncio.ensure_future(self._post(second, path, json, timeout)))
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    if t.exception() is None and t.result().status_code < 500:
+                        if t is not tasks[0]:
+                            self.counts["hedge_wins"] += 1
+                        return t.result()
+            return tasks[0].result()  # nobody succeeded: the first backend's answer (or error)
+        finally:
+            for t in tasks:
+                if not t.done():
+                    t.cancel()
+
+    async def open_stream(self, path: str, json=None, timeout=httpx.USE_CLIENT_DEFAULT) -> PooledStream:
+        """Streams are not hedged: the first chunk is forwarded as soon as it arrives."""
+        tried = ()
+        while True:
+            b = self._acquire(exclude=tried)
+            t0 = time.perf_counter()
+            try:
+                response = await b.client.send(b.client.build_request("POST", path, json=json, timeout=timeout),
+                                               stream=True)
+            except BaseException as e:
+                ok = None if isinstance(e, asyncio.CancelledError) else False
+                self._release(b, ok, None)
+                if metrics.ENABLED:
+                    UPSTREAM_SECONDS.labels(b.url, "stream", _outcome(ok)).observe(time.perf_counter() - t0)
+                if isinstance(e, httpx.ConnectError) and not tried and self.pick(exclude=(b,)) is not None:
+                    self.counts["retried"] += 1
+                    tried = (b,)
+                    continue
+                raise
+            if metrics.ENABLED:
+                UPSTREAM_SECONDS.labels(b.url, "stream", _outcome(response.status_code < 500)).observe(
+                    time.perf_counter() - t0)
+            return PooledStream(self, b, response)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return dict(self.counts, hedge_delay_s=None if self._hedge_delay is None else round(self._hedge_delay, 4),
+                    backends=[b.stats(now) for b in self.backends])